@@ -1,11 +1,18 @@
+import asyncio
 import os
+from typing import Iterator
 from dotenv import load_dotenv
-from langchain_deepseek import ChatDeepSeek
-from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from .rag_agent import RagAgent
+from langchain_core.messages import HumanMessage, AIMessage
+from langchain.agents import create_react_agent
+from utils.resources import lazy_resource, registry
+from utils.conversation_memory import ConversationHistory
+from utils.tracing import tracer
+from .rag_agent import RagAgent, get_tools
+from .react_prompt import REACT_PROMPT
 
 USE_DEEPSEEK = True  # ⬅️ Mets sur False pour revenir à Llama3
+USE_DIRECT_RAG = False  # ⬅️ Mets sur True pour tenter une réponse directe (une fois `DIRECT_RAG_MIN_SCORE` calibré)
+USE_WEB_PREFETCH = False  # ⬅️ Anticipe la recherche web quand la recherche documentaire de l'agent ne trouve rien
 
 # Chargement des variables d'environnement depuis un fichier .env
 load_dotenv(override=True) 
@@ -13,12 +20,62 @@ load_dotenv(override=True)
 # 🔁 Choix du modèle à utiliser selon la variable USE_DEEPSEEK et la présence des clés d'API
 if load_dotenv(override=True) and USE_DEEPSEEK:
     MODEL_NAME = "deepseek-chat"  # Nom du modèle DeepSeek à utiliser
-    # Initialisation de l'instance LLM DeepSeek avec clé API récupérée dans les variables d'environnement
-    llm = ChatDeepSeek(model=MODEL_NAME, api_key=os.getenv("DEEPSEEK_API_KEY"))
 else:
     MODEL_NAME = "llama3"  # Sinon on revient à Llama3
+
+
+@lazy_resource("llm")
+def get_llm():
+    """
+    Crée le LLM partagé au premier usage (et non plus à l'import du module).
+
+    Returns:
+        Instance ChatDeepSeek ou ChatOllama selon `MODEL_NAME`.
+    """
+    # Imports différés : les clients LLM sont longs à importer
+    if MODEL_NAME == "deepseek-chat":
+        from langchain_deepseek import ChatDeepSeek
+
+        # Initialisation de l'instance LLM DeepSeek avec clé API récupérée dans les variables d'environnement ;
+        # `streaming=True` : même appelé via `invoke` (exécuteur de l'agent), le LLM émet ses tokens
+        return ChatDeepSeek(model=MODEL_NAME, api_key=os.getenv("DEEPSEEK_API_KEY"), streaming=True)
+    from langchain_ollama import ChatOllama
+
     # Initialisation du modèle Llama3 avec température 0 (réponses déterministes)
-    llm = ChatOllama(model=MODEL_NAME, temperature=0)
+    return ChatOllama(model=MODEL_NAME, temperature=0)
+
+
+@lazy_resource("react_agent")
+def get_react_agent():
+    """
+    Agent ReAct partagé (LLM, outils et prompt), sans état conversationnel.
+
+    Returns:
+        Runnable de l'agent, réutilisable par toutes les sessions.
+    """
+    return create_react_agent(llm=get_llm(), tools=get_tools(), prompt=REACT_PROMPT)
+
+
+def warmup() -> str:
+    """
+    Crée toutes les ressources partagées du processus (LLM, agent, Chroma, retriever).
+
+    Appelée une fois au démarrage de l'interface, elle évite que le premier utilisateur
+    paie l'initialisation ; les `ChatModel` créés ensuite ne coûtent presque rien.
+
+    Returns:
+        str: Rapport des temps d'initialisation.
+    """
+    from utils.search_chroma import get_advanced_search, get_query_cache, get_scored_query_cache
+
+    get_react_agent()
+    get_advanced_search()
+    get_query_cache()
+    get_scored_query_cache()
+    report = registry.timing_report()
+    print(report)
+    return report
+
 
 # PROMPT SYSTÈME utilisé pour guider le comportement de l'assistant intelligent
 SYSTEM_PROMPT = """
@@ -76,20 +133,37 @@ class ChatModel:
     avec un agent RAG (Recherche Augmentée par Génération) pour gérer la logique ReAct.
     """
 
-    def __init__(self, model=llm, system_prompt=SYSTEM_PROMPT):
+    def __init__(self, model=None, system_prompt=SYSTEM_PROMPT, direct_rag=USE_DIRECT_RAG, prefetch_web=USE_WEB_PREFETCH):
         """
         Initialise le modèle de chat avec un modèle LLM et un prompt système.
 
         Args:
-            model: instance du modèle LLM (par défaut celui choisi plus haut)
+            model: instance du modèle LLM (par défaut le LLM partagé choisi plus haut)
             system_prompt: chaîne de caractères définissant le prompt système pour guider l'agent
+            direct_rag: si True, répond en un seul appel au LLM à partir des documents trouvés,
+                l'agent ReAct n'étant utilisé que si la recherche est peu pertinente
+            prefetch_web: si True, l'agent anticipe la recherche web quand les documents ne donnent rien
         """
         self.system_prompt = system_prompt
-        self.llm = model
-        # Historique des messages échangés (avec un message système initial)
-        self.historique = [SystemMessage(content=system_prompt)]
-        # Initialisation de l'agent RAG avec le même LLM et prompt
-        self.agent_rag = RagAgent(self.llm, system_prompt=system_prompt)
+        self.llm = model or get_llm()
+        # Historique borné des messages échangés : derniers échanges mot pour mot,
+        # les plus anciens résumés par le LLM
+        self.memory = ConversationHistory(system_prompt, llm=self.llm)
+        # Initialisation de l'agent RAG avec le même LLM et prompt ;
+        # avec le LLM par défaut, l'agent ReAct partagé est réutilisé (seule la mémoire est propre à la session)
+        shared_agent = get_react_agent() if model is None else None
+        self.agent_rag = RagAgent(
+            self.llm,
+            system_prompt=system_prompt,
+            agent=shared_agent,
+            direct=direct_rag,
+            prefetch_web=prefetch_web,
+        )
+
+    @property
+    def historique(self) -> list:
+        """Historique envoyé au modèle : prompt système, résumé et derniers échanges."""
+        return self.memory.messages()
 
     def _filter_final_answer_and_source(self, text: str) -> str:
         """
@@ -124,6 +198,14 @@ class ChatModel:
         else:
             return final_answer
 
+    @staticmethod
+    def _needs_fallback(output: str) -> bool:
+        """
+        Indique si la sortie de l'agent est inexploitable (trop courte ou sans marqueur
+        de réponse) et qu'il faut interroger directement le LLM.
+        """
+        return len(output) < 20 or not any(m in output.lower() for m in RESPONSE_MARKERS)
+
     def model_response(self, message: str) -> str:
         """
         Traite un message utilisateur, interroge l'agent RAG, gère les exceptions,
@@ -136,42 +218,140 @@ class ChatModel:
         Returns:
             La réponse finale formatée à retourner à l'utilisateur.
         """
-        # Ajout du message utilisateur à l'historique
-        self.historique.append(HumanMessage(content=message))
-
-        try:
-            # Recherche via l'agent RAG avec l'historique complet
-            rag_response = self.agent_rag.search(self.historique)
-
-            # Gestion tolérante selon que la réponse est dict ou str
-            if isinstance(rag_response, dict) and "output" in rag_response:
-                output = rag_response["output"].strip()
-            elif isinstance(rag_response, str):
-                output = rag_response.strip()
-            else:
+        # Trace du tour : chaque phase (recherche, agent, outils, LLM) est mesurée
+        with tracer.trace(direct=self.agent_rag.direct, question_chars=len(message)) as turn:
+            # Ajout du message utilisateur à l'historique
+            self.memory.append(HumanMessage(content=message))
+
+            try:
+                # Recherche via l'agent RAG avec l'historique borné
+                rag_response = self.agent_rag.search(self.historique)
+
+                # Gestion tolérante selon que la réponse est dict ou str
+                if isinstance(rag_response, dict) and "output" in rag_response:
+                    output = rag_response["output"].strip()
+                elif isinstance(rag_response, str):
+                    output = rag_response.strip()
+                else:
+                    output = ""
+
+            except Exception as e:
+                # En cas d'erreur dans RagAgent, on affiche un avertissement et continue
+                print(f"[⚠️ Erreur RagAgent] {e}")
                 output = ""
 
-        except Exception as e:
-            # En cas d'erreur dans RagAgent, on affiche un avertissement et continue
-            print(f"[⚠️ Erreur RagAgent] {e}")
-            output = ""
+            # Si la sortie est trop courte ou ne contient pas les mots clés attendus,
+            # on appelle directement le LLM en fallback
+            needs_fallback = self._needs_fallback(output)
+            if needs_fallback:
+                try:
+                    with tracer.span("llm.fallback"):
+                        output = self.llm.invoke(self.historique, config={"callbacks": tracer.callbacks()}).content.strip()
+                except Exception as e:
+                    # En cas d'erreur LLM direct, on retourne une réponse générique
+                    print(f"[⚠️ Erreur LLM direct] {e}")
+                    output = "Je ne sais pas."
+
+            # On filtre la sortie pour garder uniquement la réponse finale et la source
+            filtered_output = self._filter_final_answer_and_source(output)
+
+            # On ajoute la réponse AI à l'historique pour conserver le contexte,
+            # puis on résume les échanges sortis de la fenêtre en arrière-plan
+            self.memory.append(AIMessage(content=filtered_output))
+            self.memory.compact_in_background()
+            turn.set(fallback=needs_fallback, output_chars=len(filtered_output))
+
+        # Retour de la réponse finale filtrée
+        return filtered_output
+
+    async def amodel_response(self, message: str) -> str:
+        """
+        Version asynchrone de `model_response` : les outils de l'agent s'exécutent
+        en parallèle quand c'est possible (voir `RagAgent.asearch`).
+
+        Args:
+            message: message texte de l'utilisateur
+
+        Returns:
+            La réponse finale formatée à retourner à l'utilisateur.
+        """
+        with tracer.trace(direct=self.agent_rag.direct, question_chars=len(message)) as turn:
+            # Compaction du tour précédent éventuellement en cours : attendue hors de la boucle d'événements
+            await asyncio.to_thread(self.memory.wait)
+            self.memory.append(HumanMessage(content=message))
 
-        # Si la sortie est trop courte ou ne contient pas les mots clés attendus,
-        # on appelle directement le LLM en fallback
-        if len(output) < 20 or not any(m in output.lower() for m in RESPONSE_MARKERS):
             try:
-                output = self.llm.invoke(self.historique).content.strip()
+                output = (await self.agent_rag.asearch(self.historique)).strip()
             except Exception as e:
-                # En cas d'erreur LLM direct, on retourne une réponse générique
-                print(f"[⚠️ Erreur LLM direct] {e}")
-                output = "Je ne sais pas."
+                print(f"[⚠️ Erreur RagAgent] {e}")
+                output = ""
 
-        # On filtre la sortie pour garder uniquement la réponse finale et la source
-        filtered_output = self._filter_final_answer_and_source(output)
+            needs_fallback = self._needs_fallback(output)
+            if needs_fallback:
+                try:
+                    with tracer.span("llm.fallback"):
+                        answer = await self.llm.ainvoke(self.historique, config={"callbacks": tracer.callbacks()})
+                    output = answer.content.strip()
+                except Exception as e:
+                    print(f"[⚠️ Erreur LLM direct] {e}")
+                    output = "Je ne sais pas."
+
+            filtered_output = self._filter_final_answer_and_source(output)
+            self.memory.append(AIMessage(content=filtered_output))
+            # Le résumé de l'historique appelle le LLM : en arrière-plan, hors de la boucle d'événements
+            self.memory.compact_in_background()
+            turn.set(fallback=needs_fallback, output_chars=len(filtered_output))
+        return filtered_output
 
-        # On ajoute la réponse AI à l'historique pour conserver le contexte
-        self.historique.append(AIMessage(content=filtered_output))
+    def stream_response(self, message: str) -> Iterator[dict]:
+        """
+        Version en flux de `model_response` : émet les étapes de l'agent puis les
+        tokens de la réponse finale au fur et à mesure de leur génération.
 
-        # Retour de la réponse finale filtrée
-        return filtered_output
+        Événements émis (dict) :
+        - `action` / `observation` : appels d'outils de l'agent et leurs résultats ;
+        - `token` : morceau de la réponse finale ;
+        - `reset` : la réponse partielle est abandonnée (bascule sur le LLM direct) ;
+        - `final` : réponse finale filtrée, identique à celle de `model_response`.
+
+        Args:
+            message: message texte de l'utilisateur
+
+        Yields:
+            Les événements de la réponse, le dernier étant de type `final`.
+        """
+        with tracer.trace(direct=self.agent_rag.direct, question_chars=len(message), streaming=True) as turn:
+            self.memory.append(HumanMessage(content=message))
+
+            output = ""
+            try:
+                for event in self.agent_rag.stream(self.historique):
+                    if event["type"] == "final":
+                        output = event["output"].strip()
+                    else:
+                        yield event
+            except Exception as e:
+                print(f"[⚠️ Erreur RagAgent] {e}")
+                output = ""
 
+            # Fallback sur le LLM direct, lui aussi diffusé token par token
+            needs_fallback = self._needs_fallback(output)
+            if needs_fallback:
+                yield {"type": "reset"}
+                try:
+                    parts = []
+                    with tracer.span("llm.fallback"):
+                        for chunk in self.llm.stream(self.historique, config={"callbacks": tracer.callbacks()}):
+                            parts.append(chunk.content)
+                            yield {"type": "token", "text": chunk.content}
+                    output = "".join(parts).strip()
+                except Exception as e:
+                    print(f"[⚠️ Erreur LLM direct] {e}")
+                    output = "Je ne sais pas."
+
+            filtered_output = self._filter_final_answer_and_source(output)
+            self.memory.append(AIMessage(content=filtered_output))
+            # Résumé des anciens échanges en arrière-plan : la réponse finale n'attend pas le LLM
+            self.memory.compact_in_background()
+            yield {"type": "final", "output": filtered_output}
+            turn.set(fallback=needs_fallback, output_chars=len(filtered_output))
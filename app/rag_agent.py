@@ -1,10 +1,190 @@
+import asyncio
+import contextvars
+import queue
+import threading
+from typing import Iterator
+
 from langchain_ollama import ChatOllama
 from langchain import hub
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.tools import Tool
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from utils.search_chroma import documentSearch, duck_search
-from utils.safe_memory import SafeConversationMemory
+from utils.search_chroma import (
+    adocumentSearch,
+    aduck_search,
+    documentSearch,
+    duck_search,
+    format_documents,
+    get_web_prefetcher,
+    search_documents_scored,
+)
+from utils.context_packer import NO_DOCUMENT
+from utils.conversation_memory import SUMMARY_PREFIX
+from utils.resources import lazy_resource
+from utils.tracing import tracer
+from .react_prompt import REACT_PROMPT
+
+
+def documentSearch_with_prefetch(query: str) -> str:
+    """
+    Recherche documentaire qui anticipe la recherche web quand aucun document n'est trouvé.
+
+    Sans document, l'agent passe ensuite au web : la recherche web de la même requête
+    tourne pendant que le LLM rédige l'étape suivante. Si des documents sont trouvés,
+    aucune requête web n'est envoyée.
+    """
+    context = documentSearch(query)
+    if context == NO_DOCUMENT:
+        get_web_prefetcher().prefetch(query)
+    return context
+
+
+async def adocumentSearch_with_prefetch(query: str) -> str:
+    """Version asynchrone de `documentSearch_with_prefetch`."""
+    context = await adocumentSearch(query)
+    if context == NO_DOCUMENT:
+        get_web_prefetcher().prefetch(query)
+    return context
+
+
+def build_tools(prefetch_web: bool = False) -> list[Tool]:
+    """
+    Construit les outils de l'agent, en versions synchrone et asynchrone.
+
+    Args:
+        prefetch_web (bool): Si True, une recherche documentaire sans résultat
+            anticipe la recherche web de la même requête, servie sans attente
+            quand l'agent passe au web.
+
+    Returns:
+        list[Tool]: Outils "Recherche documents" et "Recherche web".
+    """
+    return [
+        Tool(
+            name="Recherche documents",
+            func=documentSearch_with_prefetch if prefetch_web else documentSearch,
+            coroutine=adocumentSearch_with_prefetch if prefetch_web else adocumentSearch,
+            description="Utilise les documents internes sur la transition écologique (lois, subventions, etc.)."
+        ),
+        Tool(
+            name="Recherche web",
+            func=duck_search,
+            coroutine=aduck_search,
+            description="Utilise une recherche web pour des données à jour sur la transition écologique."
+        )
+    ]
+
+
+@lazy_resource("tools")
+def get_tools() -> list[Tool]:
+    """
+    Outils de l'agent, sans état : partagés par toutes les sessions.
+
+    Returns:
+        list[Tool]: Outils "Recherche documents" et "Recherche web".
+    """
+    return build_tools()
+
+
+@lazy_resource("prefetch_tools")
+def get_prefetch_tools() -> list[Tool]:
+    """
+    Outils de l'agent avec recherche web anticipée, partagés par toutes les sessions.
+
+    Returns:
+        list[Tool]: Outils "Recherche documents" (avec anticipation) et "Recherche web".
+    """
+    return build_tools(prefetch_web=True)
+
+
+# Mode RAG direct : score de pertinence minimal du meilleur extrait pour se passer de l'agent.
+# Échelle de `search_documents_scored` (pertinence L2 de Chroma), non calibrée pour
+# `nomic-embed-text` : le mode direct est désactivé par défaut (`USE_DIRECT_RAG` dans `model.py`).
+DIRECT_RAG_MIN_SCORE = 0.55
+# ⬅️ Mets sur False pour ne chercher que la dernière question (sans la question précédente)
+DIRECT_RAG_FOLLOWUP_QUERY = True
+# Réponse attendue du LLM quand les extraits ne suffisent pas (bascule sur l'agent)
+INSUFFICIENT_MARKER = "INSUFFISANT"
+
+# Rôle du LLM en mode direct : sans les règles ReAct (format Thought/Action, recherche obligatoire)
+DIRECT_RAG_SYSTEM_PROMPT = """Tu es un assistant intelligent spécialisé dans les questions liées à la transition écologique.
+Tu réponds uniquement à partir des extraits de documents fournis, sans inventer de chiffre,
+et tu intègres les informations utiles de ces extraits dans ta réponse."""
+
+DIRECT_RAG_PROMPT = """{system_prompt}
+
+Réponds directement, sans outil, à partir des extraits de documents ci-dessous.
+Si ces extraits ne permettent pas de répondre à la dernière question de l'utilisateur,
+réponds uniquement : {marker}
+
+Extraits de documents :
+{context}
+
+Conversation :
+{conversation}
+
+Réponse finale claire et concise, en français :"""
+
+
+# Marqueur à partir duquel les tokens générés appartiennent à la réponse finale
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+
+class AgentEventHandler(BaseCallbackHandler):
+    """
+    Callback LangChain qui transforme l'exécution de l'agent en événements.
+
+    Les étapes (appels d'outils, observations) sont publiées dans une file,
+    ainsi que les tokens générés après le marqueur `Final Answer:`. Un modèle qui
+    ne diffuse pas ses tokens (aucun `on_llm_new_token`) publie sa réponse finale
+    d'un bloc, à la fin de l'appel.
+
+    Attributs :
+        events (queue.Queue) : File recevant les événements (dict).
+    """
+
+    def __init__(self, events: queue.Queue):
+        self.events = events
+        # Texte généré par appel LLM, et appels déjà entrés dans la réponse finale
+        self._buffers = {}
+        self._answering = set()
+
+    def on_agent_action(self, action, **kwargs):
+        self.events.put({"type": "action", "tool": action.tool, "input": str(action.tool_input)})
+
+    def on_tool_end(self, output, *, name: str | None = None, **kwargs):
+        self.events.put({"type": "observation", "tool": name, "output": str(output)})
+
+    def on_llm_new_token(self, token: str, *, run_id, **kwargs):
+        if run_id in self._answering:
+            self.events.put({"type": "token", "text": token})
+            return
+        buffer = self._buffers.get(run_id, "") + token
+        index = buffer.find(FINAL_ANSWER_MARKER)
+        if index < 0:
+            self._buffers[run_id] = buffer
+            return
+        # Le marqueur peut être découpé sur plusieurs tokens : on émet ce qui le suit
+        self._answering.add(run_id)
+        self._buffers.pop(run_id, None)
+        answer = buffer[index + len(FINAL_ANSWER_MARKER):].lstrip()
+        if answer:
+            self.events.put({"type": "token", "text": answer})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        streamed = run_id in self._buffers or run_id in self._answering
+        self._buffers.pop(run_id, None)
+        self._answering.discard(run_id)
+        if streamed:
+            return
+        # Modèle sans diffusion : la réponse finale arrive entière
+        text = "".join(g.text for generations in response.generations for g in generations)
+        index = text.find(FINAL_ANSWER_MARKER)
+        answer = text[index + len(FINAL_ANSWER_MARKER):].lstrip() if index >= 0 else ""
+        if answer:
+            self.events.put({"type": "token", "text": answer})
+
 
 class RagAgent:
     """
@@ -18,69 +198,79 @@ class RagAgent:
     Attributs :
         model : Le modèle LLM utilisé (ex: ChatOllama, ChatDeepSeek).
         system_prompt (str) : Le prompt système général donné au modèle.
-        memory : Mémoire conversationnelle sécurisée pour stocker l'historique.
+        direct_system_prompt (str) : Rôle du modèle en mode RAG direct (sans les règles ReAct).
         tools (list) : Liste des outils (documentSearch et duck_search) pour les actions.
-        prompt : Prompt spécifique tiré du hub LangChain (ex: "hwchase17/react").
-        agent : Agent ReAct créé avec les outils et le modèle.
-        executor : Exécuteur pour gérer les interactions entre agent, mémoire et outils.
+        prompt : Prompt ReAct ("hwchase17/react", embarqué localement ou tiré du hub).
+        agent : Agent ReAct créé avec les outils et le modèle (sans état, partageable).
+        executor : Exécuteur pour gérer les interactions entre agent et outils.
+
+    L'agent ne garde aucun historique : celui-ci (borné et résumé, voir
+    `utils/conversation_memory.py`) est fourni à chaque appel par `ChatModel`.
+    L'agent, les outils et le prompt peuvent être partagés entre sessions.
     """
 
-    def __init__(self, model, system_prompt: str, use_hub_prompt=True, verbose=True):
+    def __init__(
+        self,
+        model,
+        system_prompt: str,
+        use_hub_prompt=False,
+        verbose=True,
+        agent=None,
+        direct=False,
+        min_score: float = DIRECT_RAG_MIN_SCORE,
+        scored_search=None,
+        prefetch_web=False,
+        direct_system_prompt: str = DIRECT_RAG_SYSTEM_PROMPT,
+    ):
         """
         Initialise l'agent RagAgent avec le modèle, le prompt système et la configuration.
 
         Args:
             model : Modèle LLM à utiliser pour l'agent.
             system_prompt (str) : Prompt système pour cadrer la conversation.
-            use_hub_prompt (bool) : Si True, récupère le prompt depuis LangChain Hub.
+            use_hub_prompt (bool) : Si True, récupère le prompt depuis LangChain Hub
+                (appel réseau) au lieu de la copie locale.
             verbose (bool) : Active les logs détaillés.
-        
-        Raises:
-            ValueError : Si use_hub_prompt est False (non supporté ici).
+            agent : Agent ReAct déjà construit pour ce modèle (partagé entre sessions).
+                S'il est absent, un agent dédié est créé.
+            direct (bool) : Active le mode RAG direct : une recherche documentaire puis
+                un seul appel au LLM, l'agent n'étant utilisé qu'en cas de confiance insuffisante.
+            min_score (float) : Score de pertinence minimal du meilleur extrait en mode direct.
+            scored_search (callable | None) : Recherche `(question, ) -> [(Document, score)]`
+                du mode direct (par défaut `search_documents_scored`).
+            prefetch_web (bool) : Lance la recherche web dès qu'une recherche documentaire
+                ne trouve rien, pendant que le LLM prépare le passage au web.
+            direct_system_prompt (str) : Rôle donné au LLM en mode direct (`system_prompt`
+                impose le format ReAct et une recherche préalable, sans objet ici).
         """
         self.model = model
         self.system_prompt = system_prompt
+        self.direct_system_prompt = direct_system_prompt
+        self.direct = direct
+        self.min_score = min_score
+        self.scored_search = scored_search or search_documents_scored
 
-        # Initialise une mémoire de conversation sécurisée avec clés pour l'entrée/sortie
-        self.memory = SafeConversationMemory(
-            memory_key="chat_history",
-            return_messages=True,
-            input_key="input",
-            output_key="output"
-        )
+        # Outils partagés à disposition de l'agent (mêmes noms, avec ou sans anticipation du web)
+        self.tools = get_prefetch_tools() if prefetch_web else get_tools()
 
-        # Définition des outils à disposition de l'agent
-        self.tools = [
-            Tool(
-                name="Recherche documents",
-                func=documentSearch,
-                description="Utilise les documents internes sur la transition écologique (lois, subventions, etc.)."
-            ),
-            Tool(
-                name="Recherche web",
-                func=duck_search,
-                description="Utilise une recherche web pour des données à jour sur la transition écologique."
-            )
-        ]
-
-        # Chargement du prompt ReAct depuis le hub LangChain si demandé
+        # Prompt ReAct embarqué localement, ou depuis le hub LangChain si demandé
         if use_hub_prompt:
             self.prompt = hub.pull("hwchase17/react")
         else:
-            raise ValueError("Mode 'use_hub_prompt=False' non pris en charge dans cette version")
+            self.prompt = REACT_PROMPT
 
-        # Création de l'agent ReAct avec le modèle, les outils et le prompt
-        self.agent = create_react_agent(
+        # Agent ReAct partagé, ou création d'un agent dédié avec le modèle, les outils et le prompt
+        self.agent = agent or create_react_agent(
             llm=self.model,
             tools=self.tools,
             prompt=self.prompt
         )
 
-        # Création de l'exécuteur d'agent, avec mémoire et gestion d'erreurs
+        # Création de l'exécuteur d'agent, avec gestion d'erreurs.
+        # Pas de mémoire : l'historique est déjà inclus (une seule fois) dans l'entrée
         self.executor = AgentExecutor.from_agent_and_tools(
             agent=self.agent,
             tools=self.tools,
-            memory=self.memory,
             verbose=verbose,
             handle_parsing_errors=True,
             max_iterations=7  # Limite du nombre d'itérations de réflexion/actes
@@ -91,36 +281,35 @@ class RagAgent:
         Convertit l'historique des messages en une chaîne de texte formatée.
 
         Args:
-            historique (list): Liste des messages HumanMessage et AIMessage.
+            historique (list): Liste des messages HumanMessage et AIMessage,
+                et éventuellement le résumé des anciens échanges (SystemMessage).
 
         Returns:
             str: Texte concaténé avec préfixes "Utilisateur :" et "Assistant :"
         """
         prompt = ""
         for message in historique:
-            if isinstance(message, HumanMessage):
+            if isinstance(message, SystemMessage) and message.content.startswith(SUMMARY_PREFIX):
+                prompt += f"{message.content}\n"
+            elif isinstance(message, HumanMessage):
                 prompt += f"Utilisateur : {message.content}\n"
             elif isinstance(message, AIMessage):
                 prompt += f"Assistant : {message.content}\n"
         return prompt.strip()
 
-    def search(self, historique):
+    def _build_inputs(self, historique) -> dict:
         """
-        Lance une recherche et interaction avec l'agent ReAct à partir de l'historique.
+        Construit l'entrée de l'agent : prompt ReAct strict suivi de l'historique.
 
-        Cette méthode construit un prompt complet incluant un "injection" avec les règles
-        strictes à suivre, puis exécute l'agent avec l'historique donné, et filtre la sortie
-        pour extraire la réponse finale et les sources.
+        L'historique n'est envoyé qu'une fois, aplati dans `input` : le prompt ReAct
+        n'a pas de variable pour des messages séparés.
 
         Args:
             historique (list): Liste des messages précédents (HumanMessage, AIMessage).
 
         Returns:
-            str: Réponse finale filtrée contenant la réponse et la source.
+            dict: Entrée `input` de l'exécuteur.
         """
-        # Combine le prompt système et l'historique en messages
-        messages = [SystemMessage(content=self.system_prompt)] + historique
-
         # Injection du prompt ReAct strict détaillant les règles à suivre
         injection = (
         "Tu es un agent ReAct. Tu dois OBLIGATOIREMENT suivre ce format exact à chaque étape :\n\n"
@@ -154,42 +343,266 @@ class RagAgent:
 
         print("\n🟦 Prompt envoyé à l’agent :\n", prompt_text)
 
-         # Invocation de l'agent avec le prompt et l'historique de conversation
-        response = self.executor.invoke({
-            "input": prompt_text,
-            "chat_history": messages
-        })
+        return {"input": prompt_text}
+
+    @staticmethod
+    def _retrieval_queries(historique) -> list[str]:
+        """
+        Requêtes de la recherche directe : la dernière question, puis, si elle n'est pas
+        la première, la même précédée de la question précédente.
+
+        Une relance ("et en 2020 ?", "et pour le gaz ?") ne contient pas son sujet :
+        la seconde requête le reprend, sans appel supplémentaire au LLM.
+        """
+        questions = [m.content for m in historique if isinstance(m, HumanMessage)]
+        if not questions:
+            return [""]
+        if not DIRECT_RAG_FOLLOWUP_QUERY or len(questions) < 2:
+            return [questions[-1]]
+        return [questions[-1], f"{questions[-2]} {questions[-1]}"]
+
+    def _scored_documents(self, historique) -> list[tuple]:
+        """
+        Extraits de la recherche directe, fusionnés sur les requêtes de `_retrieval_queries`.
+
+        Un extrait trouvé par plusieurs requêtes garde son meilleur score ; le nombre
+        d'extraits est celui d'une recherche seule.
+        """
+        best, limit = {}, 0
+        for query in self._retrieval_queries(historique):
+            scored = self.scored_search(query)
+            limit = max(limit, len(scored))
+            for doc, score in scored:
+                if doc.page_content not in best or score > best[doc.page_content][1]:
+                    best[doc.page_content] = (doc, score)
+        return sorted(best.values(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def _direct_prompt(self, historique) -> str | None:
+        """
+        Prépare l'appel unique au LLM du mode RAG direct.
+
+        Args:
+            historique (list): Liste des messages précédents, terminée par la question.
+
+        Returns:
+            str | None: Prompt avec les extraits trouvés, ou None si la confiance
+            de la recherche est insuffisante (l'agent complet doit alors répondre).
+        """
+        try:
+            scored = self._scored_documents(historique)
+        except Exception as e:
+            print(f"[⚠️ Recherche directe impossible] {e}")
+            return None
+        confidence = max((score for _, score in scored), default=0.0)
+        tracer.annotate(confidence=round(confidence, 3))
+        print(f"\n🎯 Confiance de la recherche directe : {confidence:.2f} (seuil {self.min_score:.2f})")
+        if confidence < self.min_score:
+            return None
+        docs = [doc for doc, score in scored if score >= self.min_score]
+        return DIRECT_RAG_PROMPT.format(
+            system_prompt=self.direct_system_prompt.strip(),
+            marker=INSUFFICIENT_MARKER,
+            context=format_documents(docs),
+            conversation=self.historique_to_prompt(historique),
+        )
+
+    @staticmethod
+    def _direct_output(answer: str) -> str | None:
+        """Formate la réponse du mode direct, ou None si le LLM l'a jugée impossible."""
+        answer = answer.strip()
+        if not answer or answer.upper().startswith(INSUFFICIENT_MARKER):
+            return None
+        return f"{answer}\n\nSource : Documents"
+
+    def direct_search(self, historique) -> str | None:
+        """
+        Mode RAG direct : une recherche documentaire et un seul appel au LLM.
+
+        Args:
+            historique (list): Liste des messages précédents (HumanMessage, AIMessage).
+
+        Returns:
+            str | None: Réponse et source, ou None s'il faut recourir à l'agent complet.
+        """
+        with tracer.span("rag.direct") as span:
+            prompt = self._direct_prompt(historique)
+            if prompt is None:
+                span.set(answered=False)
+                return None
+            direct_output = self._direct_output(self.model.invoke(prompt, config={"callbacks": tracer.callbacks()}).content)
+            span.set(answered=direct_output is not None)
+        return direct_output
+
+    @staticmethod
+    def filter_output(text: str) -> str:
+        """
+        Filtre la sortie brute pour extraire la réponse finale et la source.
+
+        Args:
+            text (str): Texte brut généré par l'agent.
+
+        Returns:
+            str: Réponse finale formatée avec la source si présente.
+        """
+        lines = text.splitlines()
+        final_answer = None
+        source = None
+        for line in lines:
+            lline = line.lower().strip()
+            if lline.startswith("final answer:"):
+                final_answer = line.split(":", 1)[1].strip()
+            elif lline.startswith("source :"):
+                source = line.split(":", 1)[1].strip()
+        if final_answer is None:
+            return text.strip()
+        if source:
+            return f"{final_answer}\n\nSource : {source}"
+        return final_answer
+
+    def search(self, historique):
+        """
+        Lance une recherche et interaction avec l'agent ReAct à partir de l'historique.
+
+        Cette méthode construit un prompt complet incluant un "injection" avec les règles
+        strictes à suivre, puis exécute l'agent avec l'historique donné, et filtre la sortie
+        pour extraire la réponse finale et les sources.
+
+        Args:
+            historique (list): Liste des messages précédents (HumanMessage, AIMessage).
+
+        Returns:
+            str: Réponse finale filtrée contenant la réponse et la source.
+        """
+        # Mode direct : l'agent complet n'intervient que si la recherche ne suffit pas
+        if self.direct:
+            direct_output = self.direct_search(historique)
+            if direct_output is not None:
+                print("\n🟩 Réponse directe :\n", direct_output)
+                return direct_output
+            print("\n↪️ Confiance insuffisante : bascule sur l'agent ReAct.")
+
+        # Invocation de l'agent avec le prompt et l'historique de conversation
+        with tracer.span("agent.run"):
+            response = self.executor.invoke(self._build_inputs(historique), config={"callbacks": tracer.callbacks()})
 
         # Extraction du texte de sortie brut
         output = response.get("output", "") if isinstance(response, dict) else str(response)
 
-        def filter_output(text: str) -> str:
-            """
-            Filtre la sortie brute pour extraire la réponse finale et la source.
-
-            Args:
-                text (str): Texte brut généré par l'agent.
-
-            Returns:
-                str: Réponse finale formatée avec la source si présente.
-            """
-            lines = text.splitlines()
-            final_answer = None
-            source = None
-            for line in lines:
-                lline = line.lower().strip()
-                if lline.startswith("final answer:"):
-                    final_answer = line.split(":", 1)[1].strip()
-                elif lline.startswith("source :"):
-                    source = line.split(":", 1)[1].strip()
-            if final_answer is None:
-                return text.strip()
-            if source:
-                return f"{final_answer}\n\nSource : {source}"
-            return final_answer
-        
         # Application du filtre sur la sortie brute
-        final_output = filter_output(output)
+        final_output = self.filter_output(output)
 
         print("\n🟩 Résultat filtré :\n", final_output)
         return final_output
+
+    async def asearch(self, historique):
+        """
+        Version asynchrone de `search`.
+
+        Les outils s'exécutent via leurs coroutines (`adocumentSearch`, `aduck_search`) :
+        les pauses entre tentatives web ne bloquent pas la boucle d'événements, et
+        plusieurs conversations peuvent être servies dans un même processus. L'agent
+        ReAct n'émet qu'une action par étape : les outils d'une même réponse restent
+        successifs (la recherche web peut être anticipée, voir `prefetch_web`).
+
+        Args:
+            historique (list): Liste des messages précédents (HumanMessage, AIMessage).
+
+        Returns:
+            str: Réponse finale filtrée contenant la réponse et la source.
+        """
+        if self.direct:
+            with tracer.span("rag.direct") as span:
+                prompt = await asyncio.to_thread(self._direct_prompt, historique)
+                direct_output = None
+                if prompt is not None:
+                    answer = await self.model.ainvoke(prompt, config={"callbacks": tracer.callbacks()})
+                    direct_output = self._direct_output(answer.content)
+                span.set(answered=direct_output is not None)
+            if direct_output is not None:
+                print("\n🟩 Réponse directe :\n", direct_output)
+                return direct_output
+            print("\n↪️ Confiance insuffisante : bascule sur l'agent ReAct.")
+
+        with tracer.span("agent.run"):
+            response = await self.executor.ainvoke(self._build_inputs(historique), config={"callbacks": tracer.callbacks()})
+        output = response.get("output", "") if isinstance(response, dict) else str(response)
+        final_output = self.filter_output(output)
+        print("\n🟩 Résultat filtré :\n", final_output)
+        return final_output
+
+    def stream(self, historique) -> Iterator[dict]:
+        """
+        Exécute l'agent ReAct en émettant ses étapes et les tokens de la réponse finale.
+
+        En mode direct, la réponse du LLM est diffusée token par token ; si elle s'avère
+        impossible, un événement `reset` précède le passage à l'agent complet.
+
+        L'agent tourne dans un thread ; ses événements sont transmis au fur et à mesure :
+        - `{"type": "action", "tool", "input"}` : appel d'un outil ;
+        - `{"type": "observation", "tool", "output"}` : résultat de l'outil ;
+        - `{"type": "token", "text"}` : token de la réponse finale (après `Final Answer:`) ;
+        - `{"type": "final", "output"}` : réponse finale filtrée (dernier événement).
+
+        Args:
+            historique (list): Liste des messages précédents (HumanMessage, AIMessage).
+
+        Yields:
+            dict: Événements de l'agent.
+
+        Raises:
+            Exception : Toute erreur levée par l'exécuteur, après la fin du flux.
+        """
+        if self.direct:
+            emitted = 0
+            direct_output = None
+            with tracer.span("rag.direct") as span:
+                prompt = self._direct_prompt(historique)
+                if prompt is not None:
+                    # Les premiers caractères sont retenus tant qu'ils peuvent former le marqueur d'échec
+                    answer = ""
+                    for chunk in self.model.stream(prompt, config={"callbacks": tracer.callbacks()}):
+                        answer += chunk.content
+                        if INSUFFICIENT_MARKER.startswith(answer.strip().upper()):
+                            continue
+                        yield {"type": "token", "text": answer[emitted:]}
+                        emitted = len(answer)
+                    direct_output = self._direct_output(answer)
+                span.set(answered=direct_output is not None)
+            if direct_output is not None:
+                print("\n🟩 Réponse directe :\n", direct_output)
+                yield {"type": "final", "output": direct_output}
+                return
+            print("\n↪️ Confiance insuffisante : bascule sur l'agent ReAct.")
+            if emitted:
+                yield {"type": "reset"}
+
+        inputs = self._build_inputs(historique)
+        events = queue.Queue()
+        result = {}
+
+        with tracer.span("agent.run"):
+            callbacks = [AgentEventHandler(events), *tracer.callbacks()]
+
+            def run():
+                try:
+                    result["response"] = self.executor.invoke(inputs, config={"callbacks": callbacks})
+                except Exception as e:
+                    result["error"] = e
+                finally:
+                    events.put(None)
+
+            # Le thread reprend le contexte courant : les spans des outils se rattachent au tour
+            worker = threading.Thread(target=contextvars.copy_context().run, args=(run,),
+                                      name="rag-agent-stream", daemon=True)
+            worker.start()
+            while (event := events.get()) is not None:
+                yield event
+            worker.join()
+
+        if "error" in result:
+            raise result["error"]
+        response = result["response"]
+        output = response.get("output", "") if isinstance(response, dict) else str(response)
+        final_output = self.filter_output(output)
+        print("\n🟩 Résultat filtré :\n", final_output)
+        yield {"type": "final", "output": final_output}
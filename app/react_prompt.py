@@ -0,0 +1,30 @@
+"""
+Prompt ReAct embarqué localement.
+
+Copie du prompt `hwchase17/react` du LangChain Hub : l'agent n'a plus besoin
+d'un appel réseau (`hub.pull`) à chaque démarrage.
+"""
+
+from langchain_core.prompts import PromptTemplate
+
+REACT_TEMPLATE = """Answer the following questions as best you can. You have access to the following tools:
+
+{tools}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+Question: {input}
+Thought:{agent_scratchpad}"""
+
+REACT_PROMPT = PromptTemplate.from_template(REACT_TEMPLATE)
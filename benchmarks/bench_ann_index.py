@@ -0,0 +1,178 @@
+"""
+Index ANN projeté en mémoire (`utils/chroma/ann_index.py`) comparé au client Chroma.
+
+Les fichiers de `data/raw` sont nettoyés et indexés dans un dossier temporaire avec
+des embeddings factices (voir `bench_retrieval`), puis la collection est exportée en
+int8 et en float32. Pour chaque base :
+- taille sur disque et temps d'ouverture ;
+- rappel@fetch_k : part des `fetch_k` plus proches voisins exacts (recherche
+  exhaustive) retrouvés pour les questions de `retrieval_questions.json` ;
+- p50 / p95 : latence d'une requête des `fetch_k` candidats (textes, métadonnées,
+  distances et vecteurs, comme `mmr_search_with_scores`), hors embedding ;
+- R@5 / MRR / docs : qualité de `create_advanced_retriever` avec cette base.
+
+Enfin, `--workers` processus ouvrent le même index et l'interrogent en même temps :
+la mémoire résidente des fichiers projetés (RSS) est comparée à leur part propre
+(PSS, pages partagées divisées par le nombre de processus), lue dans `/proc/self/smaps`.
+
+Usage :
+    python -m benchmarks.bench_ann_index [--raw-dir data/raw] [--fetch-k 50] [--workers 4]
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_chroma import Chroma
+
+from benchmarks.bench_retrieval import DEFAULT_CONFIGS, QUESTIONS_FILE, build_index, evaluate, percentile
+from benchmarks.fake_embeddings import DelayedFakeEmbeddings
+from utils.chroma.ann_index import AnnIndex, export_ann_index
+from utils.chroma.run_cleaning import RAW_DIR
+from utils.resources import registry
+
+INCLUDE = ["metadatas", "documents", "distances", "embeddings"]
+
+
+def exact_neighbours(vectordb, queries: list, k: int) -> list[set[str]]:
+    """IDs des `k` plus proches voisins exacts (distance L2 au carré) de chaque requête."""
+    collection = vectordb.get(include=["embeddings"])
+    ids = np.array(collection["ids"])
+    vectors = np.asarray(collection["embeddings"], dtype=np.float32)
+    return [set(ids[np.argsort(((vectors - np.asarray(q, dtype=np.float32)) ** 2).sum(axis=1))[:k]]) for q in queries]
+
+
+def measure_store(query, queries: list, truth: list[set[str]], k: int) -> dict:
+    """Rappel des voisins exacts et latence d'une fonction `query(embedding, k)` retournant des résultats Chroma."""
+    query(queries[0], k)  # Première requête : chargement de l'index HNSW / des pages
+    latencies, recall = [], 0.0
+    for embedding, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = query(embedding, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recall += len(set(results["ids"][0]) & expected) / len(expected)
+    return {"recall": recall / len(queries), "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95)}
+
+
+def _mapped_memory(path: Path) -> tuple[int, int]:
+    """RSS et PSS (ko) des fichiers de `path` projetés dans le processus courant."""
+    rss = pss = 0
+    current = False
+    prefix = str(path.resolve())
+    with open("/proc/self/smaps", encoding="utf-8") as smaps:
+        for line in smaps:
+            fields = line.split()
+            if "-" in fields[0] and not fields[0].endswith(":"):
+                current = len(fields) >= 6 and fields[5].startswith(prefix)
+            elif current and fields[0] == "Rss:":
+                rss += int(fields[1])
+            elif current and fields[0] == "Pss:":
+                pss += int(fields[1])
+    return rss, pss
+
+
+def _worker(path: Path, queries: list, k: int, barrier, results):
+    """Processus de service : ouvre l'index, l'interroge, puis mesure sa mémoire quand tous ont fini."""
+    index = AnnIndex(path)
+    for embedding in queries:
+        index.query([embedding], n_results=k, include=INCLUDE)
+    barrier.wait()
+    results.put(_mapped_memory(path))
+    barrier.wait()
+
+
+def measure_workers(path: Path, queries: list, k: int, workers: int) -> tuple[float, float] | None:
+    """RSS et PSS moyens (Mo) de l'index projeté par `workers` processus simultanés (None hors Linux)."""
+    if not Path("/proc/self/smaps").exists():
+        return None
+    context = multiprocessing.get_context("spawn")
+    barrier, results = context.Barrier(workers), context.Queue()
+    processes = [context.Process(target=_worker, args=(path, queries, k, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    memory = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return statistics.mean(rss for rss, _ in memory) / 1e3, statistics.mean(pss for _, pss in memory) / 1e3
+
+
+def run(raw_dir: Path, fetch_k: int, workers: int):
+    """
+    Construit et exporte l'index, puis compare Chroma et l'index ANN.
+
+    Args:
+        raw_dir (Path): Dossier des fichiers bruts.
+        fetch_k (int): Nombre de candidats demandés par requête.
+        workers (int): Processus simultanés pour la mesure des pages partagées (0 = aucune mesure).
+    """
+    questions = json.loads(QUESTIONS_FILE.read_text(encoding="utf-8"))
+    raw_dir = raw_dir.resolve()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        os.chdir(tmp)
+        try:
+            embedding = DelayedFakeEmbeddings()
+            build = build_index(raw_dir, tmp, embedding)
+            print(f"🏗️ Index : {build['vectors']} vecteurs | indexation {build['index_s']:.1f}s")
+            if not build["vectors"]:
+                print(f"⚠️ Aucun document indexé depuis {raw_dir}.")
+                return
+            chroma_dir = tmp / "chroma_db"
+            exports = {}
+            with contextlib.redirect_stdout(io.StringIO()):
+                for quantization in ("float32", "int8"):
+                    out_dir = tmp / f"ann_{quantization}"
+                    exports[quantization] = (out_dir, export_ann_index(chroma_dir, out_dir, quantization))
+
+            vectordb = Chroma(persist_directory=str(chroma_dir), embedding_function=embedding)
+            registry.register("embedding", lambda: embedding)
+            registry.register("chroma", lambda: vectordb)
+            queries = embedding.embed_documents([item["question"] for item in questions])
+            truth = exact_neighbours(vectordb, queries, fetch_k)
+            chroma_mb = sum(f.stat().st_size for f in chroma_dir.rglob("*") if f.is_file() and "lexical" not in f.name) / 1e6
+
+            print(f"❓ {len(questions)} questions, {fetch_k} candidats par requête\n")
+            print(f"{'base':<12} {'Mo':>6} {'ouverture':>9} | {'rappel':>6} {'p50 ms':>7} {'p95 ms':>7} | {'R@5':>5} {'MRR':>5} {'docs':>5}")
+            rows = [("chroma", chroma_mb, None, None, lambda q, k: vectordb._collection.query(
+                query_embeddings=[q], n_results=k, include=INCLUDE))]
+            for quantization, (out_dir, stats) in exports.items():
+                start = time.perf_counter()
+                index = AnnIndex(out_dir, embeddings=embedding)
+                open_ms = (time.perf_counter() - start) * 1000
+                rows.append((f"ann {quantization}", stats["size_mb"], open_ms, index,
+                             lambda q, k, index=index: index.query([q], n_results=k, include=INCLUDE)))
+            for name, size_mb, open_ms, index, query in rows:
+                neighbours = measure_store(query, queries, truth, fetch_k)
+                if index is not None:
+                    registry.register("ann_index", lambda index=index: index)
+                    registry.reset("ann_index")
+                config = {**DEFAULT_CONFIGS[0], "fetch_k": fetch_k, "backend": "chroma" if index is None else "ann"}
+                retrieval = evaluate(config, questions)
+                opened = "-" if open_ms is None else f"{open_ms:.1f} ms"
+                print(f"{name:<12} {size_mb:>6.1f} {opened:>9} | {neighbours['recall']:>6.2f} {neighbours['p50_ms']:>7.2f} "
+                      f"{neighbours['p95_ms']:>7.2f} | {retrieval['recall@5']:>5.2f} {retrieval['mrr']:>5.2f} {retrieval['docs']:>5.1f}")
+
+            if workers:
+                memory = measure_workers(exports["int8"][0], queries, fetch_k, workers)
+                if memory:
+                    print(f"\n👥 {workers} processus sur l'index int8 : {memory[0]:.1f} Mo projetés par processus "
+                          f"(RSS), {memory[1]:.1f} Mo propres (PSS), {memory[1] * workers:.1f} Mo au total.")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR)
+    parser.add_argument("--fetch-k", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    run(args.raw_dir, args.fetch_k, args.workers)
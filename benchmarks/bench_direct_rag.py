@@ -0,0 +1,133 @@
+"""
+Benchmark du mode RAG direct face à l'agent ReAct complet.
+
+Un LLM factice à latence configurable rejoue un raisonnement ReAct typique
+(recherche documents, recherche web, réponse finale) ou répond directement quand
+il reçoit le prompt du mode RAG direct. La recherche documentaire est simulée avec
+une part configurable de questions peu pertinentes, qui basculent sur l'agent.
+Enfin, `stream_response` est rejoué dans les deux modes : le LLM factice ne diffusant
+pas ses tokens, le nombre d'événements `token` vérifie que la réponse finale est
+tout de même transmise à l'interface.
+
+Usage :
+    python -m benchmarks.bench_direct_rag [--questions 20] [--llm-delay 0.3] [--low-confidence 0.2]
+"""
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import time
+
+from langchain_core.documents import Document
+from langchain_core.language_models import SimpleChatModel
+from langchain_core.tools import Tool
+
+from utils.resources import registry
+
+
+class ScriptedReactChatModel(SimpleChatModel):
+    """
+    LLM factice : réponse directe au prompt RAG direct, sinon étapes ReAct successives.
+
+    Attributs :
+        delay (float) : Latence simulée par appel (secondes).
+        calls (int) : Nombre d'appels effectués.
+    """
+
+    delay: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-react"
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs) -> str:
+        time.sleep(self.delay)
+        self.calls += 1
+        prompt = "\n".join(str(m.content) for m in messages)
+        if "Extraits de documents" in prompt:
+            return "L'empreinte carbone de la France était d'environ 663 Mt CO2e en 2021."
+        # Nombre d'observations déjà renvoyées par les outils factices
+        steps = prompt.count("Observation: 663")
+        if steps == 0:
+            return "Thought: Je commence par les documents.\nAction: Recherche documents\nAction Input: empreinte carbone"
+        if steps == 1:
+            return "Thought: Je complète avec le web.\nAction: Recherche web\nAction Input: empreinte carbone"
+        return ("Thought: J'ai réuni suffisamment d'informations.\n"
+                "Final Answer: Environ 663 Mt CO2e en 2021.\nSource : Documents, Web")
+
+
+def make_scored_search(low_confidence: float, delay: float, seed: int = 0):
+    """Recherche avec score factice : une part `low_confidence` des requêtes est peu pertinente."""
+    rng = random.Random(seed)
+    scores = {}
+
+    def search(query: str) -> list[tuple]:
+        time.sleep(delay)
+        if query not in scores:
+            scores[query] = 0.3 if rng.random() < low_confidence else 0.8
+        doc = Document(page_content="Empreinte carbone 2021 | 663 Mt CO2e", metadata={"source_file": "synthetique"})
+        return [(doc, scores[query])]
+
+    return search
+
+
+def run(n_questions: int, llm_delay: float, search_delay: float, low_confidence: float):
+    """
+    Répond aux mêmes questions dans les deux modes et affiche latences et appels au LLM.
+
+    Args:
+        n_questions (int): Nombre de questions posées.
+        llm_delay (float): Latence simulée par appel au LLM (secondes).
+        search_delay (float): Latence simulée par recherche (secondes).
+        low_confidence (float): Part des questions dont la recherche est peu pertinente.
+    """
+    from app.model import ChatModel
+
+    # Outils factices, déclarés après l'import qui enregistre les vrais outils
+    registry.register("tools", lambda: [
+        Tool(name="Recherche documents", func=lambda q: (time.sleep(search_delay), "663 Mt CO2e")[1], description="Documents."),
+        Tool(name="Recherche web", func=lambda q: (time.sleep(search_delay), "663 Mt CO2e")[1], description="Web."),
+    ])
+
+    questions = [f"Quelle était l'empreinte carbone de la France (question {i}) ?" for i in range(n_questions)]
+    for direct in (False, True):
+        llm = ScriptedReactChatModel(delay=llm_delay)
+        scored_search = make_scored_search(low_confidence, search_delay)
+        latencies = []
+        for question in questions:
+            # Une conversation par question : aucun appel de résumé d'historique.
+            # Sans anticipation du web : les outils factices remplacent les outils "tools"
+            chat = ChatModel(model=llm, direct_rag=direct, prefetch_web=False)
+            chat.agent_rag.executor.verbose = False
+            chat.agent_rag.scored_search = scored_search
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                chat.model_response(question)
+            latencies.append(time.perf_counter() - start)
+        label = "RAG direct" if direct else "Agent ReAct"
+        print(f"⏱️ {label:<11} : latence moyenne {statistics.mean(latencies):.2f}s "
+              f"| max {max(latencies):.2f}s | {llm.calls / n_questions:.1f} appels LLM par question")
+
+    # Le LLM factice ne diffuse pas ses tokens : la réponse finale doit tout de même arriver en événements `token`
+    for direct in (False, True):
+        chat = ChatModel(model=ScriptedReactChatModel(), direct_rag=direct, prefetch_web=False)
+        chat.agent_rag.executor.verbose = False
+        chat.agent_rag.scored_search = make_scored_search(0.0, 0.0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            events = list(chat.stream_response(questions[0]))
+        tokens = sum(event["type"] == "token" for event in events)
+        label = "RAG direct" if direct else "Agent ReAct"
+        status = "" if tokens else " ⚠️ réponse finale non diffusée"
+        print(f"📡 {label:<11} : {tokens} événement(s) token en flux (LLM sans diffusion){status}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--llm-delay", type=float, default=0.3)
+    parser.add_argument("--search-delay", type=float, default=0.05)
+    parser.add_argument("--low-confidence", type=float, default=0.2)
+    args = parser.parse_args()
+    run(args.questions, args.llm_delay, args.search_delay, args.low_confidence)
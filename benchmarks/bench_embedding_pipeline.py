@@ -0,0 +1,71 @@
+"""
+Benchmark du pipeline d'indexation concurrent.
+
+Indexe des chunks synthétiques dans une base Chroma temporaire avec des embeddings
+factices à latence configurable, pour comparer un worker unique (comportement
+séquentiel) et plusieurs workers concurrents.
+
+Usage :
+    python -m benchmarks.bench_embedding_pipeline [--chunks 4000] [--delay 0.2] [--failure-rate 0.05]
+"""
+import argparse
+import tempfile
+import time
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+from benchmarks.fake_embeddings import DelayedFakeEmbeddings
+from chroma_db import BATCH_SIZE_INDEX, generate_chunk_id
+from utils.chroma.embedding_pipeline import AdaptiveBackoff, run_embedding_pipeline
+
+
+def make_batches(n_chunks: int, batch_size: int) -> list[list[Document]]:
+    """Génère des batchs de chunks synthétiques avec leurs IDs."""
+    chunks = []
+    for i in range(n_chunks):
+        text = f"Série {i} | émissions de CO2 | secteur {i % 17} | année {1990 + i % 34}"
+        chunks.append(Document(page_content=text, metadata={"source_file": "synthetique", "id": generate_chunk_id(text)}))
+    return [chunks[i:i + batch_size] for i in range(0, n_chunks, batch_size)]
+
+
+def run(n_chunks: int, delay: float, failure_rate: float, workers: list[int], batch_size: int = BATCH_SIZE_INDEX):
+    """
+    Indexe les mêmes chunks avec différents nombres de workers et affiche les temps.
+
+    Args:
+        n_chunks (int): Nombre de chunks synthétiques.
+        delay (float): Latence simulée par appel d'embedding (secondes).
+        failure_rate (float): Probabilité d'échec d'un appel d'embedding.
+        workers (list[int]): Nombres de workers à comparer.
+        batch_size (int): Taille des batchs.
+    """
+    batches = make_batches(n_chunks, batch_size)
+    for n_workers in workers:
+        embedding = DelayedFakeEmbeddings(delay=delay, failure_rate=failure_rate)
+        with tempfile.TemporaryDirectory() as tmp:
+            vectordb = Chroma(persist_directory=tmp, embedding_function=embedding)
+            start = time.perf_counter()
+            stats = run_embedding_pipeline(
+                batches,
+                embedding,
+                vectordb,
+                max_workers=n_workers,
+                backoff=AdaptiveBackoff(min_delay=delay / 2 or 0.05),
+                total=len(batches),
+            )
+            elapsed = time.perf_counter() - start
+            stored = vectordb._collection.count()
+        print(f"⏱️ {n_workers} worker(s) : {elapsed:.2f}s | {stats['indexed']} chunks indexés "
+              f"({stored} en base) | {stats['failed']} batch(s) en échec | {embedding.calls} appels")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=4000)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE_INDEX)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+    run(args.chunks, args.delay, args.failure_rate, args.workers, args.batch_size)
@@ -0,0 +1,200 @@
+"""
+Benchmark des recherches documentaire et web : séquentielles, parallèles ou anticipées.
+
+La recherche vectorielle tourne sur une base Chroma temporaire avec des embeddings
+factices à latence configurable ; DuckDuckGo est remplacé par un client local
+qui répond après un délai (et échoue une fois sur deux à la première tentative
+avec `--web-failures`). Trois modes sont comparés pour une même requête :
+- séquentiel : `documentSearch` puis `duck_search` (boucle ReAct synchrone) ;
+- parallèle : `adocumentSearch` et `aduck_search` via `asyncio.gather` ;
+- anticipé : `get_web_prefetcher().prefetch` (comme les outils de l'agent quand les
+  documents ne donnent rien), recherche documentaire, puis `duck_search`.
+
+Avec `--check`, les mêmes remplaçants servent à vérifier le mode asynchrone (le
+script s'arrête en erreur sinon) :
+- `adocumentSearch` et `aduck_search` lancés ensemble via `asyncio.gather` rendent
+  les mêmes résultats que les versions synchrones, en moins de temps que les deux
+  à la suite ;
+- `RagAgent.asearch`, avec un LLM factice et des outils dont seule la coroutine
+  répond, appelle les outils par leur coroutine et renvoie la réponse finale.
+
+Usage :
+    python -m benchmarks.bench_parallel_tools [--queries 10] [--embedding-delay 0.2] [--web-delay 0.5]
+    python -m benchmarks.bench_parallel_tools --check
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_chroma import Chroma
+from langchain_core.messages import HumanMessage
+
+import utils.search_chroma as search_chroma
+from benchmarks.fake_embeddings import DelayedFakeEmbeddings
+from utils.resources import registry
+from utils.web_cache import WebSearchCache
+
+
+class FakeDDGS:
+    """Client DuckDuckGo local : mêmes méthodes que `DDGS`, latence et échecs simulés."""
+
+    delay = 0.5
+    fail_first = False
+    _calls = itertools.count()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def text(self, query, region=None, safesearch=None, max_results=5):
+        time.sleep(self.delay)
+        if self.fail_first and next(self._calls) % 2 == 0:
+            raise RuntimeError("202 Ratelimit (simulé)")
+        return [{"title": f"Résultat {i}", "body": f"{query} ({i})", "href": f"https://exemple.fr/{i}"} for i in range(max_results)]
+
+
+def setup(tmp: str, embedding_delay: float, web_delay: float, web_failures: bool):
+    """Remplace DuckDuckGo et les embeddings Ollama par leurs équivalents locaux."""
+    FakeDDGS.delay = web_delay
+    FakeDDGS.fail_first = web_failures
+    search_chroma.DDGS = FakeDDGS
+    # Cache web temporaire : le cache persistant du projet n'est ni lu ni modifié
+    registry.register("web_cache", lambda: WebSearchCache(Path(tmp) / "web_cache.sqlite3"))
+
+    embedding = DelayedFakeEmbeddings(delay=0.0)
+    vectordb = Chroma(persist_directory=tmp, embedding_function=embedding)
+    vectordb.add_texts(
+        [f"Émissions de CO2 du secteur {i % 17} en {1990 + i % 34} | rénovation énergétique" for i in range(500)],
+        metadatas=[{"source_file": "synthetique"} for _ in range(500)],
+    )
+    # La latence ne s'applique qu'aux requêtes, une fois la base construite
+    embedding.delay = embedding_delay
+    registry.register("embedding", lambda: embedding)
+    registry.register("chroma", lambda: vectordb)
+
+
+def timed(label: str, func, queries: list[str]) -> float:
+    """Exécute `func` sur chaque requête et affiche la latence moyenne."""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(query)
+        latencies.append(time.perf_counter() - start)
+    mean = statistics.mean(latencies)
+    print(f"⏱️ {label:<11} : {mean:.2f}s par requête (max {max(latencies):.2f}s)")
+    return mean
+
+
+def run(n_queries: int, embedding_delay: float, web_delay: float, web_failures: bool):
+    """
+    Compare les trois modes sur des requêtes distinctes (aucun cache ne sert).
+
+    Args:
+        n_queries (int): Nombre de requêtes par mode.
+        embedding_delay (float): Latence simulée de l'embedding d'une requête (secondes).
+        web_delay (float): Latence simulée d'un appel DuckDuckGo (secondes).
+        web_failures (bool): Fait échouer un appel web sur deux (relance après la pause par défaut).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(tmp, embedding_delay, web_delay, web_failures)
+
+        def sequential(query):
+            search_chroma.documentSearch(query)
+            search_chroma.duck_search(query)
+
+        def parallel(query):
+            async def both():
+                return await asyncio.gather(search_chroma.adocumentSearch(query), search_chroma.aduck_search(query))
+            asyncio.run(both())
+
+        def prefetched(query):
+            search_chroma.get_web_prefetcher().prefetch(query)
+            search_chroma.documentSearch(query)
+            search_chroma.duck_search(query)
+
+        for label, func in (("Séquentiel", sequential), ("Parallèle", parallel), ("Anticipé", prefetched)):
+            timed(label, func, [f"émissions secteur {i} ({label})" for i in range(n_queries)])
+
+
+def check(embedding_delay: float, web_delay: float):
+    """
+    Vérifie les recherches asynchrones et `RagAgent.asearch` avec les remplaçants locaux.
+
+    Args:
+        embedding_delay (float): Latence simulée de l'embedding d'une requête (secondes).
+        web_delay (float): Latence simulée d'un appel DuckDuckGo (secondes).
+
+    Raises:
+        AssertionError: Si une vérification échoue.
+    """
+    from langchain_core.tools import Tool
+
+    from app.rag_agent import RagAgent
+    from benchmarks.bench_direct_rag import ScriptedReactChatModel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(tmp, embedding_delay, web_delay, web_failures=False)
+
+        async def both(query):
+            return await asyncio.gather(search_chroma.adocumentSearch(query), search_chroma.aduck_search(query))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            documents, web = asyncio.run(both("émissions secteur 3 en 2005"))
+            parallel = time.perf_counter() - start
+            # Requêtes déjà en cache : la référence synchrone ne compte pas dans la durée mesurée
+            assert documents == search_chroma.documentSearch("émissions secteur 3 en 2005"), "recherche documentaire différente"
+            assert web == search_chroma.duck_search("émissions secteur 3 en 2005"), "recherche web différente"
+        assert parallel < embedding_delay + web_delay, f"recherches non parallèles ({parallel:.2f}s)"
+        print(f"✅ asyncio.gather : mêmes résultats qu'en synchrone, {parallel:.2f}s "
+              f"(< {embedding_delay + web_delay:.2f}s à la suite)")
+
+        # Outils remplaçants : la version synchrone échoue, seule la coroutine répond
+        calls = []
+
+        def sync_tool(query):
+            raise AssertionError("outil synchrone appelé par asearch")
+
+        def async_tool(name):
+            async def run_tool(query):
+                calls.append(name)
+                await asyncio.sleep(0.01)
+                return "663 Mt CO2e"
+            return run_tool
+
+        registry.register("tools", lambda: [
+            Tool(name="Recherche documents", func=sync_tool, coroutine=async_tool("documents"), description="Documents."),
+            Tool(name="Recherche web", func=sync_tool, coroutine=async_tool("web"), description="Web."),
+        ])
+        try:
+            agent = RagAgent(ScriptedReactChatModel(), "Assistant.", verbose=False)
+            with contextlib.redirect_stdout(io.StringIO()):
+                answer = asyncio.run(agent.asearch([HumanMessage(content="Empreinte carbone de la France ?")]))
+        finally:
+            registry.reset("tools")
+        assert calls == ["documents", "web"], f"outils appelés : {calls}"
+        assert "663 Mt CO2e" in answer, f"réponse inattendue : {answer!r}"
+        print(f"✅ RagAgent.asearch : outils appelés par leur coroutine ({', '.join(calls)}), réponse finale renvoyée")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--embedding-delay", type=float, default=0.2)
+    parser.add_argument("--web-delay", type=float, default=0.5)
+    parser.add_argument("--web-failures", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+    if args.check:
+        check(args.embedding_delay, args.web_delay)
+        raise SystemExit
+    run(args.queries, args.embedding_delay, args.web_delay, args.web_failures)
@@ -0,0 +1,73 @@
+"""
+Benchmark de la conversion ligne → document des fichiers .parquet nettoyés.
+
+Compare l'ancienne conversion `pandas.iterrows` avec la construction colonnaire
+Polars de `chroma_db.build_parquet_documents`, et vérifie que les textes produits
+sont identiques. La colonne de page des .parquet PDF (`PAGE_COLUMN`) est une
+métadonnée : elle est exclue du texte dans les deux cas.
+
+Usage :
+    python -m benchmarks.bench_parquet_documents [dossier_clean]
+"""
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from chroma_db import DEFAULT_CLEAN_DIR, PAGE_COLUMN, build_parquet_documents
+
+
+def iterrows_texts(file: Path) -> list[str]:
+    """Reproduit l'ancienne conversion ligne par ligne avec `iterrows` (sans la colonne de page)."""
+    df = pd.read_parquet(file)
+    if PAGE_COLUMN in df.columns and pd.api.types.is_integer_dtype(df[PAGE_COLUMN]):
+        df = df.drop(columns=PAGE_COLUMN)
+    texts = []
+    for _, row in df.iterrows():
+        text = " | ".join(str(value) for value in row.values if pd.notna(value)).strip()
+        if text:
+            texts.append(text)
+    return texts
+
+
+def run(clean_dir: Path = DEFAULT_CLEAN_DIR):
+    """
+    Mesure les deux conversions pour chaque fichier .parquet et affiche un tableau.
+
+    Args:
+        clean_dir (Path): Répertoire contenant les fichiers nettoyés.
+    """
+    files = sorted(clean_dir.rglob("*.parquet"))
+    if not files:
+        print(f"⚠️ Aucun fichier .parquet dans {clean_dir}. Lancez d'abord `clean_all()`.")
+        return
+
+    total_legacy = total_columnar = 0.0
+    mismatches = []
+    print(f"{'fichier':<60} {'lignes':>8} {'iterrows (s)':>13} {'polars (s)':>11}")
+    for file in files:
+        start = time.perf_counter()
+        legacy = iterrows_texts(file)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        columnar = [doc.page_content for doc in build_parquet_documents(file)]
+        columnar_time = time.perf_counter() - start
+
+        total_legacy += legacy_time
+        total_columnar += columnar_time
+        if legacy != columnar:
+            mismatches.append(file.name)
+        print(f"{file.name[:60]:<60} {len(legacy):>8} {legacy_time:>13.3f} {columnar_time:>11.3f}")
+
+    print(f"\n⏱️ Total iterrows : {total_legacy:.2f}s | Total polars : {total_columnar:.2f}s "
+          f"(x{total_legacy / max(total_columnar, 1e-9):.1f})")
+    if mismatches:
+        print(f"❌ Textes différents pour : {', '.join(mismatches)}")
+    else:
+        print("✅ Textes identiques pour tous les fichiers.")
+
+
+if __name__ == "__main__":
+    run(Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CLEAN_DIR)
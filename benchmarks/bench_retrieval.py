@@ -0,0 +1,395 @@
+"""
+Qualité et latence de la recherche documentaire, hors ligne, pour plusieurs réglages.
+
+Les fichiers de `data/raw` sont nettoyés puis indexés dans un dossier temporaire
+avec des embeddings factices déterministes (aucun appel Ollama). Chaque réglage de
+`create_advanced_retriever` (k, fetch_k, lambda_mult, threshold, score_margin, hybrid,
+rerank, rerank_budget_ms) est ensuite évalué sur les questions étiquetées de
+`retrieval_questions.json`, qui associent chaque question à ses fichiers sources attendus :
+- rappel@5 et rappel@k : part des questions dont un document attendu figure dans
+  les 5 (ou k) premiers résultats ;
+- MRR : moyenne de 1 / rang du premier document attendu (0 s'il est absent) ;
+- itérations : nombre moyen d'itérations de l'agent ReAct par réponse, estimation
+  scriptée (aucun LLM appelé, pas une mesure) selon le scénario de `bench_direct_rag` (recherche documents puis réponse finale si un
+  document attendu figure parmi les `AGENT_READ_RESULTS` premiers résultats, sinon
+  recherche web intermédiaire) ;
+- docs / tokens : nombre moyen de documents retournés et taille de l'observation
+  transmise au LLM (`format_documents`, tokens estimés) ;
+- R@obs : part des questions dont un fichier attendu figure encore dans
+  l'observation, une fois le budget de tokens appliqué ;
+- p50 / p95 : latence d'une recherche (millisecondes).
+
+Les embeddings factices reposent sur les mots communs : les chiffres donnent un
+ordre de grandeur pour comparer les réglages entre eux, pas la qualité absolue du
+modèle `nomic-embed-text`. Avec `--embeddings ollama`, l'index et les requêtes
+utilisent le vrai modèle (serveur Ollama requis).
+
+Avec `--calibrate`, le seuil (`RETRIEVER_MIN_SCORE`) et la marge
+(`ADAPTIVE_SCORE_MARGIN`) sont balayés : pour chaque couple, R@5 en recherche
+vectorielle seule et en recherche hybride, et nombre moyen de documents retournés.
+Le seuil et la marge ne se règlent que sur les scores du modèle réellement utilisé.
+
+Avec `--check`, le seuil et la marge (désactivés par défaut) sont activés et
+vérifiés : le seuil est pris au centile `CHECK_THRESHOLD_PERCENTILE` des meilleurs
+scores des questions, et chaque document retourné doit l'atteindre et rester à
+moins de `CHECK_MARGIN` du meilleur. Le script s'arrête en erreur sinon.
+
+Avec `--calibrate-cache`, chaque question contenant un nombre (année, code,
+département) est comparée à sa variante où ce nombre change : ces requêtes ne
+doivent pas partager leurs résultats. La distance cosinus entre les deux
+embeddings est affichée ; `QUERY_CACHE_SEMANTIC_DISTANCE` doit rester sous la
+plus petite d'entre elles (aucun index n'est construit).
+
+Usage :
+    python -m benchmarks.bench_retrieval [--raw-dir data/raw] [--config k=24,fetch_k=50,threshold=0.45,hybrid=1,rerank=1 ...]
+    python -m benchmarks.bench_retrieval --calibrate [--embeddings ollama]
+    python -m benchmarks.bench_retrieval --check [--embeddings ollama]
+    python -m benchmarks.bench_retrieval --calibrate-cache --embeddings ollama
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_chroma import Chroma
+
+import utils.search_chroma as search_chroma
+from benchmarks.fake_embeddings import DelayedFakeEmbeddings
+from chroma_db import index_documents
+from utils.chroma.embedding_cache import CachedEmbeddings
+from utils.chroma.run_cleaning import RAW_DIR, clean_all
+from utils.conversation_memory import count_tokens
+from utils.query_cache import cosine_distance
+from utils.resources import registry
+
+QUESTIONS_FILE = Path(__file__).with_name("retrieval_questions.json")
+AGENT_READ_RESULTS = 5  # résultats réellement exploités par l'agent dans l'observation
+CALIBRATION_THRESHOLDS = [None, 0.3, 0.35, 0.4, 0.45, 0.5]  # seuils balayés par `--calibrate`
+CALIBRATION_MARGINS = [None, 0.3, 0.2, 0.1]                # marges balayées par `--calibrate`
+CHECK_THRESHOLD_PERCENTILE = 25  # centile des meilleurs scores retenu comme seuil par `--check`
+CHECK_MARGIN = 0.1               # marge vérifiée par `--check`
+
+# Réglage de production (`get_advanced_search`) en premier, puis variations d'un paramètre à la fois
+_BASE = {"k": 24, "fetch_k": 50, "lambda_mult": 0.5, "threshold": None, "score_margin": None,
+         "hybrid": True, "rerank": True, "rerank_budget_ms": 30.0}
+DEFAULT_CONFIGS = [
+    _BASE,
+    {**_BASE, "rerank": False},
+    {**_BASE, "hybrid": False},
+    {**_BASE, "threshold": 0.45, "score_margin": 0.1},
+    {**_BASE, "rerank": True, "rerank_budget_ms": 0.01},
+    {**_BASE, "fetch_k": 100},
+    {**_BASE, "rerank": False, "k": 8},
+    {**_BASE, "rerank": True, "k": 8},
+    {**_BASE, "lambda_mult": 1.0},
+]
+
+
+def raw_name(source_file: str) -> str:
+    """
+    Nom du fichier brut (sans extension) à l'origine d'un fichier .parquet nettoyé.
+
+    Args:
+        source_file (str): Métadonnée `source_file` d'un document (ex : `rapport.pdf.parquet`).
+
+    Returns:
+        str: Nom du fichier brut sans extension (ex : `rapport`).
+    """
+    name = source_file.removesuffix(".parquet")
+    return name.removesuffix(".pdf")
+
+
+def parse_config(text: str) -> dict:
+    """Convertit `"k=24,fetch_k=50,threshold=0.45,score_margin=none,hybrid=1,rerank=0"` en paramètres du retriever."""
+    config = dict(DEFAULT_CONFIGS[0])
+    for item in text.split(","):
+        key, value = item.split("=")
+        key = key.strip()
+        if key in {"hybrid", "rerank"}:
+            config[key] = value.strip().lower() in {"1", "true", "oui"}
+        elif value.strip().lower() == "none":
+            config[key] = None
+        else:
+            config[key] = float(value) if "." in value else int(value)
+    return config
+
+
+def first_relevant_rank(docs: list, expected: set[str]) -> int | None:
+    """Rang (à partir de 1) du premier document issu d'un fichier attendu, ou None."""
+    for rank, doc in enumerate(docs, start=1):
+        if raw_name(doc.metadata.get("source_file", "")) in expected:
+            return rank
+    return None
+
+
+def percentile(values: list[float], q: int) -> float:
+    """Centile `q` (1 à 99) d'une liste de valeurs."""
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def build_index(raw_dir: Path, tmp: Path, embedding) -> dict:
+    """
+    Nettoie `raw_dir` et l'indexe dans `tmp` ; retourne les durées et le nombre de vecteurs.
+
+    Args:
+        raw_dir (Path): Dossier des fichiers bruts (csv/, xls/, pdf/).
+        tmp (Path): Dossier temporaire (données nettoyées, base Chroma, caches).
+        embedding: Embeddings factices.
+
+    Returns:
+        dict: `clean_s`, `index_s` et `vectors`.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        clean_all(raw_dir, tmp / "clean")
+        clean_s = time.perf_counter() - start
+        start = time.perf_counter()
+        stats = index_documents(
+            clean_dir=tmp / "clean",
+            chroma_dir=tmp / "chroma_db",
+            embedding=embedding,
+            use_embedding_cache=False,
+        )
+        index_s = time.perf_counter() - start
+    return {"clean_s": clean_s, "index_s": index_s, "vectors": stats["indexed"] if stats else 0}
+
+
+def evaluate(config: dict, questions: list[dict]) -> dict:
+    """
+    Évalue un réglage du retriever avancé sur les questions étiquetées.
+
+    Args:
+        config (dict): Paramètres de `create_advanced_retriever`.
+        questions (list[dict]): Questions `{"question", "sources"}`.
+
+    Returns:
+        dict: `recall@5`, `recall@k`, `mrr`, `iterations`, `docs`, `tokens`, `recall@obs`, `p50_ms` et `p95_ms`.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        search = search_chroma.create_advanced_retriever(**config)
+        search(questions[0]["question"])  # Première recherche : chargement de l'index HNSW
+    latencies, hits5, hitsk, reciprocal, iterations, n_docs, tokens, in_context = [], 0, 0, 0.0, 0, 0, 0, 0
+    for item in questions:
+        expected = {Path(source).stem for source in item["sources"]}
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            docs = search(item["question"])
+            latencies.append((time.perf_counter() - start) * 1000)
+        n_docs += len(docs)
+        context = search_chroma.format_documents(docs)
+        tokens += count_tokens(context)
+        in_context += any(f"[{name}" in context for name in expected)
+        rank = first_relevant_rank(docs, expected)
+        # Recherche documents + réponse finale, précédée d'une recherche web si rien d'exploitable
+        iterations += 2 if rank is not None and rank <= AGENT_READ_RESULTS else 3
+        if rank is not None:
+            hits5 += rank <= 5
+            hitsk += rank <= config["k"]
+            reciprocal += 1 / rank
+    n = len(questions)
+    return {
+        "recall@5": hits5 / n,
+        "recall@k": hitsk / n,
+        "mrr": reciprocal / n,
+        "iterations": iterations / n,
+        "docs": n_docs / n,
+        "tokens": tokens / n,
+        "recall@obs": in_context / n,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def calibrate(questions: list[dict]):
+    """
+    Balaye seuil et marge et affiche le rappel en recherche vectorielle seule et hybride.
+
+    Args:
+        questions (list[dict]): Questions `{"question", "sources"}`.
+    """
+    base = DEFAULT_CONFIGS[0]
+    print(f"{'seuil':>5} {'marge':>5} | {'R@5 vecteurs':>12} {'docs':>5} | {'R@5 hybride':>11} {'docs':>5}")
+    for threshold in CALIBRATION_THRESHOLDS:
+        for margin in CALIBRATION_MARGINS:
+            config = {**base, "threshold": threshold, "score_margin": margin}
+            vector = evaluate({**config, "hybrid": False}, questions)
+            hybrid = evaluate({**config, "hybrid": True}, questions)
+            print(f"{'-' if threshold is None else threshold:>5} {'-' if margin is None else margin:>5} | {vector['recall@5']:>12.2f} {vector['docs']:>5.1f} | "
+                  f"{hybrid['recall@5']:>11.2f} {hybrid['docs']:>5.1f}")
+
+
+def check_score_filters(questions: list[dict]):
+    """
+    Active le seuil et la marge et vérifie qu'ils s'appliquent à chaque document retourné.
+
+    Args:
+        questions (list[dict]): Questions `{"question", "sources"}`.
+
+    Raises:
+        AssertionError: Si un document passe le filtre à tort, ou si le filtre ne retire rien.
+    """
+    base = DEFAULT_CONFIGS[0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        unfiltered = search_chroma.create_advanced_retriever(**base)
+        results = {item["question"]: unfiltered(item["question"]) for item in questions}
+    best_scores = [max(doc.metadata["score"] for doc in docs) for docs in results.values() if docs]
+    threshold = round(percentile(best_scores, CHECK_THRESHOLD_PERCENTILE), 3)
+    print(f"🎚️ Seuil {threshold} (centile {CHECK_THRESHOLD_PERCENTILE} des meilleurs scores), marge {CHECK_MARGIN}")
+
+    for rerank in (False, True):
+        with contextlib.redirect_stdout(io.StringIO()):
+            search = search_chroma.create_advanced_retriever(
+                **{**base, "threshold": threshold, "score_margin": CHECK_MARGIN, "rerank": rerank}
+            )
+            filtered = {question: search(question) for question in results}
+        for question, docs in filtered.items():
+            scores = [doc.metadata["score"] for doc in docs]
+            assert all(score >= threshold for score in scores), f"score sous le seuil : {question!r}"
+            assert not scores or max(scores) - min(scores) <= CHECK_MARGIN, f"score hors marge : {question!r}"
+            assert len(docs) <= len(results[question]), f"plus de documents qu'avant filtrage : {question!r}"
+        before = sum(len(docs) for docs in results.values())
+        after = sum(len(docs) for docs in filtered.values())
+        assert after < before, "le seuil et la marge n'ont retiré aucun document"
+        print(f"✅ rerank={'oui' if rerank else 'non'} : {before / len(results):.1f} → {after / len(results):.1f} documents par question, "
+              f"{sum(not docs for docs in filtered.values())} question(s) sans document")
+
+
+def identifier_variants(question: str) -> list[str]:
+    """Variantes d'une question où un seul nombre (année, code) est remplacé par le suivant."""
+    return [
+        question[:match.start()] + str(int(match.group()) + 1) + question[match.end():]
+        for match in re.finditer(r"\d+", question)
+    ]
+
+
+def calibrate_cache(questions: list[dict], embedding):
+    """
+    Affiche les distances cosinus entre chaque question et ses variantes d'identifiant.
+
+    Ces paires doivent rester des absences pour le niveau sémantique du cache de
+    requêtes : `QUERY_CACHE_SEMANTIC_DISTANCE` doit être inférieure à la plus petite distance.
+
+    Args:
+        questions (list[dict]): Questions `{"question", "sources"}`.
+        embedding: Embeddings des requêtes (`embed_query`).
+    """
+    distances = []
+    for item in questions:
+        vector = embedding.embed_query(item["question"])
+        for variant in identifier_variants(item["question"]):
+            distance = cosine_distance(vector, embedding.embed_query(variant))
+            distances.append((distance, item["question"], variant))
+    if not distances:
+        print("⚠️ Aucune question ne contient de nombre : rien à calibrer.")
+        return
+    distances.sort()
+    values = [distance for distance, _, _ in distances]
+    print(f"📏 {len(values)} paires question / variante d'identifiant : min {values[0]:.4f} | "
+          f"p5 {percentile(values, 5):.4f} | p50 {percentile(values, 50):.4f}")
+    for distance, question, variant in distances[:5]:
+        print(f"   {distance:.4f}  {question!r} ≠ {variant!r}")
+    print(f"👉 QUERY_CACHE_SEMANTIC_DISTANCE doit rester sous {values[0]:.4f} (sinon laisser None).")
+
+
+def run(
+    raw_dir: Path,
+    configs: list[dict],
+    embedding_delay: float,
+    embeddings: str = "fake",
+    calibration: bool = False,
+    check: bool = False,
+):
+    """
+    Construit l'index une fois, puis évalue chaque réglage et affiche un tableau de résultats.
+
+    Args:
+        raw_dir (Path): Dossier des fichiers bruts.
+        configs (list[dict]): Réglages à comparer.
+        embedding_delay (float): Latence simulée de l'embedding d'une requête (secondes).
+        embeddings (str): `"fake"` (embeddings factices) ou `"ollama"` (`nomic-embed-text`).
+        calibration (bool): Balaye seuil et marge (`calibrate`) au lieu d'évaluer `configs`.
+        check (bool): Vérifie le seuil et la marge (`check_score_filters`) au lieu d'évaluer `configs`.
+    """
+    questions = json.loads(QUESTIONS_FILE.read_text(encoding="utf-8"))
+    raw_dir = raw_dir.resolve()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        # Le cache et le journal d'indexation sont écrits dans le dossier courant
+        os.chdir(tmp)
+        try:
+            if embeddings == "ollama":
+                from langchain_ollama import OllamaEmbeddings
+
+                embedding = OllamaEmbeddings(model=search_chroma.EMBEDDING_MODEL)
+            else:
+                embedding = DelayedFakeEmbeddings()
+            build = build_index(raw_dir, tmp, embedding)
+            print(f"🏗️ Index : {build['vectors']} vecteurs | nettoyage {build['clean_s']:.1f}s "
+                  f"| indexation {build['index_s']:.1f}s")
+            if not build["vectors"]:
+                print(f"⚠️ Aucun document indexé depuis {raw_dir}.")
+                return
+
+            if embeddings == "ollama":
+                # Requêtes servies par le cache disque du dossier temporaire d'une configuration à l'autre
+                embedding = CachedEmbeddings(embedding, search_chroma.EMBEDDING_MODEL)
+            else:
+                # La latence ne s'applique qu'aux requêtes, une fois la base construite
+                embedding.delay = embedding_delay
+            vectordb = Chroma(persist_directory=str(tmp / "chroma_db"), embedding_function=embedding)
+            registry.register("embedding", lambda: embedding)
+            registry.register("chroma", lambda: vectordb)
+
+            print(f"❓ {len(questions)} questions étiquetées ({QUESTIONS_FILE.name})\n")
+            if calibration:
+                calibrate(questions)
+                return
+            if check:
+                check_score_filters(questions)
+                return
+            print(f"{'k':>3} {'fetch_k':>7} {'lambda':>6} {'seuil':>5} {'marge':>5} {'BM25':>4} {'rerank':>7} | {'R@5':>5} {'R@k':>5} "
+                  f"{'MRR':>5} {'iter.':>5} | {'docs':>5} {'tokens':>6} {'R@obs':>5} | {'p50 ms':>7} {'p95 ms':>7}")
+            for config in configs:
+                result = evaluate(config, questions)
+                margin = "-" if config["score_margin"] is None else config["score_margin"]
+                threshold = "-" if config["threshold"] is None else config["threshold"]
+                rerank = f"{config['rerank_budget_ms']:g}ms" if config["rerank"] else "non"
+                print(f"{config['k']:>3} {config['fetch_k']:>7} {config['lambda_mult']:>6} {threshold:>5} "
+                      f"{margin:>5} {'oui' if config['hybrid'] else 'non':>4} {rerank:>7} | "
+                      f"{result['recall@5']:>5.2f} {result['recall@k']:>5.2f} {result['mrr']:>5.2f} "
+                      f"{result['iterations']:>5.2f} | {result['docs']:>5.1f} {result['tokens']:>6.0f} {result['recall@obs']:>5.2f} | "
+                      f"{result['p50_ms']:>7.1f} {result['p95_ms']:>7.1f}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DIR)
+    parser.add_argument("--config", action="append", type=parse_config,
+                        help="Réglage à évaluer (répétable), ex : k=8,fetch_k=50,lambda_mult=0.5,threshold=0.45,score_margin=none,hybrid=0")
+    parser.add_argument("--embedding-delay", type=float, default=0.0)
+    parser.add_argument("--embeddings", choices=["fake", "ollama"], default="fake")
+    parser.add_argument("--calibrate", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--calibrate-cache", action="store_true")
+    args = parser.parse_args()
+    if args.calibrate_cache:
+        questions = json.loads(QUESTIONS_FILE.read_text(encoding="utf-8"))
+        if args.embeddings == "ollama":
+            from langchain_ollama import OllamaEmbeddings
+
+            calibrate_cache(questions, OllamaEmbeddings(model=search_chroma.EMBEDDING_MODEL))
+        else:
+            calibrate_cache(questions, DelayedFakeEmbeddings())
+        raise SystemExit
+    run(args.raw_dir, args.config or DEFAULT_CONFIGS, args.embedding_delay, args.embeddings, args.calibrate, args.check)
@@ -0,0 +1,67 @@
+"""
+Compare le pic mémoire de l'indexation fichier par fichier et de l'indexation en flux.
+
+Chaque mode indexe le même dossier `data/clean` dans une base Chroma temporaire, avec
+des embeddings factices (aucun appel Ollama), et rapporte le pic de mémoire résidente
+(RSS, buffers natifs Polars/Arrow compris). Le pic d'un processus ne redescendant
+jamais, chaque mode tourne dans son propre processus.
+
+Usage :
+    python -m benchmarks.bench_streaming_index [dossier_clean]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fake_embeddings import DelayedFakeEmbeddings
+from chroma_db import DEFAULT_CLEAN_DIR, index_documents
+
+
+def index_once(clean_dir: Path, streaming: bool, results):
+    """Processus de mesure : indexe `clean_dir` dans un dossier temporaire et transmet durée et statistiques."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # Le cache et le journal sont écrits dans le dossier courant
+        os.chdir(tmp)
+        start = time.perf_counter()
+        stats = index_documents(
+            clean_dir=clean_dir,
+            chroma_dir=Path(tmp) / "chroma_db",
+            embedding=DelayedFakeEmbeddings(),
+            use_embedding_cache=False,
+            streaming=streaming,
+            measure_memory=True,
+        )
+        results.put((time.perf_counter() - start, stats))
+
+
+def run(clean_dir: Path = DEFAULT_CLEAN_DIR):
+    """
+    Indexe `clean_dir` dans les deux modes et affiche durée et pic mémoire.
+
+    Args:
+        clean_dir (Path): Répertoire contenant les fichiers nettoyés.
+    """
+    clean_dir = clean_dir.resolve()
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for streaming in (False, True):
+        queue = context.Queue()
+        process = context.Process(target=index_once, args=(clean_dir, streaming, queue))
+        process.start()
+        results["flux" if streaming else "fichier par fichier"] = queue.get()
+        process.join()
+
+    print()
+    for mode, (elapsed, stats) in results.items():
+        if stats is None:
+            print(f"⚠️ {mode} : aucun fichier à indexer dans {clean_dir}.")
+            continue
+        print(f"📈 {mode:<20} : {elapsed:6.2f}s | pic RSS {stats['peak_rss_mb']:7.1f} Mo | "
+              f"{stats['chunks']} chunks, {stats['indexed']} indexés")
+
+
+if __name__ == "__main__":
+    run(Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CLEAN_DIR)
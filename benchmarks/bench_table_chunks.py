@@ -0,0 +1,126 @@
+"""
+Compare l'indexation des tableaux ligne par ligne et par blocs de lignes annotés.
+
+Le même dossier `data/clean` est indexé deux fois dans une base Chroma temporaire,
+avec des embeddings factices (aucun appel Ollama) : une ligne par document
+(`table_chunk_tokens=None`), puis en blocs de lignes précédés de l'en-tête des
+colonnes. Pour chaque mode sont rapportés le nombre de vecteurs, la taille de la
+base et un rappel@k approché : des questions « colonne + première valeur d'une
+ligne » sont tirées des tableaux, et une réponse est correcte si l'un des k
+documents retrouvés vient du bon fichier et contient la ligne.
+
+Usage :
+    python -m benchmarks.bench_table_chunks [dossier_clean] [--questions 200] [--k 5]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import polars as pl
+from langchain_chroma import Chroma
+
+from benchmarks.fake_embeddings import DelayedFakeEmbeddings
+from chroma_db import DEFAULT_CLEAN_DIR, index_documents, is_table_file, rows_to_records
+from utils.chroma.lexical_index import LEXICAL_INDEX_FILE
+from utils.chroma.table_chunker import UNNAMED_COLUMN
+
+
+def make_questions(clean_dir: Path, n_questions: int, seed: int = 0) -> list[tuple[str, str, str]]:
+    """
+    Tire des questions des tableaux : (question, fichier attendu, texte de la ligne attendue).
+
+    Args:
+        clean_dir (Path): Répertoire contenant les fichiers nettoyés.
+        n_questions (int): Nombre de questions.
+        seed (int): Graine du tirage.
+
+    Returns:
+        list[tuple[str, str, str]]: Questions et réponses attendues.
+    """
+    rng = random.Random(seed)
+    tables = []
+    for file in sorted(clean_dir.rglob("*.parquet")):
+        if not is_table_file(file):
+            continue
+        df = pl.read_parquet(file)
+        columns = [c for c in df.columns[1:] if not UNNAMED_COLUMN.match(c)]
+        texts = rows_to_records(df)["text"].to_list()
+        if columns and texts:
+            tables.append((file.name, columns, texts))
+    questions = []
+    for _ in range(n_questions if tables else 0):
+        name, columns, texts = rng.choice(tables)
+        text = rng.choice(texts)
+        questions.append((f"{rng.choice(columns)} {text.split(' | ')[0]}", name, text))
+    return questions
+
+
+def chroma_size_mb(path: Path) -> float:
+    """Taille totale des fichiers d'une base Chroma (Mo), hors index lexical."""
+    return sum(
+        f.stat().st_size for f in path.rglob("*")
+        if f.is_file() and not f.name.startswith(LEXICAL_INDEX_FILE)
+    ) / 1e6
+
+
+def run(clean_dir: Path, n_questions: int, k: int):
+    """
+    Indexe `clean_dir` dans les deux modes et affiche vecteurs, taille et rappel@k.
+
+    Args:
+        clean_dir (Path): Répertoire contenant les fichiers nettoyés.
+        n_questions (int): Nombre de questions d'évaluation.
+        k (int): Nombre de documents retrouvés par question.
+    """
+    clean_dir = clean_dir.resolve()
+    questions = make_questions(clean_dir, n_questions)
+    table_names = {file.name for file in clean_dir.rglob("*.parquet") if is_table_file(file)}
+    cwd = os.getcwd()
+    for label, tokens in (("Ligne par ligne", None), ("Blocs de lignes", "défaut")):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Le cache et le journal sont écrits dans le dossier courant
+            os.chdir(tmp)
+            try:
+                embedding = DelayedFakeEmbeddings()
+                kwargs = {} if tokens == "défaut" else {"table_chunk_tokens": tokens}
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stats = index_documents(
+                        clean_dir=clean_dir,
+                        chroma_dir=Path(tmp) / "chroma_db",
+                        embedding=embedding,
+                        use_embedding_cache=False,
+                        **kwargs,
+                    )
+                elapsed = time.perf_counter() - start
+                if stats is None:
+                    print(f"⚠️ Aucun fichier à indexer dans {clean_dir}.")
+                    return
+                vectordb = Chroma(persist_directory=str(Path(tmp) / "chroma_db"), embedding_function=embedding)
+                table_vectors = sum(
+                    metadata.get("source_file") in table_names
+                    for metadata in vectordb.get(include=["metadatas"])["metadatas"]
+                )
+                hits = 0
+                for question, name, text in questions:
+                    docs = vectordb.similarity_search(question, k=k)
+                    hits += any(d.metadata.get("source_file") == name and text in d.page_content for d in docs)
+                recall = hits / len(questions) if questions else 0.0
+                print(f"📊 {label:<16} : {stats['indexed']:6d} vecteurs (dont {table_vectors} de tableaux) | {chroma_size_mb(Path(tmp) / 'chroma_db'):6.1f} Mo "
+                      f"| indexation {elapsed:5.1f}s | rappel@{k} {recall:.2f}")
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("clean_dir", nargs="?", type=Path, default=DEFAULT_CLEAN_DIR)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    run(args.clean_dir, args.questions, args.k)
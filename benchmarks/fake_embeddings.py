@@ -0,0 +1,66 @@
+"""
+Embeddings locaux déterministes pour les benchmarks (sans serveur Ollama).
+
+Chaque texte est projeté en sac de mots haché : deux textes partageant des mots
+ont des vecteurs proches, ce qui suffit à exercer la recherche vectorielle.
+Un délai et un taux d'échec configurables simulent un serveur d'embedding distant.
+"""
+
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+class DelayedFakeEmbeddings(Embeddings):
+    """
+    Embeddings déterministes avec latence et échecs simulés.
+
+    Attributs :
+        dim (int) : Dimension des vecteurs.
+        delay (float) : Latence ajoutée à chaque appel (secondes).
+        failure_rate (float) : Probabilité qu'un appel lève une erreur.
+        calls (int) : Nombre d'appels effectués.
+    """
+
+    def __init__(self, dim: int = 256, delay: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.dim = dim
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> list[float]:
+        """Projette un texte en vecteur normalisé (sac de mots haché)."""
+        vector = [0.0] * self.dim
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] % 2 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _call(self):
+        """Simule la latence et les erreurs d'un serveur distant."""
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+        if self.delay:
+            time.sleep(self.delay)
+        if failed:
+            raise ConnectionError("Erreur simulée du serveur d'embedding")
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self._call()
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self._call()
+        return self._vector(text)
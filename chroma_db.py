@@ -1,8 +1,13 @@
 import hashlib
+import os
+import threading
 import time
 import json
 from pathlib import Path
-import pandas as pd
+from typing import Iterable, Iterator
+import polars as pl
+import psutil
+import pyarrow.parquet as pq
 
 from langchain_chroma import Chroma
 from langchain_ollama import OllamaEmbeddings
@@ -10,17 +15,30 @@ from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from utils.chroma.run_cleaning import clean_all
+from utils.chroma.embedding_pipeline import AdaptiveBackoff, run_embedding_pipeline
+from utils.chroma.ann_index import export_ann_index
+from utils.chroma.embedding_cache import CachedEmbeddings
+from utils.chroma.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from utils.chroma.table_chunker import TABLE_CHUNK_TOKENS, chunk_table_rows, table_header
+from utils.query_cache import bump_index_version
 
 DEFAULT_CLEAN_DIR = Path("data/clean")
 DEFAULT_CHROMA_DIR = Path("chroma_db")
 DEFAULT_EMBEDDING_MODEL = "nomic-embed-text"
 
 CACHE_FILE = Path("index_cache.json")
+JOURNAL_FILE = Path("index_journal.json")
 
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 100
-MAX_CHUNKS = 1000
 BATCH_SIZE_INDEX = 500
+ID_LOOKUP_BATCH = 500
+EMBEDDING_WORKERS = 4
+
+# Colonne entière des .parquet PDF (numéro de page) : stockée en métadonnée, hors du texte
+PAGE_COLUMN = "page"
+
+MEMORY_SAMPLE_INTERVAL = 0.01  # secondes entre deux relevés de la mémoire résidente
 
 
 def log_time(label: str, start: float):
@@ -34,6 +52,41 @@ def log_time(label: str, start: float):
     print(f"⏱️ {label}: {time.time() - start:.2f}s")
 
 
+class PeakMemory:
+    """
+    Relève en arrière-plan la mémoire résidente (RSS) du processus et en garde le pic.
+
+    Contrairement à `tracemalloc`, le RSS compte aussi les buffers natifs de Polars,
+    Arrow, numpy et Chroma. Le pic d'un processus ne redescend jamais : pour comparer
+    plusieurs exécutions, les lancer chacune dans son propre processus.
+
+    Attributs:
+        peak (int): Pic de mémoire résidente observé, en octets.
+    """
+
+    def __init__(self, interval: float = MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = self.process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="peak-memory", daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def start(self) -> "PeakMemory":
+        self._thread.start()
+        return self
+
+    def stop(self) -> int:
+        """Arrête les relevés et retourne le pic (octets)."""
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+        return self.peak
+
+
 def generate_chunk_id(text: str) -> str:
     """
     Génère un identifiant unique (hash MD5) à partir d'un texte.
@@ -88,51 +141,357 @@ def save_cache(cache: dict):
         json.dump(cache, f, indent=2, ensure_ascii=False)
 
 
-def load_parquet_documents(clean_dir: Path, changed_files: set[str]) -> list[Document]:
+def load_journal() -> dict:
+    """
+    Charge le journal de progression de l'indexation.
+
+    Le journal associe à chaque fichier en cours d'indexation son hash et le nombre
+    de chunks déjà stockés dans Chroma (information de reprise : les chunks à
+    renvoyer sont déterminés par leur ID, voir `fetch_existing_ids`).
+
+    Returns:
+        dict: Journal des fichiers dont l'indexation n'est pas terminée.
+    """
+    if JOURNAL_FILE.exists():
+        try:
+            with open(JOURNAL_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            print("⚠️ Journal d'indexation illisible, reprise depuis le début.")
+    return {}
+
+
+def save_journal(journal: dict):
     """
-    Charge les fichiers .parquet modifiés et crée des documents LangChain.
+    Sauvegarde le journal de progression de manière atomique.
 
     Args:
-        clean_dir (Path): Répertoire contenant les fichiers nettoyés.
-        changed_files (set[str]): Fichiers à recharger (modifiés).
+        journal (dict): Journal à sauvegarder (supprimé s'il est vide).
+    """
+    if not journal:
+        JOURNAL_FILE.unlink(missing_ok=True)
+        return
+    tmp = JOURNAL_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(journal, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, JOURNAL_FILE)
+
+
+def _column_as_text(name: str, dtype: pl.DataType, has_nulls: bool) -> pl.Expr:
+    """
+    Convertit une colonne en texte avec le même rendu que `str(value)` sous Pandas.
+
+    Les nettoyeurs ne produisent que des colonnes texte et entières : elles sont
+    converties nativement par Polars, les entiers avec valeurs nulles étant rendus
+    en flottants comme après `pd.read_parquet` (`3.0`). Les autres types passent par
+    une simple conversion `pl.Utf8`, sans garantie d'un rendu identique à Pandas.
+
+    Args:
+        name (str): Nom de la colonne.
+        dtype (pl.DataType): Type Polars de la colonne.
+        has_nulls (bool): La colonne contient-elle des valeurs nulles.
+
+    Returns:
+        pl.Expr: Expression produisant la colonne au format texte.
+    """
+    col = pl.col(name)
+    if dtype == pl.Utf8:
+        return col
+    if dtype == pl.Boolean:
+        return pl.when(col).then(pl.lit("True")).when(~col).then(pl.lit("False"))
+    if dtype.is_integer() and has_nulls:
+        return col.cast(pl.Float64).cast(pl.Utf8)
+    return col.cast(pl.Utf8)
+
+
+def _is_page_column(name: str, dtype: pl.DataType) -> bool:
+    """Indique si une colonne est le numéro de page d'un .parquet PDF (métadonnée, pas texte)."""
+    return name == PAGE_COLUMN and dtype.is_integer()
+
+
+def rows_to_records(
+    df: pl.DataFrame,
+    null_counts: tuple[int, ...] | None = None,
+    row_offset: int | None = None,
+) -> pl.DataFrame:
+    """
+    Construit en une seule passe colonnaire le texte de chaque ligne d'un DataFrame.
+
+    Chaque ligne devient la concaténation `" | "` de ses valeurs non nulles,
+    nettoyée des espaces en début/fin. Les lignes vides sont supprimées. Le numéro
+    de page des .parquet PDF (`PAGE_COLUMN`) est conservé à part, hors du texte :
+    une page donne ainsi le texte `"contenu | source"`.
+
+    Args:
+        df (pl.DataFrame): Données nettoyées issues d'un fichier .parquet.
+        null_counts (tuple[int, ...] | None): Nombre de valeurs nulles par colonne
+            dans le fichier complet, quand `df` n'en est qu'une partie.
+        row_offset (int | None): Si renseigné, ajoute la colonne `row` (numéro de ligne
+            dans le fichier, `df` commençant à la ligne `row_offset`).
+
+    Returns:
+        pl.DataFrame: Colonne `text` (et `page`, `row` si présentes), lignes non vides, dans l'ordre du fichier.
+    """
+    if null_counts is None:
+        null_counts = df.null_count().row(0)
+    columns = [
+        _column_as_text(name, dtype, nulls > 0)
+        for (name, dtype), nulls in zip(df.schema.items(), null_counts)
+        if not _is_page_column(name, dtype)
+    ]
+    if not columns:
+        schema = {"text": pl.Utf8} if row_offset is None else {"text": pl.Utf8, "row": pl.Int64}
+        return pl.DataFrame(schema=schema)
+    text = (
+        pl.concat_str(columns, separator=" | ", ignore_nulls=True)
+        .str.strip_chars()
+        .alias("text")
+    )
+    keep = [pl.col(PAGE_COLUMN)] if any(_is_page_column(n, t) for n, t in df.schema.items()) else []
+    if row_offset is not None:
+        keep.append(pl.int_range(pl.len(), dtype=pl.Int64).add(row_offset).alias("row"))
+    return df.select(text, *keep).filter(pl.col("text").is_not_null() & (pl.col("text") != ""))
+
+
+def rows_to_texts(df: pl.DataFrame, null_counts: tuple[int, ...] | None = None) -> pl.Series:
+    """
+    Textes des lignes non vides d'un DataFrame (voir `rows_to_records`).
+
+    Args:
+        df (pl.DataFrame): Données nettoyées issues d'un fichier .parquet.
+        null_counts (tuple[int, ...] | None): Nombre de valeurs nulles par colonne
+            dans le fichier complet, quand `df` n'en est qu'une partie.
+
+    Returns:
+        pl.Series: Textes des lignes non vides, dans l'ordre du fichier.
+    """
+    return rows_to_records(df, null_counts)["text"]
+
+
+def records_to_documents(records: pl.DataFrame, source_file: str) -> list[Document]:
+    """
+    Crée les documents LangChain à partir des textes d'un fichier.
+
+    Args:
+        records (pl.DataFrame): Résultat de `rows_to_records`.
+        source_file (str): Nom du fichier .parquet d'origine.
+
+    Returns:
+        list[Document]: Un document par ligne, avec `source_file` (et `page`) en métadonnée.
+    """
+    if PAGE_COLUMN not in records.columns:
+        return [
+            Document(page_content=text, metadata={"source_file": source_file})
+            for text in records["text"].to_list()
+        ]
+    return [
+        Document(page_content=text, metadata={"source_file": source_file, "page": page})
+        for text, page in records.iter_rows()
+    ]
+
+
+def build_parquet_documents(file: Path) -> list[Document]:
+    """
+    Crée les documents LangChain d'un fichier .parquet de manière vectorisée.
+
+    Args:
+        file (Path): Fichier .parquet nettoyé.
+
+    Returns:
+        list[Document]: Un document par ligne non vide, avec `source_file` en métadonnée
+        (et `page` pour les PDF).
+    """
+    return records_to_documents(rows_to_records(pl.read_parquet(file)), file.name)
+
+
+def iter_parquet_documents(file: Path, rows_per_batch: int = BATCH_SIZE_INDEX) -> Iterator[Document]:
+    """
+    Produit les documents d'un fichier .parquet par paquets de lignes, sans le charger entièrement.
+
+    Args:
+        file (Path): Fichier .parquet nettoyé.
+        rows_per_batch (int): Nombre de lignes lues à la fois.
+
+    Yields:
+        Document: Un document par ligne non vide, identique à `build_parquet_documents`.
+    """
+    # Les nulls sont comptés sur tout le fichier pour garder le même rendu texte
+    null_counts = pl.scan_parquet(file).null_count().collect().row(0)
+    for record_batch in pq.ParquetFile(file).iter_batches(batch_size=rows_per_batch):
+        yield from records_to_documents(rows_to_records(pl.from_arrow(record_batch), null_counts), file.name)
+
+
+def is_table_file(file: Path) -> bool:
+    """Indique si un .parquet nettoyé est un tableau (CSV, Excel) et non un PDF (colonne `page`)."""
+    return PAGE_COLUMN not in pq.read_schema(file).names
+
+
+def iter_table_documents(
+    file: Path,
+    max_tokens: int = TABLE_CHUNK_TOKENS,
+    rows_per_batch: int = BATCH_SIZE_INDEX,
+) -> Iterator[Document]:
+    """
+    Produit les blocs de lignes d'un tableau .parquet, annotés par l'en-tête des colonnes.
+
+    Les lignes sont lues par paquets (mémoire bornée) et rendues comme dans
+    `rows_to_records` ; les lignes consécutives sont ensuite regroupées par
+    `chunk_table_rows` dans la limite de `max_tokens`.
+
+    Args:
+        file (Path): Fichier .parquet nettoyé issu d'un CSV ou d'un Excel.
+        max_tokens (int): Budget de tokens d'un bloc, en-tête compris.
+        rows_per_batch (int): Nombre de lignes lues à la fois.
+
+    Yields:
+        Document: Un bloc par groupe de lignes, avec `source_file`, `row_start` et `row_end` en métadonnée.
+    """
+    parquet = pq.ParquetFile(file)
+    header = table_header(file.name, parquet.schema_arrow.names, max_tokens)
+    null_counts = pl.scan_parquet(file).null_count().collect().row(0)
+
+    def rows() -> Iterator[tuple[int, str]]:
+        offset = 0
+        for record_batch in parquet.iter_batches(batch_size=rows_per_batch):
+            records = rows_to_records(pl.from_arrow(record_batch), null_counts, row_offset=offset)
+            yield from records.select("row", "text").iter_rows()
+            offset += record_batch.num_rows
+
+    yield from chunk_table_rows(rows(), header, file.name, max_tokens)
+
+
+def delete_file_chunks(vectordb, lexical: LexicalIndex, source_file: str) -> int:
+    """
+    Supprime de Chroma et de l'index lexical tous les chunks d'un fichier.
+
+    Utilisé avant de réindexer un tableau : les blocs de l'ancienne version (ou les
+    lignes de l'ancien découpage) ne doivent pas rester à côté des nouveaux. Les
+    blocs d'un tableau contiennent son nom : aucun autre fichier ne les partage.
+
+    Args:
+        vectordb: Instance LangChain `Chroma`.
+        lexical (LexicalIndex): Index lexical BM25 de la même base.
+        source_file (str): Nom du fichier .parquet (métadonnée `source_file`).
 
     Returns:
-        list[Document]: Documents extraits à partir des fichiers .parquet.
+        int: Nombre de chunks supprimés de Chroma.
     """
-    documents = []
-    for file in clean_dir.rglob("*.parquet"):
-        if file.name not in changed_files:
-            # On ignore les fichiers non modifiés
-            continue
-        df = pd.read_parquet(file)
-        for _, row in df.iterrows():
-            text = " | ".join(str(value) for value in row.values if pd.notna(value)).strip()
-            if text:
-                documents.append(Document(
-                    page_content=text,
-                    metadata={"source_file": file.name}
-                ))
-    return documents
+    ids = vectordb.get(where={"source_file": source_file}, include=[])["ids"]
+    for i in range(0, len(ids), ID_LOOKUP_BATCH):
+        vectordb.delete(ids=ids[i:i + ID_LOOKUP_BATCH])
+    lexical.remove(ids)
+    return len(ids)
 
 
-def get_existing_ids(chroma_dir: Path) -> set[str]:
+def fetch_existing_ids(vectordb, candidate_ids: Iterable[str]) -> set[str]:
     """
-    Récupère les IDs de documents déjà indexés dans la base Chroma.
+    Indique lesquels des IDs candidats sont déjà présents dans une base Chroma ouverte.
+
+    Seuls les IDs candidats sont demandés à Chroma, par lots, sans documents,
+    métadonnées ni embeddings : le coût ne dépend pas de la taille de la collection.
 
     Args:
-        chroma_dir (Path): Répertoire de persistance de la base Chroma.
+        vectordb: Instance LangChain `Chroma`.
+        candidate_ids (Iterable[str]): IDs à vérifier.
 
     Returns:
-        set[str]: Ensemble des identifiants indexés.
+        set[str]: IDs candidats déjà indexés.
+    """
+    candidates = list(dict.fromkeys(candidate_ids))
+    existing = set()
+    for i in range(0, len(candidates), ID_LOOKUP_BATCH):
+        existing.update(vectordb.get(ids=candidates[i:i + ID_LOOKUP_BATCH], include=[])["ids"])
+    return existing
+
+
+def _split_document(doc: Document, splitter: RecursiveCharacterTextSplitter) -> list[Document]:
     """
-    if not chroma_dir.exists():
-        return set()
-    try:
-        db = Chroma(persist_directory=str(chroma_dir), embedding_function=None)
-        return set(db.get()['ids'])
-    except Exception as e:
-        print(f"⚠️ Impossible de récupérer les IDs existants : {e}")
-        return set()
+    Découpe un document en chunks (les documents de 50 caractères ou moins sont ignorés).
+
+    Les blocs d'un tableau sont déjà dimensionnés par `chunk_table_rows` (lignes trop
+    longues comprises) et restent entiers : les redécouper produirait des fragments
+    d'en-tête identiques d'un bloc à l'autre.
+    """
+    content = doc.page_content.strip()
+    if "row_start" in doc.metadata:
+        chunks = [doc]
+    elif len(content) < CHUNK_SIZE:
+        chunks = [doc] if len(content) > 50 else []
+    else:
+        chunks = splitter.split_documents([doc])
+    for chunk in chunks:
+        chunk.metadata["id"] = generate_chunk_id(chunk.page_content)
+    return chunks
+
+
+def split_documents(documents: list[Document]) -> list[Document]:
+    """
+    Découpe les documents en chunks et leur attribue un ID (hash du contenu).
+
+    Les documents courts sont conservés tels quels s'ils dépassent 50 caractères,
+    les autres sont découpés avec `RecursiveCharacterTextSplitter`.
+
+    Args:
+        documents (list[Document]): Documents à découper.
+
+    Returns:
+        list[Document]: Chunks avec `metadata["id"]`.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return [chunk for doc in documents for chunk in _split_document(doc, splitter)]
+
+
+def iter_chunks(documents: Iterable[Document]) -> Iterator[Document]:
+    """
+    Version générateur de `split_documents` : découpe les documents au fil de l'eau.
+
+    Args:
+        documents (Iterable[Document]): Documents à découper.
+
+    Yields:
+        Document: Chunks avec `metadata["id"]`.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    for doc in documents:
+        yield from _split_document(doc, splitter)
+
+
+def iter_unique_documents(documents: Iterable[Document], seen: set[str]) -> Iterator[Document]:
+    """
+    Filtre les documents dont le contenu a déjà été vu.
+
+    Args:
+        documents (Iterable[Document]): Documents à dédupliquer.
+        seen (set[str]): Hashs déjà rencontrés (complété au fil de l'eau : il grandit
+            avec le nombre de chunks distincts du corpus).
+
+    Yields:
+        Document: Documents au contenu inédit.
+    """
+    for doc in documents:
+        h = generate_chunk_id(doc.page_content)
+        if h not in seen:
+            seen.add(h)
+            yield doc
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Regroupe les éléments d'un itérable en listes de `size` éléments au plus."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _counted(items: Iterable, stats: dict, key: str) -> Iterator:
+    """Transmet les éléments d'un itérable en les comptant dans `stats[key]`."""
+    for item in items:
+        stats[key] += 1
+        yield item
 
 
 def index_documents(
@@ -140,131 +499,238 @@ def index_documents(
     chroma_dir: Path = DEFAULT_CHROMA_DIR,
     embedding_model: str = DEFAULT_EMBEDDING_MODEL,
     embedding=None,
-    max_retries: int = 3,          # nombre max de tentatives par batch
-    retry_delay: float = 2.0,      # délai entre retries en secondes
-    batch_delay: float = 1.0       # délai entre batches en secondes
+    max_retries: int = 3,                     # nombre max de tentatives par batch
+    max_workers: int = EMBEDDING_WORKERS,     # appels d'embedding simultanés
+    backoff: AdaptiveBackoff | None = None,   # délai adaptatif entre tentatives
+    use_embedding_cache: bool = True,         # réutilise les vecteurs déjà calculés
+    streaming: bool = False,                  # documents traités en flux (générateurs)
+    measure_memory: bool = False,             # mesure le pic de mémoire résidente (RSS)
+    table_chunk_tokens: int | None = TABLE_CHUNK_TOKENS,  # blocs de lignes des tableaux (None = une ligne par document)
+    export_ann: bool | None = None,           # réexporte l'index ANN (None = si `RETRIEVER_BACKEND == "ann"`)
 ) -> dict | None:
+    """
+    Indexe dans Chroma les fichiers .parquet nouveaux ou modifiés, fichier par fichier.
+
+    Seuls les chunks d'un fichier sont en mémoire à un instant donné (plus les batchs
+    en cours d'embedding), quel que soit le nombre total de chunks. En mode `streaming`,
+    les lignes sont lues par paquets et traversent déduplication, découpage, attribution
+    des IDs et embedding sous forme de générateurs : la mémoire ne dépend alors plus de
+    la taille du plus gros fichier, mais de celle des batchs plus l'ensemble des hashs
+    de déduplication (`seen`), qui grandit avec le nombre de chunks distincts.
+
+    Les tableaux (CSV, Excel) sont découpés en blocs de lignes consécutives précédés
+    de l'en-tête des colonnes (`iter_table_documents`) plutôt qu'en une ligne par
+    document. Le budget des blocs fait partie de la clé du cache : le modifier
+    réindexe les tableaux. Avant de réindexer un tableau, ses anciens chunks sont
+    supprimés de Chroma et de l'index lexical (`delete_file_chunks`).
+
+    Chaque chunk est aussi ajouté à l'index lexical BM25 (`lexical_index.sqlite3` dans
+    `chroma_dir`), utilisé par la recherche hybride, une fois son batch stocké dans
+    Chroma : un batch en échec n'y apparaît pas. Si cet index est vide alors que
+    des fichiers sont déjà indexés (base antérieure), il est reconstruit depuis Chroma.
+
+    La progression est enregistrée dans `index_journal.json` après chaque batch : une
+    exécution interrompue reprend le fichier, dont seuls les chunks absents de Chroma
+    (vérifiés par ID, batch par batch) sont envoyés à l'embedding. Le hash d'un
+    fichier n'est écrit dans `index_cache.json` qu'une fois tous ses chunks stockés.
+
+    Args:
+        clean_dir (Path): Répertoire contenant les fichiers nettoyés.
+        chroma_dir (Path): Répertoire de la base Chroma.
+        embedding_model (str): Nom du modèle d'embedding Ollama.
+        embedding: Fonction d'embedding à utiliser à la place d'Ollama.
+        max_retries (int): Nombre max de tentatives par batch.
+        max_workers (int): Nombre d'appels d'embedding simultanés.
+        backoff (AdaptiveBackoff | None): Délai adaptatif entre tentatives.
+        use_embedding_cache (bool): Réutilise les vecteurs du cache disque.
+        streaming (bool): Traite les documents en flux plutôt que fichier par fichier.
+        measure_memory (bool): Ajoute le pic de mémoire résidente du processus (`peak_rss_mb`,
+            buffers natifs Polars/Arrow compris) aux statistiques.
+        table_chunk_tokens (int | None): Budget de tokens des blocs de lignes des tableaux
+            (None : une ligne par document, comme pour les PDF).
+        export_ann (bool | None): Réexporte l'index ANN (`utils/chroma/ann_index.py`) après
+            une modification de la base ; None : seulement si la recherche l'utilise
+            (`RETRIEVER_BACKEND == "ann"`).
+
+    Returns:
+        dict | None: Statistiques de l'indexation, ou None si aucun fichier n'a changé.
+    """
     global_start = time.time()
+    memory = PeakMemory().start() if measure_memory else None
 
     print("🔍 Chargement du cache de hash fichiers...")
     cache = load_cache()
+    journal = load_journal()
+    # Évalué avant d'ouvrir l'index lexical, qui crée `chroma_dir`
+    chroma_existed = chroma_dir.exists()
+    lexical = LexicalIndex(chroma_dir / LEXICAL_INDEX_FILE)
+    # Base indexée avant l'index lexical : il est reconstruit depuis Chroma
+    lexical_backfill = bool(cache) and chroma_existed and not len(lexical)
 
     print("📥 Recherche des fichiers .parquet modifiés ou nouveaux...")
-    changed_files = set()
-    for file in clean_dir.rglob("*.parquet"):
+    changed_files = {}
+    table_files = set()
+    for file in sorted(clean_dir.rglob("*.parquet")):
         current_hash = hash_file(file)
-        cached_hash = cache.get(file.name)
-        if current_hash != cached_hash:
+        if table_chunk_tokens and is_table_file(file):
+            # Le découpage fait partie de la clé : changer le budget réindexe le tableau
+            table_files.add(file)
+            current_hash += f":table{table_chunk_tokens}"
+        if current_hash != cache.get(file.name):
             print(f"🆕 Fichier modifié ou nouveau détecté: {file.name}")
-            changed_files.add(file.name)
-            cache[file.name] = current_hash
+            changed_files[file] = current_hash
 
-    if not changed_files:
+    if not changed_files and not lexical_backfill:
         print("✅ Aucun fichier modifié. Pas besoin de réindexer.")
+        if memory:
+            memory.stop()
         return None
 
-    print(f"📥 Chargement des documents des fichiers modifiés ({len(changed_files)})...")
-    start = time.time()
-    raw_docs = load_parquet_documents(clean_dir, changed_files)
-    log_time("Chargement", start)
-    print(f"✅ {len(raw_docs)} documents bruts chargés.")
-
-    if not raw_docs:
-        print("⚠️ Aucun document à traiter après filtre. Fin de la pipeline.")
-        return None
-
-    print("🧹 Déduplication des documents...")
-    start = time.time()
-    seen = set()
-    unique_docs = []
-    for doc in raw_docs:
-        h = generate_chunk_id(doc.page_content)
-        if h not in seen:
-            seen.add(h)
-            unique_docs.append(doc)
-    log_time("Déduplication", start)
-    print(f"✅ {len(unique_docs)} documents uniques après déduplication.")
-
-    print("🔪 Découpage des documents en chunks...")
-    start = time.time()
-    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
-    chunks = []
-    for doc in unique_docs:
-        content = doc.page_content.strip()
-        if len(content) < CHUNK_SIZE:
-            if len(content) > 50:
-                chunks.append(doc)
-        else:
-            chunks.extend(splitter.split_documents([doc]))
-    log_time("Découpage", start)
-    print(f"✅ {len(chunks)} chunks générés.")
-
-    print("🆔 Attribution des IDs aux chunks...")
-    for chunk in chunks:
-        chunk.metadata["id"] = generate_chunk_id(chunk.page_content)
-
-    print("📂 Récupération des IDs déjà indexés dans Chroma...")
-    existing_ids = get_existing_ids(chroma_dir)
-
-    new_chunks = [chunk for chunk in chunks if chunk.metadata["id"] not in existing_ids]
-    print(f"🆕 {len(new_chunks)} nouveaux chunks à indexer.")
-
-    if not new_chunks:
-        print("✅ Aucun nouveau chunk à indexer. Fin de la pipeline.")
-        return {
-            "raw_docs": len(raw_docs),
-            "unique_docs": len(unique_docs),
-            "chunks": len(chunks),
-            "indexed": 0,
-        }
-
-    new_chunks = new_chunks[:MAX_CHUNKS]
-
-    print("🧠 Indexation dans Chroma (par batch)...")
-    start = time.time()
     embedding = embedding or OllamaEmbeddings(model=embedding_model)
+    if use_embedding_cache:
+        embedding = CachedEmbeddings(embedding)
     vectordb = Chroma(persist_directory=str(chroma_dir), embedding_function=embedding)
 
-    total = len(new_chunks)
-    batches = [new_chunks[i:i + BATCH_SIZE_INDEX] for i in range(0, total, BATCH_SIZE_INDEX)]
-
-    successful_index = False
-
-    for i, batch in enumerate(batches, 1):
-        batch_ids = [chunk.metadata["id"] for chunk in batch]
-        attempt = 0
-        while attempt < max_retries:
-            try:
-                vectordb.add_documents(batch, ids=batch_ids)
-                print(f"✅ Batch {i}/{len(batches)} indexé (tentative {attempt + 1}).")
-                successful_index = True
-                break
-            except Exception as e:
-                attempt += 1
-                print(f"❌ Erreur lors de l’indexation batch {i} (tentative {attempt}): {e}")
-                if attempt < max_retries:
-                    print(f"🔄 Nouvelle tentative dans {retry_delay}s...")
-                    time.sleep(retry_delay)
-                else:
-                    print(f"⚠️ Échec définitif du batch {i} après {max_retries} tentatives.")
-        time.sleep(batch_delay)
+    stats = {"raw_docs": 0, "unique_docs": 0, "chunks": 0, "indexed": 0, "files_indexed": 0, "lexical": 0, "removed": 0}
+    if lexical_backfill:
+        print("🔤 Construction de l'index lexical depuis la base Chroma existante...")
+        stats["lexical"] += lexical.add_from_chroma(vectordb)
+    lock = threading.Lock()
+    # Batchs en cours pour chaque fichier, fichiers entièrement parcourus, et origine de chaque batch
+    pending = {}
+    listed = set()
+    batch_origin = {}
+
+    def commit_if_complete(name: str):
+        """Enregistre le hash d'un fichier dont tous les chunks sont stockés (sous `lock`)."""
+        entry = journal[name]
+        if name in listed and not pending[name] and not entry.get("failed"):
+            cache[name] = journal.pop(name)["hash"]
+            del pending[name]
+            listed.discard(name)
+            save_cache(cache)
+            stats["files_indexed"] += 1
+            print(f"💾 Fichier entièrement indexé : {name}")
+        save_journal(journal)
+
+    def on_batch_done(i: int, batch: list[Document], ok: bool):
+        with lock:
+            name, local_index = batch_origin.pop(i)
+            pending[name].discard(local_index)
+            if ok:
+                journal[name]["stored_chunks"] = journal[name].get("stored_chunks", 0) + len(batch)
+                # Index lexical : seulement les chunks effectivement stockés dans Chroma
+                stats["lexical"] += lexical.add_documents(batch)
+            else:
+                journal[name]["failed"] = True
+            commit_if_complete(name)
+
+    def iter_batches():
+        """Produit les batchs à indexer, fichier par fichier."""
+        seen = set()
+        batch_number = 0
+        for file, file_hash in changed_files.items():
+            name = file.name
+            entry = journal.get(name)
+            if not entry or entry["hash"] != file_hash:
+                entry = {"hash": file_hash, "stored_chunks": 0}
+                if file in table_files:
+                    # Tableau modifié ou redécoupé : l'ancienne version est retirée avant l'ajout
+                    removed = delete_file_chunks(vectordb, lexical, name)
+                    if removed:
+                        stats["removed"] += removed
+                        print(f"🗑️ {name} : {removed} ancien(s) chunk(s) supprimé(s).")
+            elif entry.get("stored_chunks"):
+                print(f"⏯️ Reprise de {name} : {entry['stored_chunks']} chunk(s) déjà stocké(s), ignorés par ID.")
+            entry.pop("failed", None)
+            with lock:
+                journal[name] = entry
+                pending[name] = set()
+
+            if file in table_files:
+                documents = iter_table_documents(file, table_chunk_tokens)
+            elif streaming:
+                documents = iter_parquet_documents(file)
+            else:
+                documents = build_parquet_documents(file)
+            unique_docs = _counted(iter_unique_documents(_counted(documents, stats, "raw_docs"), seen), stats, "unique_docs")
+            chunks = iter_chunks(unique_docs) if streaming else split_documents(list(unique_docs))
+            del documents
+
+            file_chunks = new_chunks = 0
+            for local_index, batch in enumerate(batched(chunks, BATCH_SIZE_INDEX)):
+                file_chunks += len(batch)
+                # Seuls les IDs du batch sont vérifiés dans Chroma. Pas de saut par position :
+                # le contenu d'un batch dépend de la déduplication entre fichiers (`seen`),
+                # qui change d'une exécution à l'autre
+                existing_ids = fetch_existing_ids(vectordb, [chunk.metadata["id"] for chunk in batch])
+                # Chunks déjà dans Chroma : ajoutés à l'index lexical s'il leur manque (ignorés sinon) ;
+                # les autres le sont par `on_batch_done`, une fois stockés
+                stored = [chunk for chunk in batch if chunk.metadata["id"] in existing_ids]
+                if stored:
+                    with lock:
+                        stats["lexical"] += lexical.add_documents(stored)
+                # Deux documents distincts peuvent produire un même chunk : Chroma refuse les IDs en double
+                batch = list({
+                    chunk.metadata["id"]: chunk for chunk in batch if chunk.metadata["id"] not in existing_ids
+                }.values())
+                if not batch:
+                    continue
+                with lock:
+                    batch_number += 1
+                    pending[name].add(local_index)
+                    batch_origin[batch_number] = (name, local_index)
+                new_chunks += len(batch)
+                yield batch
+            stats["chunks"] += file_chunks
+            print(f"🔪 {name} : {file_chunks} chunks, {new_chunks} nouveaux à indexer.")
+
+            with lock:
+                listed.add(name)
+                commit_if_complete(name)
+
+    print(f"🧠 Indexation dans Chroma (par batch, {'en flux' if streaming else 'fichier par fichier'})...")
+    result = run_embedding_pipeline(
+        iter_batches(),
+        embedding,
+        vectordb,
+        max_workers=max_workers,
+        max_retries=max_retries,
+        backoff=backoff,
+        on_batch_done=on_batch_done,
+    )
+    stats["indexed"] = result["indexed"]
+    print(f"🔤 Index lexical : {stats['lexical']} chunks ajoutés ({len(lexical)} au total).")
+    if stats["indexed"] or stats["lexical"] or stats["removed"]:
+        # Invalide les caches de recherche (y compris dans l'interface Streamlit)
+        bump_index_version(chroma_dir)
+        if export_ann is None:
+            # Import différé : le module de recherche n'est utile ici que pour sa configuration
+            from utils.search_chroma import RETRIEVER_BACKEND
+
+            export_ann = RETRIEVER_BACKEND == "ann"
+        if export_ann:
+            # L'index exporté porte la nouvelle version : les processus de recherche le rouvrent
+            export_ann_index(chroma_dir)
 
     log_time("Pipeline complète", global_start)
-
-    if successful_index:
-        save_cache(cache)
-        print("✅ Mise à jour de Chroma et cache terminée avec succès.")
+    if memory:
+        stats["peak_rss_mb"] = round(memory.stop() / 1e6, 1)
+        print(f"📈 Pic de mémoire résidente (RSS) : {stats['peak_rss_mb']} Mo")
+    if use_embedding_cache:
+        cache_stats = embedding.cache.stats()
+        print(f"💾 Cache d'embeddings : {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+              f"({cache_stats['entries']} vecteurs, {cache_stats['bytes'] / 1e6:.1f} Mo).")
+
+    incomplete = [name for name in journal if name in {f.name for f in changed_files}]
+    if incomplete:
+        print(f"⚠️ {len(incomplete)} fichier(s) incomplet(s), repris au prochain lancement (voir {JOURNAL_FILE}).")
     else:
-        print("⚠️ Aucun batch n’a été indexé avec succès. Le cache n’a pas été mis à jour.")
-
-    return {
-        "raw_docs": len(raw_docs),
-        "unique_docs": len(unique_docs),
-        "chunks": len(chunks),
-        "indexed": len(new_chunks) if successful_index else 0,
-    }
-    
-        
+        print("✅ Mise à jour de Chroma et cache terminée avec succès.")
+
+    return stats
+
+
 def update_file_in_index(
     file_path: Path,
     chroma_dir: Path = DEFAULT_CHROMA_DIR,
@@ -278,22 +744,19 @@ def update_file_in_index(
         chroma_dir (Path): Répertoire de la base Chroma.
         embedding_model (str): Nom du modèle d'embedding.
     """
-    # Charger le fichier (exemple CSV/Parquet)
-    import pandas as pd
-    df = pd.read_parquet(file_path)
-    
-    # Créer documents
-    documents = []
-    for _, row in df.iterrows():
-        text = " | ".join(str(v) for v in row.values if pd.notna(v)).strip()
-        if text:
-            documents.append(Document(page_content=text, metadata={"source_file": file_path.name}))
+    # Créer documents (blocs de lignes pour les tableaux)
+    table = is_table_file(file_path)
+    if table:
+        documents = list(iter_table_documents(file_path))
+    else:
+        documents = build_parquet_documents(file_path)
 
     # Découper en chunks
     splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
     chunks = []
     for doc in documents:
-        if len(doc.page_content) < CHUNK_SIZE:
+        # Les blocs d'un tableau restent entiers
+        if len(doc.page_content) < CHUNK_SIZE or "row_start" in doc.metadata:
             chunks.append(doc)
         else:
             chunks.extend(splitter.split_documents([doc]))
@@ -302,23 +765,36 @@ def update_file_in_index(
     for chunk in chunks:
         chunk.metadata["id"] = generate_chunk_id(chunk.page_content)
     
-    # Charger la base Chroma existante
-    embedding = OllamaEmbeddings(model=embedding_model)
+    # Charger la base Chroma existante (embeddings servis par le cache si déjà calculés)
+    embedding = CachedEmbeddings(OllamaEmbeddings(model=embedding_model))
     vectordb = Chroma(persist_directory=str(chroma_dir), embedding_function=embedding)
     
-    # Récupérer IDs déjà indexés
-    existing_ids = set(vectordb.get()['ids'])
+    lexical = LexicalIndex(chroma_dir / LEXICAL_INDEX_FILE)
+    # Tableau : l'ancienne version est retirée avant l'ajout
+    if table and delete_file_chunks(vectordb, lexical, file_path.name):
+        bump_index_version(chroma_dir)
+
+    # Récupérer, parmi les IDs des chunks, ceux déjà indexés
+    existing_ids = fetch_existing_ids(vectordb, [chunk.metadata["id"] for chunk in chunks])
+
+    # Index lexical des chunks déjà dans Chroma (les chunks déjà présents sont ignorés)
+    if lexical.add_documents([chunk for chunk in chunks if chunk.metadata["id"] in existing_ids]):
+        bump_index_version(chroma_dir)
     
     # Filtrer les chunks déjà indexés
-    new_chunks = [chunk for chunk in chunks if chunk.metadata["id"] not in existing_ids]
+    new_chunks = list({
+        chunk.metadata["id"]: chunk for chunk in chunks if chunk.metadata["id"] not in existing_ids
+    }.values())
     
     if not new_chunks:
         print("Aucun nouveau chunk à indexer.")
         return
     
-    # Ajouter les nouveaux chunks à la base
+    # Ajouter les nouveaux chunks à la base, puis à l'index lexical une fois stockés
     new_ids = [chunk.metadata["id"] for chunk in new_chunks]
     vectordb.add_documents(new_chunks, ids=new_ids)
+    lexical.add_documents(new_chunks)
+    bump_index_version(chroma_dir)
     
     print(f"{len(new_chunks)} chunks ajoutés à la base.")
 
@@ -1,4 +1,8 @@
 import streamlit as st
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from utils.tracing import summarize_traces
 
 # Paramètres de la page
 st.set_page_config(page_title="Informations", 
@@ -55,6 +59,27 @@ st.write(
 )
 
 
+# Performances (traces des derniers tours, voir utils/tracing.py)
+st.header("⏱️ Performances")
+summary = summarize_traces()
+if summary["turns"]:
+    col_turns, col_p50, col_p95 = st.columns(3)
+    col_turns.metric("Tours mesurés", summary["turns"])
+    col_p50.metric("Latence p50", f"{summary['turn']['p50_ms'] / 1000:.2f} s")
+    col_p95.metric("Latence p95", f"{summary['turn']['p95_ms'] / 1000:.2f} s")
+    st.dataframe(
+        [
+            {"Phase": phase["name"], "Appels": phase["count"],
+             "p50 (ms)": round(phase["p50_ms"]), "p95 (ms)": round(phase["p95_ms"])}
+            for phase in summary["phases"]
+        ],
+        hide_index=True,
+        use_container_width=True,
+    )
+else:
+    st.info("Aucune trace enregistrée pour l'instant : posez une question à Bulby.")
+
+
 # Auteurs + mascotte
 col1, col2= st.columns([0.75, 0.25], vertical_alignment="center")
 
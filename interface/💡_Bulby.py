@@ -2,7 +2,7 @@ import streamlit as st
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from app.model import ChatModel
+from app.model import ChatModel, warmup
 
 
 # Import images
@@ -28,7 +28,19 @@ with col2:
     st.image(image=banner_bot)
 
 
+@st.cache_resource(show_spinner="Réveil de Bulby ... 💡")
+def load_shared_resources() -> str:
+    """
+    Crée une seule fois par processus le LLM, l'agent, les outils et la base Chroma,
+    partagés par toutes les sessions du navigateur.
+    """
+    return warmup()
+
+
+load_shared_resources()
+
 # Si modèle n'est pas encore stocké dans la session, on le sauvegarde pour le conserver
+# (seuls l'historique et la mémoire sont propres à la session : la création est quasi instantanée)
 if "chat_model" not in st.session_state:
     st.session_state.chat_model = ChatModel()
 
@@ -61,9 +73,24 @@ if prompt := st.chat_input("Votre question :"):
 
     # Réponse assistant
     with st.chat_message("assistant", avatar=bulby_mini):
+        # Étapes de l'agent (outils appelés) dans un encart repliable, puis réponse affichée
+        # au fil de la génération des tokens
+        status = st.status("Bulby réfléchit ... 💡", expanded=False)
         placeholder = st.empty()  # permet d'éviter un problème de réponse fantôme
-        with st.spinner("Bulby réfléchit ... 💡"):
-            response = st.session_state.chat_model.model_response(prompt)
+        partial = ""
+        response = ""
+        for event in st.session_state.chat_model.stream_response(prompt):
+            if event["type"] == "action":
+                status.write(f"🔎 {event['tool']} : {event['input']}")
+            elif event["type"] == "token":
+                partial += event["text"]
+                placeholder.markdown(partial.lstrip() + "▌")
+            elif event["type"] == "reset":
+                partial = ""
+                placeholder.empty()
+            elif event["type"] == "final":
+                response = event["output"]
+        status.update(label="Bulby a trouvé ! 💡", state="complete")
         placeholder.markdown(response)
 
     # Ajout réponse assistant dans l'historique
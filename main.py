@@ -1,10 +1,16 @@
+import argparse
+
 from utils.chroma.run_cleaning import clean_all
 from chroma_db import index_documents
 from interface.interface_functions import launch_streamlit
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nettoie les données, indexe les documents et lance Bulby.")
+    parser.add_argument("--force-clean", action="store_true", help="re-nettoie tous les fichiers bruts, même inchangés")
+    args = parser.parse_args()
+
     # Nettoyage des données brutes vers `data/clean`
-    clean_all()
+    clean_all(force=args.force_clean)
 
     # Création de la base vectorielle dans `data/vectorstore` si elle n'existe pas déjà
     index_documents()
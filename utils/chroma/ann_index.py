@@ -0,0 +1,453 @@
+"""
+Index vectoriel compact exporté depuis Chroma, chargé par projection mémoire (mmap).
+
+En production, la base `chroma_db/` est construite une fois puis seulement lue. Chaque
+recherche passe pourtant par le client Chroma, ses métadonnées SQLite et le wrapper
+LangChain. `export_ann_index` fige la collection dans un dossier de fichiers plats
+(`chroma_db/ann_index/` par défaut) :
+- `vectors.npy` : vecteurs en int8 (un facteur d'échelle par vecteur dans `scales.npy`)
+  ou en float32, rangés liste IVF par liste IVF ;
+- `centroids.npy` et `list_offsets.npy` : centres des listes IVF (k-means) et début de
+  chaque liste dans `vectors.npy` ;
+- `ids.npy`, `sorted_ids.npy` et `sorted_rows.npy` : IDs des chunks, et leur ordre trié
+  pour retrouver un chunk par ID sans construire de dictionnaire ;
+- `texts.bin` / `text_offsets.npy` et `metadatas.bin` / `metadata_offsets.npy` : textes
+  et métadonnées JSON concaténés (UTF-8) ;
+- `manifest.json` : dimension, quantification, distance, version de la base exportée.
+
+`AnnIndex` ouvre ces fichiers sans les lire (`np.load(mmap_mode="r")`) : le chargement
+est instantané, seules les pages des listes IVF parcourues et des résultats retournés
+sont lues, et plusieurs processus qui ouvrent le même index partagent les mêmes pages
+du cache du système. Une recherche compare la requête aux centres, parcourt les
+`ANN_N_PROBE` listes les plus proches (et les suivantes tant que moins de
+`ANN_MIN_CANDIDATES` vecteurs ont été comparés) et calcule les distances comme Chroma
+(L2 au carré, cosinus ou produit scalaire) : les scores de pertinence gardent la même échelle.
+
+Usage :
+    python -m utils.chroma.ann_index [--chroma-dir chroma_db] [--quantization int8] [--lists 64]
+"""
+
+import argparse
+import json
+import math
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from utils.query_cache import read_index_version
+
+ANN_INDEX_DIR = "ann_index"    # stocké dans le dossier de la base Chroma
+ANN_QUANTIZATION = "int8"      # "int8" (4 fois plus compact) ou "float32"
+ANN_N_PROBE = 8                # listes IVF parcourues au minimum par requête
+ANN_MIN_CANDIDATES = 2048      # vecteurs comparés au minimum par requête (listes supplémentaires si besoin)
+KMEANS_ITERATIONS = 20         # itérations de l'entraînement des centres IVF
+KMEANS_SAMPLE = 20000          # vecteurs au plus utilisés pour l'entraînement
+ASSIGN_BATCH = 4096            # vecteurs affectés à la fois à leur liste (mémoire bornée)
+EXPORT_PAGE_SIZE = 5000        # chunks lus à la fois dans Chroma
+
+MANIFEST_FILE = "manifest.json"
+ANN_FORMAT = 1
+
+# Conversion distance → pertinence (0 à 1), identique à celle de `langchain_chroma.Chroma`
+RELEVANCE_SCORE_FNS = {
+    "l2": VectorStore._euclidean_relevance_score_fn,
+    "cosine": VectorStore._cosine_relevance_score_fn,
+    "ip": VectorStore._max_inner_product_relevance_score_fn,
+}
+
+
+def compute_distances(vectors: np.ndarray, query: np.ndarray, space: str) -> np.ndarray:
+    """
+    Distances d'une requête à des vecteurs, calculées comme Chroma.
+
+    Args:
+        vectors (np.ndarray): Vecteurs (une ligne par chunk), normalisés si `space` vaut `cosine`.
+        query (np.ndarray): Vecteur de la requête, normalisé si `space` vaut `cosine`.
+        space (str): `l2` (L2 au carré), `cosine` ou `ip`.
+
+    Returns:
+        np.ndarray: Une distance par vecteur.
+    """
+    if space == "l2":
+        return ((vectors - query) ** 2).sum(axis=1)
+    return 1 - vectors @ query
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Numéro du centre le plus proche (distance L2) de chaque vecteur, par blocs de `ASSIGN_BATCH`."""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_BATCH):
+        block = vectors[start:start + ASSIGN_BATCH]
+        assignments[start:start + ASSIGN_BATCH] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors: np.ndarray, n_lists: int, seed: int = 0) -> np.ndarray:
+    """
+    Entraîne les centres des listes IVF par k-means (L2), sur un échantillon des vecteurs.
+
+    Args:
+        vectors (np.ndarray): Vecteurs float32 (n, dimension).
+        n_lists (int): Nombre de listes IVF.
+        seed (int): Graine du tirage (export reproductible).
+
+    Returns:
+        np.ndarray: Centres float32 (n_lists, dimension).
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), KMEANS_SAMPLE), replace=False))]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = _assign(sample, centroids)
+        counts = np.bincount(assignments, minlength=n_lists)
+        order = np.argsort(assignments, kind="stable")
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)])[filled]
+        centroids[filled] = np.add.reduceat(sample[order], starts, axis=0) / counts[filled, None]
+        # Une liste vide repart d'un vecteur tiré au hasard
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+    return centroids
+
+
+def quantize(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Quantifie des vecteurs en int8 (symétrique, un facteur d'échelle par vecteur).
+
+    Args:
+        vectors (np.ndarray): Vecteurs float32 (n, dimension).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Vecteurs int8 et facteurs float32 tels que
+        `vecteur ≈ int8 * facteur`.
+    """
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _pack(values: list[str], path: Path) -> np.ndarray:
+    """Écrit des chaînes UTF-8 bout à bout dans `path` et retourne leurs positions (n + 1 entiers)."""
+    encoded = [value.encode("utf-8") for value in values]
+    path.write_bytes(b"".join(encoded))
+    return np.concatenate([[0], np.cumsum([len(item) for item in encoded], dtype=np.int64)]).astype(np.int64)
+
+
+def _read_collection(vectordb, page_size: int) -> tuple[list, np.ndarray, list, list]:
+    """Lit IDs, vecteurs, textes et métadonnées de toute la collection, page par page."""
+    ids, vectors, texts, metadatas = [], [], [], []
+    offset = 0
+    while True:
+        page = vectordb.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        texts.extend(text or "" for text in page["documents"])
+        metadatas.extend(metadata or {} for metadata in page["metadatas"])
+        offset += len(page["ids"])
+    return ids, np.concatenate(vectors) if vectors else np.empty((0, 0), dtype=np.float32), texts, metadatas
+
+
+def export_ann_index(
+    chroma_dir: Path = Path("chroma_db"),
+    out_dir: Path | None = None,
+    quantization: str = ANN_QUANTIZATION,
+    n_lists: int | None = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> dict:
+    """
+    Exporte une collection Chroma en index IVF compact, lisible par `AnnIndex`.
+
+    L'index est écrit dans un dossier temporaire puis mis en place par renommage : les
+    processus qui servent encore l'ancien index gardent leurs pages projetées jusqu'à
+    leur redémarrage.
+
+    Args:
+        chroma_dir (Path): Répertoire de la base Chroma.
+        out_dir (Path | None): Dossier de l'index (défaut : `chroma_dir / ANN_INDEX_DIR`).
+        quantization (str): `"int8"` ou `"float32"`.
+        n_lists (int | None): Nombre de listes IVF (défaut : racine carrée du nombre de vecteurs).
+        page_size (int): Nombre de chunks lus à la fois dans Chroma.
+
+    Returns:
+        dict: `vectors`, `dimension`, `lists`, `quantization`, `size_mb` et `export_s`.
+
+    Raises:
+        ValueError : Si la quantification est inconnue ou si la collection est vide.
+    """
+    # Import différé : chromadb est long à importer
+    from langchain_chroma import Chroma
+
+    if quantization not in {"int8", "float32"}:
+        raise ValueError(f"Quantification inconnue : {quantization} (int8 ou float32).")
+    start = time.perf_counter()
+    chroma_dir = Path(chroma_dir)
+    out_dir = Path(out_dir) if out_dir else chroma_dir / ANN_INDEX_DIR
+    # Version lue avant l'export : une indexation concurrente rendra l'index périmé, pas incohérent
+    index_version = read_index_version(chroma_dir)
+    vectordb = Chroma(persist_directory=str(chroma_dir))
+    hnsw = vectordb._collection.configuration.get("hnsw") or {}
+    space = hnsw.get("space") or "l2"
+
+    ids, vectors, texts, metadatas = _read_collection(vectordb, page_size)
+    if not ids:
+        raise ValueError(f"Aucun vecteur à exporter dans {chroma_dir}.")
+    if space == "cosine":
+        # Vecteurs normalisés : distance cosinus = 1 - produit scalaire
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+    n_lists = max(1, min(n_lists or round(math.sqrt(len(ids))), len(ids)))
+    print(f"🧮 Export ANN : {len(ids)} vecteurs de dimension {vectors.shape[1]}, {n_lists} listes IVF, {quantization}.")
+
+    centroids = train_centroids(vectors, n_lists)
+    assignments = _assign(vectors, centroids)
+    # Vecteurs rangés liste par liste : une liste parcourue = une zone contiguë du fichier
+    order = np.argsort(assignments, kind="stable")
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]).astype(np.int64)
+    vectors = vectors[order]
+    ids = [ids[i] for i in order]
+
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    if quantization == "int8":
+        quantized, scales = quantize(vectors)
+        np.save(tmp_dir / "vectors.npy", quantized)
+        np.save(tmp_dir / "scales.npy", scales)
+    else:
+        np.save(tmp_dir / "vectors.npy", vectors)
+    np.save(tmp_dir / "centroids.npy", centroids)
+    np.save(tmp_dir / "list_offsets.npy", list_offsets)
+    id_array = np.array(ids, dtype=np.bytes_)
+    sorted_rows = np.argsort(id_array, kind="stable")
+    np.save(tmp_dir / "ids.npy", id_array)
+    np.save(tmp_dir / "sorted_ids.npy", id_array[sorted_rows])
+    np.save(tmp_dir / "sorted_rows.npy", sorted_rows.astype(np.int64))
+    np.save(tmp_dir / "text_offsets.npy", _pack([texts[i] for i in order], tmp_dir / "texts.bin"))
+    np.save(tmp_dir / "metadata_offsets.npy", _pack(
+        [json.dumps(metadatas[i], ensure_ascii=False) for i in order], tmp_dir / "metadatas.bin"
+    ))
+    manifest = {
+        "format": ANN_FORMAT,
+        "count": len(ids),
+        "dimension": int(vectors.shape[1]),
+        "quantization": quantization,
+        "space": space,
+        "lists": n_lists,
+        "index_version": index_version,
+    }
+    (tmp_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    old_dir = out_dir.with_name(out_dir.name + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if out_dir.exists():
+        out_dir.rename(old_dir)
+    tmp_dir.rename(out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    size_mb = sum(path.stat().st_size for path in out_dir.iterdir()) / 1e6
+    elapsed = time.perf_counter() - start
+    print(f"✅ Index ANN écrit dans {out_dir} ({size_mb:.1f} Mo) en {elapsed:.1f}s.")
+    return {
+        "vectors": len(ids),
+        "dimension": manifest["dimension"],
+        "lists": n_lists,
+        "quantization": quantization,
+        "size_mb": round(size_mb, 2),
+        "export_s": round(elapsed, 2),
+    }
+
+
+class AnnIndex:
+    """
+    Index IVF en lecture seule, projeté en mémoire depuis les fichiers de `export_ann_index`.
+
+    Expose le sous-ensemble de l'API Chroma utilisé par la recherche documentaire :
+    `query` (format de `chromadb.Collection.query`), `get` et
+    `similarity_search_with_relevance_scores` (format de `langchain_chroma.Chroma`).
+
+    Attributs :
+        path (Path) : Dossier de l'index.
+        embeddings : Embeddings des requêtes (même modèle que celui de la base exportée).
+        n_probe (int) : Listes IVF parcourues au minimum par requête.
+        min_candidates (int) : Vecteurs comparés au minimum par requête.
+        space (str) : Distance de la collection exportée (`l2`, `cosine` ou `ip`).
+        index_version (str) : Version de la base Chroma au moment de l'export.
+    """
+
+    def __init__(self, path: Path, embeddings=None, n_probe: int = ANN_N_PROBE, min_candidates: int = ANN_MIN_CANDIDATES):
+        self.path = Path(path)
+        self.embeddings = embeddings
+        self.n_probe = n_probe
+        self.min_candidates = min_candidates
+        manifest = json.loads((self.path / MANIFEST_FILE).read_text(encoding="utf-8"))
+        if manifest.get("format") != ANN_FORMAT:
+            raise ValueError(f"Format d'index ANN non pris en charge : {manifest.get('format')}.")
+        self.space = manifest["space"]
+        self.index_version = manifest["index_version"]
+        self.quantization = manifest["quantization"]
+
+        def load(name):
+            return np.load(self.path / name, mmap_mode="r")
+
+        # Aucune lecture ici : les pages sont chargées à la demande et partagées entre processus
+        self._vectors = load("vectors.npy")
+        self._scales = load("scales.npy") if self.quantization == "int8" else None
+        self._centroids = np.asarray(load("centroids.npy"))
+        self._list_offsets = load("list_offsets.npy")
+        self._ids = load("ids.npy")
+        self._sorted_ids = load("sorted_ids.npy")
+        self._sorted_rows = load("sorted_rows.npy")
+        self._text_offsets = load("text_offsets.npy")
+        self._metadata_offsets = load("metadata_offsets.npy")
+        self._texts = self._open_blob("texts.bin")
+        self._metadatas = self._open_blob("metadatas.bin")
+
+    def _open_blob(self, name: str) -> np.ndarray:
+        """Projette un fichier de chaînes concaténées (un fichier vide ne peut pas être projeté)."""
+        path = self.path / name
+        if not path.stat().st_size:
+            return np.empty(0, dtype=np.uint8)
+        return np.memmap(path, dtype=np.uint8, mode="r")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def relevance_score_fn(self):
+        """Fonction distance → pertinence (0 à 1) de la collection exportée."""
+        return RELEVANCE_SCORE_FNS[self.space]
+
+    def _read(self, blob: np.ndarray, offsets: np.ndarray, row: int) -> str:
+        return blob[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+    def _document(self, row: int) -> str:
+        return self._read(self._texts, self._text_offsets, row)
+
+    def _metadata(self, row: int) -> dict:
+        return json.loads(self._read(self._metadatas, self._metadata_offsets, row))
+
+    def _spans(self, query: np.ndarray, n_results: int) -> list[tuple[int, int]]:
+        """Zones de `vectors.npy` à parcourir : les `n_probe` listes les plus proches, plus s'il manque des candidats."""
+        wanted = max(n_results, self.min_candidates)
+        if self.space == "ip":
+            distances = -(self._centroids @ query)
+        else:
+            distances = ((self._centroids - query) ** 2).sum(axis=1)
+        spans, candidates = [], 0
+        for position, list_index in enumerate(np.argsort(distances)):
+            if position >= self.n_probe and candidates >= wanted:
+                break
+            start, end = int(self._list_offsets[list_index]), int(self._list_offsets[list_index + 1])
+            if end > start:
+                spans.append((start, end))
+                candidates += end - start
+        return spans
+
+    def _nearest(self, embedding, n_results: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Lignes, distances et vecteurs des `n_results` plus proches voisins trouvés."""
+        query = np.asarray(embedding, dtype=np.float32)
+        if self.space == "cosine":
+            query = query / (np.linalg.norm(query) or 1.0)
+        spans = self._spans(query, n_results)
+        rows = np.concatenate([np.arange(start, end) for start, end in spans])
+        vectors = np.concatenate([self._vectors[start:end] for start, end in spans]).astype(np.float32)
+        if self._scales is not None:
+            vectors *= np.concatenate([self._scales[start:end] for start, end in spans])[:, None]
+        distances = compute_distances(vectors, query, self.space)
+        k = min(n_results, len(rows))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind="stable")]
+        return rows[top], distances[top], vectors[top]
+
+    def query(self, query_embeddings: list, n_results: int = 10, include: list[str] = ("metadatas", "documents", "distances")) -> dict:
+        """
+        Recherche les plus proches voisins de chaque vecteur requête.
+
+        Args:
+            query_embeddings (list): Vecteurs requêtes.
+            n_results (int): Nombre de voisins par requête.
+            include (list[str]): Champs retournés parmi `documents`, `metadatas`,
+                `distances` et `embeddings`.
+
+        Returns:
+            dict: Même format que `chromadb.Collection.query` (une liste par requête).
+        """
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        for embedding in query_embeddings:
+            rows, distances, vectors = self._nearest(embedding, n_results)
+            results["ids"].append([self._ids[row].decode() for row in rows])
+            results["documents"].append([self._document(row) for row in rows] if "documents" in include else None)
+            results["metadatas"].append([self._metadata(row) for row in rows] if "metadatas" in include else None)
+            results["distances"].append(distances.tolist())
+            results["embeddings"].append(vectors)
+        return {key: value for key, value in results.items() if key == "ids" or key in include}
+
+    def get(self, ids: list[str], include: list[str] = ("metadatas", "documents")) -> dict:
+        """
+        Lit des chunks à partir de leur ID (recherche dichotomique dans `sorted_ids.npy`).
+
+        Args:
+            ids (list[str]): IDs des chunks ; les IDs absents sont ignorés.
+            include (list[str]): Champs retournés parmi `documents`, `metadatas` et
+                `embeddings` (normalisés pour la distance cosinus, comme à l'export).
+
+        Returns:
+            dict: Même format que `Chroma.get` (`ids`, `documents`, `metadatas`, `embeddings`).
+        """
+        wanted = np.array(ids, dtype=np.bytes_)
+        positions = np.searchsorted(self._sorted_ids, wanted)
+        rows, found = [], []
+        for chunk_id, position in zip(ids, positions):
+            if position < len(self._sorted_ids) and self._sorted_ids[position].decode() == chunk_id:
+                rows.append(int(self._sorted_rows[position]))
+                found.append(chunk_id)
+        return {
+            "ids": found,
+            "documents": [self._document(row) for row in rows] if "documents" in include else None,
+            "metadatas": [self._metadata(row) for row in rows] if "metadatas" in include else None,
+            "embeddings": self._embeddings(rows) if "embeddings" in include else None,
+        }
+
+    def _embeddings(self, rows: list[int]) -> np.ndarray:
+        """Vecteurs float32 des lignes demandées (déquantifiés pour l'index int8)."""
+        vectors = self._vectors[rows].astype(np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    def similarity_search_with_relevance_scores(self, query: str, k: int = 4) -> list[tuple[Document, float]]:
+        """
+        Recherche les `k` chunks les plus proches d'une requête, avec leur score de pertinence.
+
+        Args:
+            query (str): Requête en langage naturel.
+            k (int): Nombre de chunks retournés.
+
+        Returns:
+            list[tuple[Document, float]]: Chunks et pertinence (0 à 1), du plus proche au
+            moins proche, comme `Chroma.similarity_search_with_relevance_scores`.
+        """
+        results = self.query([self.embeddings.embed_query(query)], n_results=k)
+        relevance = self.relevance_score_fn()
+        return [
+            (Document(page_content=text, metadata=metadata), relevance(distance))
+            for text, metadata, distance in zip(results["documents"][0], results["metadatas"][0], results["distances"][0])
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chroma-dir", type=Path, default=Path("chroma_db"))
+    parser.add_argument("--out-dir", type=Path, default=None)
+    parser.add_argument("--quantization", choices=["int8", "float32"], default=ANN_QUANTIZATION)
+    parser.add_argument("--lists", type=int, default=None, help="Nombre de listes IVF (défaut : racine carrée du nombre de vecteurs)")
+    args = parser.parse_args()
+    export_ann_index(args.chroma_dir, args.out_dir, args.quantization, args.lists)
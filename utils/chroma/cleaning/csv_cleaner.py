@@ -3,6 +3,11 @@ from pathlib import Path
 import polars as pl
 import pandas as pd
 
+from .normalize import normalize_frame
+
+# Version du nettoyage : à incrémenter quand la sortie change (force le re-nettoyage)
+CLEANER_VERSION = 1
+
 def fallback_read_csv(file: Path) -> pl.DataFrame | None:
     """Tente de lire un CSV avec Pandas si Polars échoue."""
     try:
@@ -13,50 +18,47 @@ def fallback_read_csv(file: Path) -> pl.DataFrame | None:
         print(f"❌ Échec de lecture Pandas : {file.name} - {e}")
         return None
 
-def clean_semantic_noise(df: pl.DataFrame) -> pl.DataFrame:
+def process_csv_file(file: Path, out_dir: Path) -> Path | None:
     """
-    Supprime les bruits sémantiques des colonnes texte :
-    - Espaces multiples
-    - Retours à la ligne
-    - Tabulations
-    - Espaces inutiles en début/fin
+    Lit, nettoie et sauvegarde un fichier CSV en Parquet.
+
+    La lecture, le remplissage des nulls, la normalisation et l'écriture forment un
+    seul plan Polars paresseux (`scan_csv` → `sink_parquet`) : le fichier est traité
+    en flux sans être entièrement chargé. En cas d'échec, il est relu avec Pandas.
+
+    Args:
+        file (Path): Fichier CSV brut.
+        out_dir (Path): Dossier de sortie .parquet.
+
+    Returns:
+        Path | None: Fichier .parquet produit, ou None si la lecture a échoué.
     """
-    for col in df.columns:
-        if df.schema[col] == pl.Utf8:
-            df = df.with_columns(
-                pl.col(col)
-                .str.replace_all(r"\s+", " ")  # Nettoie tous les espaces, tabs, \n
-                .str.strip_chars()
-                .alias(col)
-            )
-    return df
-
-def process_csv_file(file: Path, out_dir: Path) -> pl.DataFrame | None:
-    """Lit, nettoie et sauvegarde un fichier CSV en Parquet."""
+    out_path = out_dir / (file.stem + ".parquet")
     try:
-        df = pl.read_csv(
+        lf = pl.scan_csv(
             file,
             separator=";",
             infer_schema_length=None,
             ignore_errors=True,
             null_values=["", "NA", "n/a", "null"]
         )
+        normalize_frame(lf).sink_parquet(out_path)
+        # En flux, une ligne illisible peut vider la sortie au lieu de lever une erreur
+        if pl.scan_parquet(out_path).select(pl.len()).collect().item() == 0:
+            raise pl.exceptions.ComputeError(f"aucune ligne lisible dans {file.name}")
     except Exception:
+        out_path.unlink(missing_ok=True)  # Sortie partielle éventuelle
         df = fallback_read_csv(file)
+        if df is None:
+            return None
+        normalize_frame(df).write_parquet(out_path)
+    print(f"✅ CSV nettoyé : {out_path.name}")
+    return out_path
 
-    if df is not None:
-        df = df.with_columns(pl.all().fill_null(""))  # Remplit les valeurs nulles
-        df = clean_semantic_noise(df)  # Supprime les bruits sémantiques
-        out_path = out_dir / (file.stem + ".parquet")
-        df.write_parquet(out_path)
-        print(f"✅ CSV nettoyé : {out_path.name}")
-        return df
-    return None
-
-def read_csv_files(csv_dir: Path, out_dir: Path) -> list[pl.DataFrame]:
-    """Lit et nettoie tous les fichiers CSV d’un dossier."""
+def read_csv_files(csv_dir: Path, out_dir: Path) -> list[Path]:
+    """Lit et nettoie tous les fichiers CSV d’un dossier (retourne les .parquet produits)."""
     out_dir.mkdir(parents=True, exist_ok=True)
     files = list(csv_dir.glob("*.csv"))
     with ThreadPoolExecutor() as executor:
         results = list(executor.map(lambda f: process_csv_file(f, out_dir), files))
-    return [df for df in results if df is not None]
+    return [path for path in results if path is not None]
@@ -0,0 +1,47 @@
+"""
+Normalisation commune des fichiers tabulaires (CSV et Excel).
+
+Les valeurs nulles sont remplacées par des chaînes vides puis toutes les colonnes
+texte sont nettoyées dans une seule expression Polars, au lieu d'un `with_columns`
+(et donc d'un nouveau DataFrame) par colonne. Les fonctions acceptent un
+`DataFrame` comme un `LazyFrame` : appliquées à `pl.scan_csv`, elles s'intègrent
+au plan paresseux et le fichier est traité en flux jusqu'à `sink_parquet`.
+"""
+
+import polars as pl
+
+Frame = pl.DataFrame | pl.LazyFrame
+
+
+def clean_semantic_noise(frame: Frame) -> Frame:
+    """
+    Supprime les bruits sémantiques de toutes les colonnes texte, en une seule expression :
+    - Espaces multiples
+    - Retours à la ligne
+    - Tabulations
+    - Espaces inutiles en début/fin
+
+    Args:
+        frame (pl.DataFrame | pl.LazyFrame): Données à nettoyer.
+
+    Returns:
+        pl.DataFrame | pl.LazyFrame: Données nettoyées, du même type que l'entrée.
+    """
+    return frame.with_columns(
+        pl.col(pl.Utf8)
+        .str.replace_all(r"\s+", " ")  # Nettoie tous les espaces, tabs, \n
+        .str.strip_chars()
+    )
+
+
+def normalize_frame(frame: Frame) -> Frame:
+    """
+    Remplit les valeurs nulles (null ➜ "") puis nettoie les colonnes texte.
+
+    Args:
+        frame (pl.DataFrame | pl.LazyFrame): Données brutes lues depuis un fichier.
+
+    Returns:
+        pl.DataFrame | pl.LazyFrame: Données prêtes à être écrites en .parquet.
+    """
+    return clean_semantic_noise(frame.with_columns(pl.all().fill_null("")))
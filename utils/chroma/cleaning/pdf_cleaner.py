@@ -4,8 +4,12 @@ from langchain_core.documents import Document
 import fitz  # PyMuPDF
 import polars as pl
 from concurrent.futures import ThreadPoolExecutor
+import glob
 import re
 
+# Version du nettoyage : à incrémenter quand la sortie change (force le re-nettoyage)
+CLEANER_VERSION = 2
+
 
 def clean_text(text: str) -> str:
     """
@@ -42,6 +46,10 @@ def process_pdf_file(file: Path, out_dir: Path) -> List[Document]:
     """
     Traite un fichier PDF, extrait les pages, nettoie, sauvegarde en parquet.
 
+    Toutes les pages non vides sont écrites dans un seul fichier `{nom du pdf}.parquet`
+    (colonnes `page`, `content`, `source`) ; les anciens fichiers d'une page
+    (`{nom du pdf}_page_N.parquet`) sont supprimés.
+
     Args:
         file (Path): Fichier PDF à traiter
         out_dir (Path): Dossier de sortie .parquet
@@ -50,17 +58,35 @@ def process_pdf_file(file: Path, out_dir: Path) -> List[Document]:
         List[Document]: Liste de documents LangChain nettoyés
     """
     page_data = extract_text_from_pdf(file)
-    documents = []
+    rows = [
+        (page_number, text, page_id)
+        for page_number, (page_id, text) in enumerate(page_data, 1)
+        if text.strip()
+    ]
 
-    for page_id, text in page_data:
-        if text.strip():
-            df = pl.DataFrame({"content": [text], "source": [page_id]})
-            out_path = out_dir / f"{page_id}.parquet"
-            df.write_parquet(out_path)
-            print(f"✅ PDF nettoyé : {page_id}")
-            documents.append(Document(page_content=text, metadata={"source": page_id}))
+    # Anciennes sorties : un fichier par page
+    for legacy in out_dir.glob(f"{glob.escape(file.name)}_page_*.parquet"):
+        legacy.unlink()
+
+    if not rows:
+        return []
 
-    return documents
+    df = pl.DataFrame(
+        {
+            "page": [page for page, _, _ in rows],
+            "content": [text for _, text, _ in rows],
+            "source": [page_id for _, _, page_id in rows],
+        },
+        schema={"page": pl.Int32, "content": pl.Utf8, "source": pl.Utf8},
+    )
+    out_path = out_dir / f"{file.name}.parquet"
+    df.write_parquet(out_path)
+    print(f"✅ PDF nettoyé : {out_path.name} ({len(rows)} pages)")
+
+    return [
+        Document(page_content=text, metadata={"source": page_id, "page": page})
+        for page, text, page_id in rows
+    ]
 
 
 def clean_pdf_files(input_folder: Path, output_folder: Path) -> List[Document]:
@@ -3,26 +3,18 @@ from pathlib import Path
 import polars as pl
 import pandas as pd
 
-def clean_semantic_noise(df: pl.DataFrame) -> pl.DataFrame:
-    """
-    Nettoyage sémantique des colonnes texte dans un DataFrame Excel :
-    - Espaces multiples
-    - Retours à la ligne
-    - Tabulations
-    - Espaces inutiles en début/fin
+from .normalize import normalize_frame
+
+# Version du nettoyage : à incrémenter quand la sortie change (force le re-nettoyage)
+CLEANER_VERSION = 1
+
+def process_excel_file(file: Path, out_dir: Path) -> Path | None:
     """
-    for col in df.columns:
-        if df.schema[col] == pl.Utf8:
-            df = df.with_columns(
-                pl.col(col)
-                .str.replace_all(r"\s+", " ")
-                .str.strip_chars()
-                .alias(col)
-            )
-    return df
+    Lit, nettoie et convertit un fichier Excel en Parquet.
 
-def process_excel_file(file: Path, out_dir: Path) -> pl.DataFrame | None:
-    """Lit, nettoie et convertit un fichier Excel en Parquet."""
+    Returns:
+        Path | None: Fichier .parquet produit, ou None si la lecture a échoué.
+    """
     try:
         df = pl.read_excel(file)
     except Exception:
@@ -35,18 +27,17 @@ def process_excel_file(file: Path, out_dir: Path) -> pl.DataFrame | None:
             return None
 
     if df is not None:
-        df = df.with_columns(pl.all().fill_null(""))
-        df = clean_semantic_noise(df)
+        # Plan paresseux : remplissage des nulls et normalisation de toutes les colonnes texte en une passe
         out_path = out_dir / (file.stem + ".parquet")
-        df.write_parquet(out_path)
+        normalize_frame(df.lazy()).collect().write_parquet(out_path)
         print(f"✅ Excel nettoyé : {out_path.name}")
-        return df
+        return out_path
     return None
 
-def read_xls_files(xls_dir: Path, out_dir: Path) -> list[pl.DataFrame]:
-    """Nettoie tous les fichiers Excel (.xls, .xlsx) d’un dossier donné."""
+def read_xls_files(xls_dir: Path, out_dir: Path) -> list[Path]:
+    """Nettoie tous les fichiers Excel (.xls, .xlsx) d’un dossier donné (retourne les .parquet produits)."""
     out_dir.mkdir(parents=True, exist_ok=True)
     files = list(xls_dir.glob("*.xls*"))
     with ThreadPoolExecutor() as executor:
         results = list(executor.map(lambda f: process_excel_file(f, out_dir), files))
-    return [df for df in results if df is not None]
+    return [path for path in results if path is not None]
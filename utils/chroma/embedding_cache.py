@@ -0,0 +1,191 @@
+"""
+Cache persistant des embeddings sur disque (SQLite).
+
+Chaque vecteur est stocké en float32 et indexé par (modèle d'embedding, hash MD5
+du texte). Le hash est le même que l'ID des chunks dans Chroma
+(`generate_chunk_id`) : un chunk déjà vectorisé n'est donc plus jamais renvoyé à
+Ollama, même si la base Chroma est supprimée ou reconstruite.
+
+Le cache est borné en taille : au-delà de `max_bytes`, les vecteurs les moins
+récemment utilisés sont supprimés (`utils/sqlite_cache.py`). Plusieurs processus
+peuvent partager le fichier : les écritures n'écrasent rien (`INSERT OR IGNORE`).
+"""
+
+import atexit
+import hashlib
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from langchain_core.embeddings import Embeddings
+
+from utils.sqlite_cache import SqliteLruCache
+from utils.tracing import tracer
+
+EMBEDDING_CACHE_FILE = Path("embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_MB = 1024
+
+# Nombre max de paramètres par requête SQLite (limite historique = 999)
+SQLITE_MAX_VARIABLES = 900
+
+
+def text_key(text: str) -> str:
+    """
+    Calcule la clé d'un texte (hash MD5, identique à l'ID des chunks Chroma).
+
+    Args:
+        text (str): Texte à hasher.
+
+    Returns:
+        str: Hash MD5 du texte.
+    """
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache(SqliteLruCache):
+    """
+    Stockage SQLite des embeddings, partagé entre threads.
+
+    Attributs :
+        path (Path) : Fichier SQLite du cache.
+        max_bytes (int) : Taille maximale des vecteurs stockés avant éviction.
+        hits (int) : Nombre de vecteurs trouvés dans le cache.
+        misses (int) : Nombre de vecteurs absents du cache.
+    """
+
+    TABLE = "embeddings"
+    KEY_COLUMNS = ("model", "chunk_id")
+    COLUMNS = ("model TEXT NOT NULL", "chunk_id TEXT NOT NULL", "vector BLOB NOT NULL")
+    LABEL = "Cache d'embeddings"
+    ITEMS = "vecteurs"
+
+    def __init__(self, path: Path = EMBEDDING_CACHE_FILE, max_bytes: int = EMBEDDING_CACHE_MAX_MB * 1024 * 1024):
+        super().__init__(path, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model: str, keys: list[str]) -> dict[str, list[float]]:
+        """
+        Récupère les vecteurs connus pour une liste de clés.
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            keys (list[str]): Clés (hash MD5) recherchées.
+
+        Returns:
+            dict[str, list[float]]: Vecteurs trouvés, par clé.
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique_keys), SQLITE_MAX_VARIABLES):
+                part = unique_keys[i:i + SQLITE_MAX_VARIABLES]
+                rows = self._conn.execute(
+                    f"SELECT chunk_id, vector FROM embeddings WHERE model = ? AND chunk_id IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                ).fetchall()
+                for chunk_id, blob in rows:
+                    found[chunk_id] = array("f", blob).tolist()
+            self._touch([(model, key) for key in found], time.time())
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, model: str, vectors: dict[str, list[float]]):
+        """
+        Enregistre des vecteurs puis applique l'éviction si la taille maximale est dépassée.
+
+        Args:
+            model (str): Nom du modèle d'embedding.
+            vectors (dict[str, list[float]]): Vecteurs à stocker, par clé.
+        """
+        if not vectors:
+            return
+        now = time.time()
+        with self._lock:
+            added = 0
+            for key, vector in vectors.items():
+                blob = array("f", vector).tobytes()
+                # Un même texte a toujours le même vecteur pour un modèle donné : on n'écrase rien,
+                # y compris une ligne écrite entre-temps par un autre processus
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (model, chunk_id, vector, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (model, key, blob, len(blob), now),
+                )
+                added += len(blob) if cursor.rowcount == 1 else 0
+            self._conn.commit()
+            self._stored(added)
+
+    def stats(self) -> dict:
+        """
+        Retourne les compteurs du cache.
+
+        Returns:
+            dict: `hits`, `misses`, `entries` et `bytes` stockés.
+        """
+        with self._lock:
+            entries, size = self._usage()
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Enveloppe une fonction d'embedding LangChain avec le cache persistant.
+
+    Seuls les textes absents du cache sont envoyés au modèle sous-jacent.
+    Les embeddings de requêtes sont stockés séparément de ceux des documents,
+    certains modèles les calculant différemment.
+
+    Attributs :
+        embeddings : Fonction d'embedding sous-jacente (ex : OllamaEmbeddings).
+        model_name (str) : Nom du modèle, utilisé dans la clé du cache.
+        cache (EmbeddingCache) : Stockage des vecteurs.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str | None = None, cache: EmbeddingCache | None = None):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.cache = cache or get_embedding_cache()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [text_key(text) for text in texts]
+        vectors = self.cache.get_many(self.model_name, keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            computed = self.embeddings.embed_documents(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), computed))
+            self.cache.put_many(self.model_name, new_vectors)
+            vectors.update(new_vectors)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        model = f"{self.model_name}#query"
+        key = text_key(text)
+        with tracer.span("embedding.query") as span:
+            vector = self.cache.get_many(model, [key]).get(key)
+            span.set(cached=vector is not None)
+            if vector is None:
+                vector = self.embeddings.embed_query(text)
+                self.cache.put_many(model, {key: vector})
+        return vector
+
+
+_default_cache: EmbeddingCache | None = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """
+    Retourne le cache d'embeddings partagé par le processus (créé au premier appel).
+
+    Returns:
+        EmbeddingCache: Cache stocké dans `EMBEDDING_CACHE_FILE`.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+            # Dates de dernier usage encore en mémoire à la sortie du processus
+            atexit.register(_default_cache.flush)
+        return _default_cache
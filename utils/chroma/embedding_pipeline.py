@@ -0,0 +1,204 @@
+"""
+Pipeline d'indexation concurrent pour Chroma.
+
+Les embeddings sont calculés par un pool borné de workers (appels Ollama en parallèle),
+tandis qu'un thread d'écriture unique enregistre les vecteurs dans Chroma. Un délai
+adaptatif, partagé par tous les workers, remplace les pauses fixes entre tentatives
+et entre batchs : il augmente quand le serveur d'embedding échoue et redescend
+à zéro dès que les appels réussissent.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from langchain_core.documents import Document
+
+
+class AdaptiveBackoff:
+    """
+    Délai d'attente adaptatif partagé entre plusieurs threads.
+
+    Attributs :
+        min_delay (float) : Délai appliqué après un premier échec (secondes).
+        max_delay (float) : Délai maximal (secondes).
+        factor (float) : Multiplicateur appliqué à chaque échec.
+        decay (float) : Multiplicateur appliqué à chaque succès.
+    """
+
+    def __init__(self, min_delay: float = 0.5, max_delay: float = 30.0, factor: float = 2.0, decay: float = 0.5):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.decay = decay
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Attend le délai courant (aucune attente tant que tout réussit)."""
+        with self._lock:
+            delay = self.delay
+        if delay > 0:
+            time.sleep(delay)
+
+    def failure(self) -> float:
+        """
+        Augmente le délai après un échec.
+
+        Returns:
+            float: Nouveau délai en secondes.
+        """
+        with self._lock:
+            self.delay = min(self.max_delay, max(self.min_delay, self.delay * self.factor))
+            return self.delay
+
+    def success(self):
+        """Réduit le délai après un succès, jusqu'à le remettre à zéro."""
+        with self._lock:
+            self.delay *= self.decay
+            if self.delay < self.min_delay:
+                self.delay = 0.0
+
+
+def write_batch(vectordb, batch: list[Document], vectors: list[list[float]]):
+    """
+    Écrit un batch de chunks déjà vectorisés dans Chroma.
+
+    `Chroma.add_documents` / `add_texts` recalculent toujours les embeddings avec
+    `embedding_function` et n'acceptent pas de vecteurs déjà calculés : l'écriture
+    passe donc par la collection chromadb (`_collection`, comme la recherche MMR
+    de `utils/search_chroma.py`). `upsert` plutôt que `add` : une écriture relancée
+    après un échec partiel ne crée pas de doublon.
+
+    Args:
+        vectordb: Instance LangChain `Chroma` ouverte sur la base cible.
+        batch (list[Document]): Chunks du batch (avec `metadata["id"]`).
+        vectors (list[list[float]]): Embeddings correspondants.
+    """
+    vectordb._collection.upsert(
+        ids=[chunk.metadata["id"] for chunk in batch],
+        embeddings=vectors,
+        documents=[chunk.page_content for chunk in batch],
+        metadatas=[chunk.metadata for chunk in batch],
+    )
+
+
+def run_embedding_pipeline(
+    batches: Iterable[list[Document]],
+    embedding,
+    vectordb,
+    max_workers: int = 4,
+    max_retries: int = 3,
+    backoff: AdaptiveBackoff | None = None,
+    total: int | None = None,
+    on_batch_done: Callable[[int, list[Document], bool], None] | None = None,
+) -> dict:
+    """
+    Vectorise et indexe des batchs de chunks avec des workers concurrents.
+
+    Chaque batch dispose de `max_retries` tentatives pour son embedding puis d'autant
+    pour son écriture. Un batch en échec définitif est abandonné sans interrompre les
+    autres. Une erreur de `on_batch_done` (ou toute erreur inattendue du thread
+    d'écriture) arrête la production de nouveaux batchs et est relevée à la fin,
+    une fois les batchs en cours terminés.
+
+    Args:
+        batches (Iterable[list[Document]]): Batchs de chunks à indexer.
+        embedding: Fonction d'embedding LangChain (`embed_documents`).
+        vectordb: Instance LangChain `Chroma` ouverte sur la base cible.
+        max_workers (int): Nombre maximal d'appels d'embedding simultanés.
+        max_retries (int): Nombre max de tentatives par batch.
+        backoff (AdaptiveBackoff | None): Délai adaptatif partagé (créé si absent).
+        total (int | None): Nombre total de batchs, pour l'affichage.
+        on_batch_done (callable | None): Appelé après chaque batch avec
+            (numéro du batch, batch, succès), depuis le thread d'écriture.
+
+    Returns:
+        dict: Statistiques `{"succeeded", "failed", "indexed"}`.
+
+    Raises:
+        Exception: Première erreur survenue dans le thread d'écriture.
+    """
+    backoff = backoff or AdaptiveBackoff()
+    label = f"/{total}" if total else ""
+    stats = {"succeeded": 0, "failed": 0, "indexed": 0}
+    # File bornée : les workers attendent si l'écriture prend du retard
+    written = queue.Queue(maxsize=max_workers * 2)
+    # Limite le nombre de batchs en mémoire (en cours d'embedding ou en attente d'écriture)
+    in_flight = threading.BoundedSemaphore(max_workers * 2)
+
+    # Première erreur du thread d'écriture, relevée dans le thread appelant
+    errors = []
+
+    def embed(i: int, batch: list[Document]):
+        vectors = None
+        try:
+            texts = [chunk.page_content for chunk in batch]
+            for attempt in range(1, max_retries + 1):
+                backoff.wait()
+                try:
+                    vectors = embedding.embed_documents(texts)
+                    backoff.success()
+                    return
+                except Exception as e:
+                    delay = backoff.failure()
+                    print(f"❌ Erreur d'embedding batch {i} (tentative {attempt}): {e}")
+                    if attempt < max_retries:
+                        print(f"🔄 Nouvelle tentative dans {delay:.1f}s...")
+            print(f"⚠️ Échec définitif du batch {i} après {max_retries} tentatives.")
+        finally:
+            # Toujours transmis au thread d'écriture, qui libère la place du batch
+            written.put((i, batch, vectors))
+
+    def store(i: int, batch: list[Document], vectors) -> bool:
+        """Écrit un batch vectorisé, avec ses propres `max_retries` tentatives."""
+        for attempt in range(1, max_retries + 1):
+            try:
+                write_batch(vectordb, batch, vectors)
+                print(f"✅ Batch {i}{label} indexé (tentative d'écriture {attempt}).")
+                return True
+            except Exception as e:
+                print(f"❌ Erreur lors de l’écriture Chroma batch {i} (tentative {attempt}): {e}")
+                if attempt < max_retries:
+                    time.sleep(backoff.min_delay)
+        print(f"⚠️ Échec définitif de l'écriture du batch {i} après {max_retries} tentatives.")
+        return False
+
+    def writer():
+        while (item := written.get()) is not None:
+            i, batch, vectors = item
+            try:
+                if errors:
+                    continue  # Erreur déjà relevée : les batchs restants sont seulement vidés
+                ok = vectors is not None and store(i, batch, vectors)
+                if ok:
+                    stats["succeeded"] += 1
+                    stats["indexed"] += len(batch)
+                else:
+                    stats["failed"] += 1
+                if on_batch_done:
+                    on_batch_done(i, batch, ok)
+            except BaseException as e:
+                print(f"❌ Erreur du thread d'écriture (batch {i}) : {e}")
+                errors.append(e)
+            finally:
+                in_flight.release()
+
+    writer_thread = threading.Thread(target=writer, name="chroma-writer", daemon=True)
+    writer_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embedding") as pool:
+            for i, batch in enumerate(batches, 1):
+                in_flight.acquire()
+                if errors:
+                    in_flight.release()
+                    break
+                pool.submit(embed, i, batch)
+    finally:
+        written.put(None)
+        writer_thread.join()
+    if errors:
+        raise errors[0]
+    return stats
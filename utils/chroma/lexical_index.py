@@ -0,0 +1,250 @@
+"""
+Index lexical (BM25) des chunks, persistant sur disque (SQLite).
+
+La recherche vectorielle rate souvent les termes exacts : codes de séries,
+années, unités (`kgCO2e`, `TWh`), tranches tarifaires (`I1`)... Cet index inversé
+est construit par `index_documents` à côté de la base Chroma et associe à chaque
+terme la liste des chunks qui le contiennent (avec sa fréquence). Il est mis à
+jour au fil de l'indexation, batch par batch : un chunk déjà présent (même ID que
+dans Chroma, hash MD5 du texte) n'est jamais réindexé.
+
+Seuls les termes, fréquences et longueurs sont stockés : le texte et les
+métadonnées restent dans Chroma, qui les fournit à partir des IDs retrouvés.
+"""
+
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Iterable
+
+from langchain_core.documents import Document
+
+LEXICAL_INDEX_FILE = "lexical_index.sqlite3"  # stocké dans le dossier de la base Chroma
+
+BM25_K1 = 1.2   # saturation de la fréquence d'un terme
+BM25_B = 0.75   # normalisation par la longueur du chunk
+
+CHROMA_PAGE_SIZE = 5000  # chunks lus à la fois pour reconstruire l'index depuis Chroma
+REMOVE_BATCH = 500       # chunks retirés par passe sur les postings
+
+# Mots outils français ignorés (aucune valeur discriminante, postings les plus longs)
+STOPWORDS = frozenset(
+    "a au aux avec ce ces dans de des du elle en est et il ils la le les leur leurs lui ma mais me "
+    "meme mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes "
+    "toi ton tu un une vos votre vous y d l c j m n s t quel quelle quels quelles".split()
+)
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Découpe un texte en termes : minuscules, sans accents, sans mots outils.
+
+    Les identifiants sont conservés tels quels (`kgco2e`, `2023`, `i1`) ; les
+    nombres d'un seul chiffre sont gardés, les autres termes d'une lettre ignorés.
+
+    Args:
+        text (str): Texte d'un chunk ou d'une requête.
+
+    Returns:
+        list[str]: Termes, dans l'ordre du texte (avec répétitions).
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [
+        term for term in _TOKEN.findall(text.replace("_", " "))
+        if term not in STOPWORDS and (len(term) > 1 or term.isdigit())
+    ]
+
+
+class LexicalIndex:
+    """
+    Index inversé BM25 stocké dans SQLite, partagé entre threads.
+
+    Les chunks reçoivent un numéro interne (entier) pour que les postings
+    `(terme, chunk, fréquence)` restent compacts.
+
+    Attributs :
+        path (Path) : Fichier SQLite de l'index.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " doc INTEGER PRIMARY KEY,"
+            " chunk_id TEXT NOT NULL UNIQUE,"
+            " length INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL,"
+            " doc INTEGER NOT NULL,"
+            " tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, doc)) WITHOUT ROWID"
+        )
+        # Nombre de chunks et longueur totale, tenus à jour à chaque ajout (pas de COUNT à la recherche)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stats (n INTEGER NOT NULL, total_length INTEGER NOT NULL)")
+        if self._conn.execute("SELECT COUNT(*) FROM stats").fetchone()[0] == 0:
+            self._conn.execute("INSERT INTO stats VALUES (0, 0)")
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT n FROM stats").fetchone()[0]
+
+    def add(self, chunks: Iterable[tuple[str, str]]) -> int:
+        """
+        Ajoute des chunks à l'index (ceux dont l'ID est déjà présent sont ignorés).
+
+        Args:
+            chunks (Iterable[tuple[str, str]]): Paires (ID du chunk, texte).
+
+        Returns:
+            int: Nombre de chunks ajoutés.
+        """
+        added = total_length = 0
+        with self._lock:
+            for chunk_id, text in chunks:
+                terms = Counter(tokenize(text))
+                length = sum(terms.values())
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO chunks (chunk_id, length) VALUES (?, ?)", (chunk_id, length)
+                )
+                if not cursor.rowcount:
+                    continue
+                doc = cursor.lastrowid
+                self._conn.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?)", [(term, doc, tf) for term, tf in terms.items()]
+                )
+                added += 1
+                total_length += length
+            if added:
+                self._conn.execute("UPDATE stats SET n = n + ?, total_length = total_length + ?", (added, total_length))
+            self._conn.commit()
+        return added
+
+    def remove(self, chunk_ids: Iterable[str]) -> int:
+        """
+        Retire des chunks de l'index (les IDs absents sont ignorés).
+
+        Args:
+            chunk_ids (Iterable[str]): IDs des chunks à retirer.
+
+        Returns:
+            int: Nombre de chunks retirés.
+        """
+        with self._lock:
+            rows = []
+            for chunk_id in chunk_ids:
+                row = self._conn.execute("SELECT doc, length FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+                if row is not None:
+                    rows.append(row)
+            # Postings indexés par terme : une seule passe par lot de chunks, pas une par chunk
+            for i in range(0, len(rows), REMOVE_BATCH):
+                docs = [doc for doc, _ in rows[i:i + REMOVE_BATCH]]
+                placeholders = ",".join("?" * len(docs))
+                self._conn.execute(f"DELETE FROM postings WHERE doc IN ({placeholders})", docs)
+                self._conn.execute(f"DELETE FROM chunks WHERE doc IN ({placeholders})", docs)
+            if rows:
+                self._conn.execute(
+                    "UPDATE stats SET n = n - ?, total_length = total_length - ?",
+                    (len(rows), sum(length for _, length in rows)),
+                )
+            self._conn.commit()
+        return len(rows)
+
+    def add_documents(self, documents: Iterable[Document]) -> int:
+        """
+        Ajoute des chunks LangChain (ID lu dans `metadata["id"]`).
+
+        Args:
+            documents (Iterable[Document]): Chunks produits par `split_documents` / `iter_chunks`.
+
+        Returns:
+            int: Nombre de chunks ajoutés.
+        """
+        return self.add((doc.metadata["id"], doc.page_content) for doc in documents)
+
+    def add_from_chroma(self, vectordb, page_size: int = CHROMA_PAGE_SIZE) -> int:
+        """
+        Indexe tous les chunks d'une base Chroma (construction initiale d'une base existante).
+
+        Args:
+            vectordb: Instance LangChain `Chroma`.
+            page_size (int): Nombre de chunks lus à la fois.
+
+        Returns:
+            int: Nombre de chunks ajoutés.
+        """
+        added = offset = 0
+        while True:
+            page = vectordb.get(include=["documents"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                return added
+            added += self.add(zip(page["ids"], page["documents"]))
+            offset += len(page["ids"])
+
+    def term_weights(self, terms: list[str]) -> tuple[dict[str, float], float]:
+        """
+        IDF BM25 de termes et longueur moyenne des chunks, calculées sur tout l'index.
+
+        Args:
+            terms (list[str]): Termes (déjà passés par `tokenize`).
+
+        Returns:
+            tuple[dict[str, float], float]: IDF des termes présents dans l'index, et
+            longueur moyenne d'un chunk (en termes).
+        """
+        terms = list(dict.fromkeys(terms))
+        with self._lock:
+            n, total_length = self._conn.execute("SELECT n, total_length FROM stats").fetchone()
+            if not n or not terms:
+                return {}, 1.0
+            frequencies = self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({','.join('?' * len(terms))}) GROUP BY term",
+                terms,
+            ).fetchall()
+        # IDF de BM25 (variante toujours positive)
+        weights = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in frequencies}
+        return weights, max(total_length / n, 1.0)
+
+    def search(self, query: str, k: int = 50) -> list[tuple[str, float]]:
+        """
+        Retourne les chunks les mieux classés par BM25 pour une requête.
+
+        Args:
+            query (str): Requête en langage naturel.
+            k (int): Nombre maximal de chunks retournés.
+
+        Returns:
+            list[tuple[str, float]]: IDs des chunks et score BM25, du meilleur au moins bon.
+        """
+        weights, avgdl = self.term_weights(tokenize(query))
+        if not weights:
+            return []
+        # IDF passé à SQLite avec chaque terme
+        params = {"k1": BM25_K1, "b": BM25_B, "avgdl": avgdl, "k": k}
+        values = []
+        for i, (term, idf) in enumerate(weights.items()):
+            params[f"t{i}"], params[f"w{i}"] = term, idf
+            values.append(f"(:t{i}, :w{i})")
+        with self._lock:
+            rows = self._conn.execute(
+                f"WITH query(term, idf) AS (VALUES {','.join(values)}) "
+                "SELECT c.chunk_id, SUM(q.idf * p.tf * (:k1 + 1) "
+                "  / (p.tf + :k1 * (1 - :b + :b * c.length / :avgdl))) AS score "
+                "FROM query q JOIN postings p ON p.term = q.term JOIN chunks c ON c.doc = p.doc "
+                "GROUP BY p.doc ORDER BY score DESC LIMIT :k",
+                params,
+            ).fetchall()
+        return [(chunk_id, score) for chunk_id, score in rows]
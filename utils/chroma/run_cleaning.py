@@ -1,30 +1,219 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
-from .cleaning.csv_cleaner import read_csv_files
-from .cleaning.xls_cleaner import read_xls_files
-from .cleaning.pdf_cleaner import clean_pdf_files
+from .cleaning import csv_cleaner, pdf_cleaner, xls_cleaner
 
 # Dossiers de base
 RAW_DIR = Path("data/raw")
 CLEAN_DIR = Path("data/clean")
 
+# Manifeste du nettoyage incrémental (dans le dossier nettoyé)
+MANIFEST_NAME = "clean_manifest.json"
 
-def clean_all():
+# Familles de fichiers : (motif des fichiers bruts, version du nettoyeur).
+# Changer la version d'un nettoyeur force le re-nettoyage de toute sa famille.
+FAMILIES = {
+    "csv": ("*.csv", csv_cleaner.CLEANER_VERSION),
+    "xls": ("*.xls*", xls_cleaner.CLEANER_VERSION),
+    "pdf": ("*.pdf", pdf_cleaner.CLEANER_VERSION),
+}
+
+
+def hash_file(path: Path) -> str:
+    """
+    Calcule un hash MD5 pour le contenu binaire d'un fichier.
+
+    Args:
+        path (Path): Chemin du fichier.
+
+    Returns:
+        str: Hash MD5 du fichier.
+    """
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(clean_dir: Path) -> dict:
+    """
+    Charge le manifeste du nettoyage.
+
+    Le manifeste associe à chaque fichier brut (chemin relatif à `data/raw`) son hash,
+    sa taille et sa date de modification, la version du nettoyeur utilisée et les
+    fichiers produits (chemins relatifs à `data/clean`).
+
+    Args:
+        clean_dir (Path): Dossier des fichiers nettoyés.
+
+    Returns:
+        dict: Manifeste (vide s'il n'existe pas ou est illisible).
+    """
+    path = clean_dir / MANIFEST_NAME
+    if path.exists():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            print("⚠️ Manifeste de nettoyage illisible, nettoyage complet.")
+    return {}
+
+
+def save_manifest(clean_dir: Path, manifest: dict):
+    """
+    Sauvegarde le manifeste de manière atomique.
+
+    Args:
+        clean_dir (Path): Dossier des fichiers nettoyés.
+        manifest (dict): Manifeste à sauvegarder.
+    """
+    clean_dir.mkdir(parents=True, exist_ok=True)
+    path = clean_dir / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def clean_file(family: str, file: Path, out_dir: Path) -> list[str] | None:
+    """
+    Nettoie un fichier brut (exécuté dans un processus du pool).
+
+    Args:
+        family (str): Famille du fichier ("csv", "xls" ou "pdf").
+        file (Path): Fichier brut.
+        out_dir (Path): Dossier de sortie de la famille.
+
+    Returns:
+        list[str] | None: Noms des fichiers .parquet produits, ou None en cas d'échec.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if family in ("csv", "xls"):
+        cleaner = csv_cleaner.process_csv_file if family == "csv" else xls_cleaner.process_excel_file
+        out_path = cleaner(file, out_dir)
+        return None if out_path is None else [out_path.name]
+    return [f"{file.name}.parquet"] if pdf_cleaner.process_pdf_file(file, out_dir) else None
+
+
+def _is_up_to_date(entry: dict | None, file: Path, version: int, clean_dir: Path) -> tuple[bool, str | None]:
+    """
+    Indique si un fichier brut est déjà nettoyé avec la version courante du nettoyeur.
+
+    Un fichier en échec au nettoyage précédent n'est jamais à jour : il est retenté
+    à chaque lancement (l'échec peut être passager : dépendance absente, fichier verrouillé).
+    La taille et la date de modification évitent de relire les fichiers inchangés ;
+    le hash n'est calculé que si elles diffèrent.
+
+    Returns:
+        tuple[bool, str | None]: (à jour ?, hash calculé ou None s'il n'a pas été nécessaire).
     """
-    Lance le nettoyage de tous les types de fichiers :
+    if not entry or entry.get("failed") or entry.get("version") != version:
+        return False, None
+    if not all((clean_dir / output).exists() for output in entry.get("outputs", [])):
+        return False, None
+    stat = file.stat()
+    if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+        return True, None
+    file_hash = hash_file(file)
+    return entry.get("hash") == file_hash, file_hash
+
+
+def clean_all(raw_dir: Path = RAW_DIR, clean_dir: Path = CLEAN_DIR, max_workers: int | None = None, force: bool = False) -> dict:
+    """
+    Lance le nettoyage incrémental de tous les types de fichiers :
     - CSV → Parquet
     - Excel → Parquet
-    - PDF (page par page) → Parquet
+    - PDF (un fichier par PDF, une ligne par page) → Parquet
+
+    Seuls les fichiers nouveaux, modifiés (hash du contenu) ou traités par une
+    ancienne version de leur nettoyeur sont nettoyés, en parallèle sur un pool de
+    processus partagé par les trois familles. Les sorties des fichiers bruts
+    supprimés sont effacées. Un fichier en échec est retenté à chaque lancement.
 
     Les résultats sont stockés dans data/clean/[csv|xls|pdf]
+
+    Args:
+        raw_dir (Path): Dossier des fichiers bruts.
+        clean_dir (Path): Dossier des fichiers nettoyés.
+        max_workers (int | None): Nombre de processus (par défaut : nombre de CPU).
+        force (bool): Si True, re-nettoie tous les fichiers.
+
+    Returns:
+        dict: Statistiques `{"cleaned", "skipped", "failed", "removed"}`.
     """
-    print("📄 Nettoyage CSV...")
-    read_csv_files(RAW_DIR / "csv", CLEAN_DIR / "csv")
+    start = time.time()
+    manifest = {} if force else load_manifest(clean_dir)
+    stats = {"cleaned": 0, "skipped": 0, "failed": 0, "removed": 0}
+
+    todo = []
+    seen = set()
+    for family, (pattern, version) in FAMILIES.items():
+        for file in sorted((raw_dir / family).glob(pattern)):
+            key = f"{family}/{file.name}"
+            seen.add(key)
+            up_to_date, file_hash = _is_up_to_date(manifest.get(key), file, version, clean_dir)
+            if up_to_date:
+                stat = file.stat()
+                manifest[key].update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                stats["skipped"] += 1
+            else:
+                todo.append((key, family, file, version, file_hash))
+
+    # Fichiers bruts supprimés : leurs sorties disparaissent aussi
+    for key in [key for key in manifest if key not in seen]:
+        for output in manifest.pop(key).get("outputs", []):
+            (clean_dir / output).unlink(missing_ok=True)
+        stats["removed"] += 1
+        print(f"🗑️ Sorties supprimées : {key}")
+
+    if todo:
+        print(f"🧹 Nettoyage de {len(todo)} fichier(s) ({stats['skipped']} inchangé(s))...")
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(clean_file, family, file, clean_dir / family): (key, family, file, version, file_hash)
+                for key, family, file, version, file_hash in todo
+            }
+            for future in as_completed(futures):
+                key, family, file, version, file_hash = futures[future]
+                try:
+                    outputs = future.result()
+                except Exception as e:
+                    print(f"❌ Échec du nettoyage : {key} - {e}")
+                    outputs = None
+                if outputs is None:
+                    stats["failed"] += 1
+                outputs = [f"{family}/{name}" for name in outputs or []]
+                # Anciennes sorties qui ne sont plus produites (ex : PDF raccourci)
+                for old in set(manifest.get(key, {}).get("outputs", [])) - set(outputs):
+                    (clean_dir / old).unlink(missing_ok=True)
+                stat = file.stat()
+                manifest[key] = {
+                    "hash": file_hash or hash_file(file),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "version": version,
+                    "outputs": outputs,
+                    # Un échec est retenté au prochain lancement
+                    "failed": not outputs,
+                }
+                stats["cleaned"] += bool(outputs)
+                save_manifest(clean_dir, manifest)
 
-    print("📊 Nettoyage Excel...")
-    read_xls_files(RAW_DIR / "xls", CLEAN_DIR / "xls")
+    save_manifest(clean_dir, manifest)
+    print(f"✅ Nettoyage terminé en {time.time() - start:.2f}s : {stats['cleaned']} nettoyé(s), "
+          f"{stats['skipped']} inchangé(s), {stats['failed']} en échec, {stats['removed']} supprimé(s).")
+    return stats
 
-    print("📚 Nettoyage PDF...")
-    clean_pdf_files(RAW_DIR / "pdf", CLEAN_DIR / "pdf")
 
-    print("✅ Nettoyage complet terminé.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nettoyage incrémental de data/raw vers data/clean.")
+    parser.add_argument("--force", action="store_true", help="re-nettoie tous les fichiers, même inchangés")
+    parser.add_argument("--workers", type=int, default=None, help="nombre de processus (défaut : nombre de CPU)")
+    args = parser.parse_args()
+    clean_all(max_workers=args.workers, force=args.force)
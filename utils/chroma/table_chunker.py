@@ -0,0 +1,154 @@
+"""
+Découpage des tableaux (CSV, Excel) en blocs de lignes consécutives.
+
+Indexer chaque ligne séparément produit des milliers de vecteurs quasi identiques,
+sans le nom des colonnes : une ligne `"2021-03 | 12.4 | 15.1"` ne dit pas de quoi
+elle parle. Les lignes consécutives d'un tableau sont donc regroupées en blocs,
+chacun précédé du nom du fichier et de l'en-tête des colonnes, dans la limite d'un
+budget de tokens. Les bornes du bloc (`row_start`, `row_end`) sont conservées en
+métadonnée pour retrouver les lignes d'origine.
+
+Les tableaux très larges gardent un en-tête résumé (premières colonnes puis leur
+nombre) et leurs lignes trop longues sont coupées entre deux cellules, chaque partie
+reprenant la première cellule de la ligne : aucun bloc ne dépasse le budget et les
+blocs ne sont jamais redécoupés par `split_documents`.
+"""
+
+import re
+from typing import Iterable, Iterator
+
+from langchain.schema import Document
+
+from utils.conversation_memory import count_tokens
+
+# Budget d'un bloc, en-tête compris (environ 4 caractères par token)
+TABLE_CHUNK_TOKENS = 400
+# Part maximale du budget occupée par l'en-tête (tableaux très larges)
+MAX_HEADER_SHARE = 0.15
+# Séparateur des cellules d'une ligne (voir `rows_to_records`)
+CELL_SEPARATOR = " | "
+
+# Colonnes sans nom générées par Polars/Pandas à la lecture : aucune information pour l'en-tête
+UNNAMED_COLUMN = re.compile(r"^(__UNNAMED__\d+|Unnamed: \d+|column_\d+)$")
+
+
+def table_header(source_file: str, columns: list[str], max_tokens: int = TABLE_CHUNK_TOKENS) -> str:
+    """
+    Construit l'en-tête répété en tête de chaque bloc d'un tableau.
+
+    Args:
+        source_file (str): Nom du fichier .parquet d'origine.
+        columns (list[str]): Noms des colonnes, dans l'ordre des valeurs de chaque ligne.
+        max_tokens (int): Budget d'un bloc ; l'en-tête est tronqué à `MAX_HEADER_SHARE` de ce budget.
+
+    Returns:
+        str: `"Tableau : ..."` suivi de `"Colonnes : a | b | ..."` si des colonnes sont
+        nommées ; au-delà du budget de l'en-tête, seules les premières colonnes sont
+        citées, suivies de `"(+N colonnes)"`.
+    """
+    header = f"Tableau : {source_file.removesuffix('.parquet')}"
+    max_chars = int(max_tokens * MAX_HEADER_SHARE) * 4
+    if len(header) > max_chars:
+        header = header[:max_chars].rsplit(" ", 1)[0] + " ..."
+    named = [column.strip() for column in columns if column.strip() and not UNNAMED_COLUMN.match(column)]
+    if not named:
+        return header
+    listed = header + "\nColonnes : " + CELL_SEPARATOR.join(named)
+    if len(listed) <= max_chars:
+        return listed
+    # Tableau large : les premières colonnes qui tiennent, puis le nombre de colonnes omises
+    kept = []
+    for column in named:
+        rest = f" (+{len(named) - len(kept) - 1} colonnes)"
+        if len(header) + len("\nColonnes : ") + len(CELL_SEPARATOR.join([*kept, column])) + len(rest) > max_chars:
+            break
+        kept.append(column)
+    return header + "\nColonnes : " + CELL_SEPARATOR.join(kept) + f" (+{len(named) - len(kept)} colonnes)"
+
+
+def split_wide_row(text: str, max_tokens: int) -> list[str]:
+    """
+    Coupe une ligne trop longue entre deux cellules.
+
+    Chaque partie reprend la première cellule de la ligne (clé : date, libellé...) ;
+    une cellule plus longue que le budget est elle-même coupée sur une fin de mot.
+
+    Args:
+        text (str): Ligne `"clé | valeur | ..."`.
+        max_tokens (int): Budget de tokens d'une partie.
+
+    Returns:
+        list[str]: Parties de la ligne, dans l'ordre (la ligne entière si elle tient).
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    key, *cells = text.split(CELL_SEPARATOR)
+    max_chars = max_tokens * 4
+    if not cells or len(key) > max_chars // 2:
+        # Pas de cellules, ou clé trop longue pour être répétée : coupe tous les `max_chars` caractères
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+    parts, current = [], key
+    for cell in cells:
+        if len(current) + len(CELL_SEPARATOR) + len(cell) > max_chars and current != key:
+            parts.append(current)
+            current = key
+        while len(current) + len(CELL_SEPARATOR) + len(cell) > max_chars:
+            room = max_chars - len(current) - len(CELL_SEPARATOR)
+            parts.append(current + CELL_SEPARATOR + cell[:room])
+            cell, current = cell[room:], key
+        current += CELL_SEPARATOR + cell
+    parts.append(current)
+    return parts
+
+
+def chunk_table_rows(
+    rows: Iterable[tuple[int, str]],
+    header: str,
+    source_file: str,
+    max_tokens: int = TABLE_CHUNK_TOKENS,
+) -> Iterator[Document]:
+    """
+    Regroupe les lignes consécutives d'un tableau en blocs annotés par l'en-tête.
+
+    Une ligne n'est jamais répartie sur deux blocs de plusieurs lignes : une ligne
+    plus longue que le budget est coupée entre deux cellules (`split_wide_row`), et
+    chaque partie forme un bloc à elle seule, avec le même numéro de ligne.
+
+    Args:
+        rows (Iterable[tuple[int, str]]): Paires (numéro de ligne dans le fichier, texte de la ligne).
+        header (str): En-tête du tableau (voir `table_header`).
+        source_file (str): Nom du fichier .parquet d'origine.
+        max_tokens (int): Budget de tokens d'un bloc, en-tête compris.
+
+    Yields:
+        Document: Un bloc par groupe de lignes, avec `source_file`, `row_start` et
+        `row_end` (numéros de lignes inclus, à partir de 0) en métadonnée.
+    """
+    header_tokens = count_tokens(header)
+    lines, start, end, used = [], None, None, header_tokens
+
+    def block() -> Document:
+        return Document(
+            page_content=header + "\n" + "\n".join(lines),
+            metadata={"source_file": source_file, "row_start": start, "row_end": end},
+        )
+
+    for row, text in rows:
+        tokens = count_tokens(text) + 1  # + saut de ligne
+        if lines and used + tokens > max_tokens:
+            yield block()
+            lines, start, used = [], None, header_tokens
+        if header_tokens + tokens > max_tokens:
+            # Ligne d'un tableau large : une partie par bloc
+            for part in split_wide_row(text, max_tokens - header_tokens - 1):
+                lines, start, end = [part], row, row
+                yield block()
+            lines, start, used = [], None, header_tokens
+            continue
+        if start is None:
+            start = row
+        lines.append(text)
+        end = row
+        used += tokens
+    if lines:
+        yield block()
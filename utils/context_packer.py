@@ -0,0 +1,253 @@
+"""
+Mise en forme compacte des documents retrouvés, dans un budget de tokens.
+
+L'observation renvoyée au LLM par la recherche documentaire est relue à chaque
+itération de l'agent ReAct : chaque token compte. Plutôt que d'afficher chaque
+document tronqué à 500 caractères, les documents sont regroupés par fichier
+source (`source_file`) :
+- les blocs de lignes d'un même tableau partagent un seul en-tête de colonnes,
+  triés par numéro de ligne, `…` marquant les lignes non retrouvées entre deux blocs ;
+  les lignes sans valeur sont omises, et les lignes consécutives aux mêmes valeurs
+  dont les clés sont des nombres ou des dates qui se suivent dans un même sens
+  sont regroupées (`2024-12 → 2024-07 | 13.8591 | ...`) ; les autres clés (codes,
+  noms) ne forment pas d'intervalle ;
+- les chunks de texte consécutifs d'une même page sont fusionnés (chevauchement
+  du découpage retiré) ;
+- les lignes et chunks identiques (aux espaces près) ne sont gardés qu'une fois ;
+- les sources sont ajoutées par pertinence (ordre des documents reçus) jusqu'à
+  épuisement du budget, chacune limitée à `MAX_SOURCE_SHARE` du budget.
+"""
+
+import re
+
+from langchain_core.documents import Document
+
+from utils.conversation_memory import count_tokens
+
+CONTEXT_TOKEN_BUDGET = 1200        # taille maximale de l'observation (tokens estimés)
+MAX_SOURCE_SHARE = 0.5             # part maximale du budget pour une source (s'il y en a plusieurs)
+MIN_TRUNCATED_TOKENS = 40          # en dessous, un texte qui ne tient pas est omis plutôt que tronqué
+MAX_OVERLAP_CHARS = 200            # chevauchement maximal recherché entre deux chunks consécutifs
+
+TABLE_PREFIX = "Tableau : "
+COLUMNS_PREFIX = "Colonnes : "
+NO_DOCUMENT = "Aucun document trouvé."
+
+# Clé de ligne ordonnable : date `AAAA`, `AAAA-MM` ou `AAAA-MM-JJ`, sinon nombre
+_DATE_KEY = re.compile(r"^(\d{4})(?:-(\d{2}))?(?:-(\d{2}))?$")
+
+
+def _is_table_block(doc: Document) -> bool:
+    """Indique si un document est un bloc de lignes de tableau (`chunk_table_rows`)."""
+    return "row_start" in doc.metadata
+
+
+def _split_table_block(text: str) -> tuple[str | None, list[str]]:
+    """Sépare la ligne `Colonnes : ...` d'un bloc de tableau de ses lignes de données."""
+    lines = [line for line in text.splitlines() if line.strip()]
+    if lines and lines[0].startswith(TABLE_PREFIX):
+        lines = lines[1:]
+    columns = None
+    if lines and lines[0].startswith(COLUMNS_PREFIX):
+        columns, lines = lines[0], lines[1:]
+    return columns, lines
+
+
+def _ordinal_key(cell: str) -> tuple | None:
+    """Valeur ordonnable d'une clé de ligne (date ou nombre), ou None (code, nom...)."""
+    match = _DATE_KEY.match(cell)
+    if match:
+        return ("date", tuple(int(part) for part in match.groups() if part is not None))
+    try:
+        return ("nombre", (float(cell.replace(",", ".")),))
+    except ValueError:
+        return None
+
+
+def _compact_rows(lines: list[str]) -> list[str]:
+    """
+    Compacte des lignes consécutives d'un tableau (`"clé | valeur | ..."`).
+
+    Les cellules vides en fin de ligne sont retirées, les lignes sans aucune valeur
+    après la première cellule sont omises. Les lignes successives aux valeurs
+    identiques ne forment qu'une ligne `"première → dernière"` que si leurs clés sont
+    des dates (ou des nombres) de même format, qui progressent toutes dans le même
+    sens : un intervalle de codes ou de noms n'aurait pas de sens.
+
+    Args:
+        lines (list[str]): Lignes d'un bloc, dans l'ordre du fichier.
+
+    Returns:
+        list[str]: Lignes compactées.
+    """
+    runs = []  # [première clé, dernière clé, valeurs, clé ordonnable de la dernière, sens]
+    for line in lines:
+        cells = [cell.strip() for cell in line.split("|")]
+        if len(cells) == 1:
+            runs.append([line, line, None, None, 0])
+            continue
+        values = cells[1:]
+        while values and not values[-1]:
+            values.pop()
+        if not values:
+            continue
+        key = _ordinal_key(cells[0])
+        if runs and runs[-1][2] == values and key is not None and runs[-1][3] is not None:
+            (kind, last), (new_kind, current) = runs[-1][3], key
+            direction = (current > last) - (current < last)
+            if kind == new_kind and len(last) == len(current) and direction and runs[-1][4] in (0, direction):
+                runs[-1][1], runs[-1][3], runs[-1][4] = cells[0], key, direction
+                continue
+        runs.append([cells[0], cells[0], values, key, 0])
+    return [
+        first if values is None else " | ".join([first if first == last else f"{first} → {last}", *values])
+        for first, last, values, _, _ in runs
+    ]
+
+
+def _merge_overlap(left: str, right: str) -> str:
+    """Concatène deux chunks consécutifs en retirant leur chevauchement éventuel."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), 10, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n" + right
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Coupe un texte à `max_tokens` tokens estimés, sur une fin de mot."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    return text[:max_tokens * 4].rsplit(" ", 1)[0] + " …"
+
+
+class _DuplicateFilter:
+    """Écarte les lignes et chunks identiques (aux espaces près) à un texte déjà gardé."""
+
+    def __init__(self):
+        self._seen = set()
+
+    def is_duplicate(self, text: str) -> bool:
+        key = " ".join(text.split())
+        if key in self._seen:
+            return True
+        self._seen.add(key)
+        return False
+
+
+class _Source:
+    """
+    Documents retrouvés d'un même fichier, rendus ensemble.
+
+    Attributs :
+        name (str) : Fichier source (`source_file`).
+        docs (list[tuple[int, Document]]) : Documents et rang de pertinence.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.docs = []
+
+    def render(self, max_tokens: int, duplicates: _DuplicateFilter) -> str | None:
+        """
+        Rend la source dans la limite de `max_tokens` (None si rien ne tient).
+
+        Les documents sont retenus par pertinence, puis affichés dans l'ordre du fichier.
+        """
+        title = self.name.removesuffix(".parquet")
+        tables = [(rank, doc) for rank, doc in self.docs if _is_table_block(doc)]
+        texts = [(rank, doc) for rank, doc in self.docs if not _is_table_block(doc)]
+        lines, remaining = [], max_tokens - count_tokens(title) - 2
+        if tables:
+            block, used = self._render_table(tables, remaining, duplicates)
+            lines.extend(block)
+            remaining -= used
+        if texts:
+            lines.extend(self._render_texts(texts, remaining, duplicates)[0])
+        if not any(line != "…" and not line.startswith(COLUMNS_PREFIX) for line in lines):
+            return None
+        return f"[{title}]\n" + "\n".join(lines)
+
+    @staticmethod
+    def _render_table(tables: list, budget: int, duplicates: _DuplicateFilter) -> tuple[list[str], int]:
+        """Lignes d'un tableau (et tokens utilisés) : un seul en-tête, blocs triés par ligne, `…` entre blocs non contigus."""
+        columns = next((c for c in (_split_table_block(d.page_content)[0] for _, d in tables) if c), None)
+        kept, remaining = [], budget - (count_tokens(columns) + 1 if columns else 0)
+        for _, doc in sorted(tables, key=lambda item: item[0]):
+            rows = []
+            for line in _compact_rows(_split_table_block(doc.page_content)[1]):
+                tokens = count_tokens(line) + 1
+                if tokens > remaining:
+                    break
+                if not duplicates.is_duplicate(line):
+                    rows.append(line)
+                    remaining -= tokens
+            if rows:
+                kept.append((doc.metadata.get("row_start", 0), doc.metadata.get("row_end", 0), rows))
+            if remaining <= 0:
+                break
+        if not kept:
+            return [], 0
+        lines = [columns] if columns else []
+        previous_end = None
+        for start, end, rows in sorted(kept, key=lambda item: item[0]):
+            if previous_end is not None and start > previous_end + 1:
+                lines.append("…")
+            lines.extend(rows)
+            previous_end = end if previous_end is None else max(previous_end, end)
+        return lines, budget - remaining
+
+    @staticmethod
+    def _render_texts(texts: list, budget: int, duplicates: _DuplicateFilter) -> tuple[list[str], int]:
+        """Chunks de texte (et tokens utilisés) : fusion des chunks consécutifs d'une même page, doublons retirés."""
+        kept, remaining = [], budget
+        for _, doc in sorted(texts, key=lambda item: item[0]):
+            text = doc.page_content.strip()
+            if duplicates.is_duplicate(text):
+                continue
+            tokens = count_tokens(text) + 1
+            if tokens > remaining:
+                if remaining < MIN_TRUNCATED_TOKENS:
+                    break
+                text, tokens = _truncate(text, remaining - 1), remaining
+            kept.append((doc.metadata.get("page"), text))
+            remaining -= tokens
+        lines = []
+        for page in dict.fromkeys(page for page, _ in kept):
+            merged = None
+            for text in (text for p, text in kept if p == page):
+                merged = text if merged is None else _merge_overlap(merged, text)
+            lines.append(merged if page is None else f"(p. {page}) {merged}")
+        return lines, budget - remaining
+
+
+def pack_documents(docs: list[Document], max_tokens: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Rend des documents retrouvés en un contexte compact, dans un budget de tokens.
+
+    Args:
+        docs (list[Document]): Documents, du plus pertinent au moins pertinent.
+        max_tokens (int): Taille maximale du contexte (tokens estimés).
+
+    Returns:
+        str: Une section `[fichier]` par source, par pertinence décroissante, ou
+        `NO_DOCUMENT` si aucun document n'est fourni.
+    """
+    if not docs:
+        return NO_DOCUMENT
+    sources = {}
+    for rank, doc in enumerate(docs):
+        name = doc.metadata.get("source_file", "inconnu")
+        sources.setdefault(name, _Source(name)).docs.append((rank, doc))
+
+    # Une source ne peut occuper tout le budget que si elle est seule
+    source_budget = max_tokens if len(sources) == 1 else int(max_tokens * MAX_SOURCE_SHARE)
+    duplicates = _DuplicateFilter()
+    sections, remaining = [], max_tokens
+    for source in sources.values():
+        if remaining < MIN_TRUNCATED_TOKENS:
+            break
+        section = source.render(min(source_budget, remaining), duplicates)
+        if section:
+            sections.append(section)
+            remaining -= count_tokens(section) + 1
+    return "\n\n".join(sections) if sections else NO_DOCUMENT
@@ -0,0 +1,203 @@
+"""
+Historique de conversation borné, avec résumé incrémental.
+
+Les derniers échanges (question + réponse) sont conservés mot pour mot, dans la
+limite d'un nombre de tours et d'un budget de tokens. Les échanges plus anciens
+sont fusionnés par le LLM dans un résumé, mis à jour à chaque débordement :
+la taille du prompt envoyé à l'agent ne croît plus avec la durée de la session.
+Le résumé (un appel au LLM) peut être fait en arrière-plan, une fois la réponse
+affichée : le tour suivant ne l'attend que s'il commence avant sa fin.
+"""
+
+import math
+import threading
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from utils.tracing import tracer
+
+MAX_TURNS = 4            # Nombre d'échanges conservés mot pour mot
+MAX_HISTORY_TOKENS = 1500  # Budget de tokens des échanges conservés mot pour mot
+MAX_SUMMARY_TOKENS = 300   # Taille visée pour le résumé des anciens échanges
+
+# Préfixe du message système portant le résumé (reconnu par `RagAgent.historique_to_prompt`)
+SUMMARY_PREFIX = "Résumé de la conversation précédente :"
+
+SUMMARY_PROMPT = """Tu mets à jour le résumé d'une conversation entre un utilisateur et un assistant
+spécialisé dans la transition écologique.
+
+Résumé actuel :
+{summary}
+
+Nouveaux échanges à intégrer :
+{lines}
+
+Rédige le nouveau résumé, en français, en {max_words} mots maximum. Conserve les faits,
+chiffres, sources et questions de l'utilisateur utiles pour la suite. Réponds uniquement par le résumé."""
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estime le nombre de tokens d'un texte (environ 4 caractères par token).
+
+    Args:
+        text (str): Texte à mesurer.
+
+    Returns:
+        int: Nombre de tokens estimé.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def messages_to_lines(messages: list[BaseMessage]) -> str:
+    """
+    Convertit des messages en lignes préfixées "Utilisateur :" / "Assistant :".
+
+    Args:
+        messages (list[BaseMessage]): Messages HumanMessage et AIMessage.
+
+    Returns:
+        str: Une ligne par message.
+    """
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append(f"Utilisateur : {message.content}")
+        elif isinstance(message, AIMessage):
+            lines.append(f"Assistant : {message.content}")
+    return "\n".join(lines)
+
+
+class ConversationHistory:
+    """
+    Historique de conversation borné en tours et en tokens.
+
+    Attributs :
+        system_prompt (str) : Prompt système placé en tête de l'historique.
+        llm : LLM utilisé pour résumer les anciens échanges (None = ils sont oubliés).
+        max_turns (int) : Nombre d'échanges conservés mot pour mot.
+        max_tokens (int) : Budget de tokens des échanges conservés mot pour mot.
+        max_summary_tokens (int) : Taille visée pour le résumé.
+        summary (str) : Résumé des échanges sortis de la fenêtre.
+        recent (list[BaseMessage]) : Échanges conservés mot pour mot.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        llm=None,
+        max_turns: int = MAX_TURNS,
+        max_tokens: int = MAX_HISTORY_TOKENS,
+        max_summary_tokens: int = MAX_SUMMARY_TOKENS,
+    ):
+        self.system_prompt = system_prompt
+        self.llm = llm
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.max_summary_tokens = max_summary_tokens
+        self.summary = ""
+        self.recent = []
+        self._compaction = None
+
+    def append(self, message: BaseMessage):
+        """Ajoute un message (question de l'utilisateur ou réponse de l'assistant)."""
+        self.wait()
+        self.recent.append(message)
+
+    def messages(self) -> list[BaseMessage]:
+        """
+        Construit l'historique à envoyer au modèle.
+
+        Returns:
+            list[BaseMessage]: Prompt système, résumé éventuel, puis échanges récents.
+        """
+        self.wait()
+        messages = [SystemMessage(content=self.system_prompt)]
+        if self.summary:
+            messages.append(SystemMessage(content=f"{SUMMARY_PREFIX} {self.summary}"))
+        return messages + self.recent
+
+    def _turns(self) -> list[list[BaseMessage]]:
+        """Découpe les messages récents en échanges, chacun commençant par une question."""
+        turns = []
+        for message in self.recent:
+            if isinstance(message, HumanMessage) or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def compact(self):
+        """
+        Sort de la fenêtre les échanges en excès et les intègre au résumé.
+
+        Le dernier échange est toujours conservé. À appeler une fois la réponse
+        ajoutée, en fin de tour.
+        """
+        turns = self._turns()
+        evicted = []
+        while len(turns) > 1 and (
+            len(turns) > self.max_turns
+            or sum(count_tokens(str(m.content)) for turn in turns for m in turn) > self.max_tokens
+        ):
+            evicted.extend(turns.pop(0))
+        if not evicted:
+            return
+        self.recent = [message for turn in turns for message in turn]
+        self.summary = self._summarize(evicted)
+
+    def compact_in_background(self):
+        """
+        Lance `compact` dans un thread, sans attendre le résumé.
+
+        `append` et `messages` attendent la fin de la compaction en cours : l'historique
+        n'est jamais lu ni modifié pendant qu'elle s'exécute. Le span `memory.compact`
+        est rattaché au tour courant même s'il se termine après lui.
+        """
+        self.wait()
+        span = tracer.start_span("memory.compact", activate=False, detached=True, background=True)
+
+        def run():
+            error = None
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"[⚠️ Compaction de l'historique impossible] {e}")
+                error = e
+            finally:
+                tracer.end_span(span, error=error)
+
+        self._compaction = threading.Thread(target=run, name="history-compaction", daemon=True)
+        self._compaction.start()
+
+    def wait(self):
+        """Attend la fin de la compaction lancée par `compact_in_background`, s'il y en a une."""
+        compaction = self._compaction
+        if compaction is not None and compaction is not threading.current_thread():
+            compaction.join()
+            self._compaction = None
+
+    def _summarize(self, evicted: list[BaseMessage]) -> str:
+        """
+        Fusionne les échanges sortis de la fenêtre dans le résumé courant.
+
+        Args:
+            evicted (list[BaseMessage]): Messages sortis de la fenêtre.
+
+        Returns:
+            str: Nouveau résumé, tronqué au budget `max_summary_tokens`.
+        """
+        if self.llm is None:
+            return self.summary
+        prompt = SUMMARY_PROMPT.format(
+            summary=self.summary or "(aucun)",
+            lines=messages_to_lines(evicted),
+            max_words=int(self.max_summary_tokens * 0.75),
+        )
+        try:
+            summary = self.llm.invoke(prompt).content.strip()
+        except Exception as e:
+            # Sans résumé, les anciens échanges sont simplement oubliés
+            print(f"[⚠️ Résumé de conversation impossible] {e}")
+            return self.summary
+        max_chars = self.max_summary_tokens * 4
+        return summary if len(summary) <= max_chars else summary[:max_chars].rsplit(" ", 1)[0] + " ..."
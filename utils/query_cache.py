@@ -0,0 +1,192 @@
+"""
+Cache des résultats de recherche documentaire.
+
+L'agent ReAct relance souvent la même recherche (ou une recherche quasi identique)
+au cours d'une même question et d'un utilisateur à l'autre. Ce module fournit :
+- un cache LRU avec durée de vie, indexé par la requête normalisée ;
+- un niveau sémantique optionnel qui réutilise les résultats d'une requête dont
+  l'embedding est à une distance cosinus inférieure à un seuil ;
+- un marqueur de version de l'index (`.index_version` dans le dossier Chroma),
+  mis à jour par l'indexation, qui vide le cache dès que la collection change,
+  y compris quand l'indexation tourne dans un autre processus.
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+INDEX_VERSION_FILE = ".index_version"
+
+
+def bump_index_version(chroma_dir: Path):
+    """
+    Signale une modification de la collection Chroma aux caches de recherche.
+
+    Args:
+        chroma_dir (Path): Répertoire de la base Chroma.
+    """
+    chroma_dir = Path(chroma_dir)
+    chroma_dir.mkdir(parents=True, exist_ok=True)
+    (chroma_dir / INDEX_VERSION_FILE).write_text(str(time.time_ns()), encoding="utf-8")
+
+
+def read_index_version(chroma_dir: Path) -> str:
+    """
+    Lit la version courante de la collection Chroma.
+
+    Args:
+        chroma_dir (Path): Répertoire de la base Chroma.
+
+    Returns:
+        str: Version de l'index (chaîne vide si jamais indexé).
+    """
+    try:
+        return (Path(chroma_dir) / INDEX_VERSION_FILE).read_text(encoding="utf-8")
+    except OSError:
+        return ""
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalise une requête : casse, espaces et ponctuation finale.
+
+    Args:
+        query (str): Requête brute (ex : `Action Input` de l'agent).
+
+    Returns:
+        str: Requête normalisée servant de clé de cache.
+    """
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = re.sub(r"\s+", " ", query)
+    return query.strip(" \"'`.?!;:")
+
+
+def cosine_distance(a: list[float], b: list[float]) -> float:
+    """Distance cosinus (1 - similarité) entre deux vecteurs."""
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return 1.0 - dot / norm if norm else 1.0
+
+
+class QueryCache:
+    """
+    Cache LRU/TTL des résultats de recherche, avec niveau sémantique optionnel.
+
+    Attributs :
+        max_entries (int) : Nombre maximal de requêtes conservées.
+        ttl (float) : Durée de vie d'un résultat (secondes).
+        semantic_distance (float | None) : Distance cosinus maximale pour réutiliser
+            le résultat d'une requête proche (None = niveau sémantique désactivé).
+        hits, semantic_hits, misses (int) : Compteurs d'utilisation.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600.0,
+        semantic_distance: float | None = None,
+        embed_query: Callable[[str], list[float]] | None = None,
+        index_version: Callable[[], str] | None = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_distance = semantic_distance if embed_query else None
+        self.embed_query = embed_query
+        self.index_version = index_version
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # (portée, requête normalisée) -> (instant d'insertion, embedding de la requête, résultats)
+        self._entries = OrderedDict()
+        self._version = index_version() if index_version else ""
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Vide le cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def _check_version(self):
+        """Vide le cache si la collection a changé depuis son remplissage (sous `_lock`)."""
+        if self.index_version is None:
+            return
+        version = self.index_version()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def _lookup(self, key: tuple, vector: list[float] | None):
+        """Cherche une entrée valide, exacte puis sémantique dans la même portée (sous `_lock`)."""
+        now = time.time()
+        for expired in [k for k, (t, _, _) in self._entries.items() if now - t > self.ttl]:
+            del self._entries[expired]
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][2]
+        if vector is not None:
+            best_key, best = None, self.semantic_distance
+            for k, (_, other, _) in self._entries.items():
+                if k[0] == key[0] and other is not None and (distance := cosine_distance(vector, other)) <= best:
+                    best_key, best = k, distance
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.semantic_hits += 1
+                return self._entries[best_key][2]
+        return None
+
+    def get_or_search(self, query: str, search: Callable[[str], list], scope: str = "") -> list:
+        """
+        Retourne les résultats en cache pour la requête, ou lance la recherche.
+
+        Args:
+            query (str): Requête utilisateur ou de l'agent.
+            search (callable): Fonction de recherche appelée en cas d'absence.
+            scope (str): Paramètres de la recherche qui changent ses résultats (ex : `k=8`) ;
+                seules les entrées de la même portée sont réutilisées.
+
+        Returns:
+            list: Résultats de la recherche (partagés entre appels : ne pas les modifier).
+        """
+        key = (scope, normalize_query(query))
+        with self._lock:
+            self._check_version()
+            exact = self._lookup(key, None)
+        if exact is not None:
+            return exact
+
+        vector = self.embed_query(query) if self.semantic_distance is not None else None
+        if vector is not None:
+            with self._lock:
+                near = self._lookup(key, vector)
+            if near is not None:
+                return near
+
+        results = search(query)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (time.time(), vector, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return results
+
+    def stats(self) -> dict:
+        """
+        Retourne les compteurs du cache.
+
+        Returns:
+            dict: `hits`, `semantic_hits`, `misses` et `entries`.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,125 @@
+"""
+Second tri des candidats de la recherche documentaire, sur CPU.
+
+La sélection vectorielle ne regarde que la géométrie des embeddings. Le reranker
+relit le texte des candidats et les classe par :
+- score BM25 des termes de la requête, avec les statistiques de tout le corpus
+  (IDF et longueur moyenne de l'index lexical) ;
+- couverture : part des termes distincts de la requête présents dans le candidat ;
+- proximité : part des paires de termes consécutifs de la requête retrouvées côte
+  à côte dans le candidat.
+
+Ce score lexical ne remplace pas la première recherche : l'ordre final combine le
+rang lexical et le rang d'origine (MMR fusionné avec BM25), pondéré par
+`ORIGINAL_RANK_WEIGHT`, comme une reciprocal rank fusion.
+
+Les candidats sont ceux de la première recherche (sélection MMR parmi les `fetch_k`
+plus proches, fusionnée avec BM25) ; seuls les `RERANK_TOP_N` meilleurs sont gardés,
+ce qui réduit le contexte transmis au LLM.
+
+Aucun modèle n'est chargé : le coût est de quelques millisecondes pour 50
+candidats. Les candidats sont traités par lots de `RERANK_BATCH_SIZE` et le temps
+écoulé est vérifié après chaque lot : au-delà de `RERANK_BUDGET_MS`, les candidats
+restants gardent leur ordre d'origine, derrière ceux déjà triés.
+"""
+
+import time
+from collections import Counter
+
+from langchain_core.documents import Document
+
+from utils.chroma.lexical_index import BM25_B, BM25_K1, LexicalIndex, tokenize
+from utils.tracing import tracer
+
+RERANK_BUDGET_MS = 30.0   # temps maximal du reranking d'une requête (millisecondes)
+RERANK_BATCH_SIZE = 16    # candidats évalués entre deux vérifications du budget
+RERANK_TOP_N = 8          # documents conservés après reranking (None = tous)
+ORIGINAL_RANK_WEIGHT = 0.5  # poids du rang de la première recherche dans l'ordre final (0 = lexical seul)
+RANK_SMOOTHING = 60       # constante de lissage des rangs (comme `RRF_K` de la recherche hybride)
+COVERAGE_WEIGHT = 2.0     # poids de la couverture des termes de la requête
+PROXIMITY_WEIGHT = 1.0    # poids des paires de termes consécutifs retrouvées
+
+
+class TermOverlapReranker:
+    """
+    Reranker lexical borné en temps.
+
+    Attributs :
+        lexical (LexicalIndex | None) : Index fournissant les IDF du corpus (sinon IDF
+            uniforme et pas de normalisation par la longueur).
+        budget_ms (float) : Temps maximal d'un reranking (millisecondes).
+        batch_size (int) : Candidats évalués entre deux vérifications du budget.
+        original_weight (float) : Poids du rang d'origine face au rang lexical (0 à 1).
+    """
+
+    def __init__(
+        self,
+        lexical: LexicalIndex | None = None,
+        budget_ms: float = RERANK_BUDGET_MS,
+        batch_size: int = RERANK_BATCH_SIZE,
+        original_weight: float = ORIGINAL_RANK_WEIGHT,
+    ):
+        self.lexical = lexical
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.original_weight = original_weight
+
+    def _score(self, terms: list[str], pairs: set[tuple[str, str]], weights: dict, avgdl: float | None, text: str) -> float:
+        """Score d'un candidat : BM25 + couverture + proximité des termes de la requête."""
+        tokens = tokenize(text)
+        if not tokens:
+            return 0.0
+        counts = Counter(tokens)
+        norm = BM25_K1 if avgdl is None else BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avgdl)
+        bm25 = sum(
+            weights.get(term, 1.0) * counts[term] * (BM25_K1 + 1) / (counts[term] + norm)
+            for term in terms if term in counts
+        )
+        coverage = sum(1 for term in terms if term in counts) / len(terms)
+        proximity = len(pairs & set(zip(tokens, tokens[1:]))) / len(pairs) if pairs else 0.0
+        return bm25 + COVERAGE_WEIGHT * coverage + PROXIMITY_WEIGHT * proximity
+
+    def rerank(self, query: str, docs: list[Document], top_n: int | None = RERANK_TOP_N) -> list[Document]:
+        """
+        Reclasse des candidats et garde les `top_n` meilleurs.
+
+        Chaque candidat évalué reçoit `(1 - w) / (c + rang lexical) + w / (c + rang
+        d'origine)`, avec `w = original_weight` et `c = RANK_SMOOTHING` : un document
+        bien placé par la première recherche ne recule que si le texte le justifie.
+
+        Args:
+            query (str): Requête en langage naturel.
+            docs (list[Document]): Candidats, dans l'ordre de la première recherche.
+            top_n (int | None): Nombre de documents conservés (None = tous).
+
+        Returns:
+            list[Document]: Candidats triés par score combiné décroissant ; si le budget
+            est dépassé, les candidats non évalués suivent, dans leur ordre d'origine.
+        """
+        query_tokens = tokenize(query)
+        terms = list(dict.fromkeys(query_tokens))
+        if not terms or not docs:
+            return docs[:top_n]
+        with tracer.span("rerank", candidates=len(docs)) as span:
+            start = time.perf_counter()
+            weights, avgdl = self.lexical.term_weights(terms) if self.lexical is not None else ({}, None)
+            pairs = set(zip(query_tokens, query_tokens[1:]))
+            scored = []
+            for i in range(0, len(docs), self.batch_size):
+                for doc in docs[i:i + self.batch_size]:
+                    scored.append((self._score(terms, pairs, weights, avgdl, doc.page_content), len(scored), doc))
+                if (time.perf_counter() - start) * 1000 > self.budget_ms:
+                    break
+            fallback = len(scored) < len(docs)
+            span.set(scored=len(scored), fallback=fallback)
+            if fallback:
+                print(f"⏱️ Reranking interrompu (budget {self.budget_ms:.0f} ms) : {len(scored)}/{len(docs)} candidats évalués.")
+            # Rang lexical (à score égal, l'ordre de la première recherche est conservé)
+            lexical_order = sorted(scored, key=lambda item: (-item[0], item[1]))
+            combined = {
+                original: (1 - self.original_weight) / (RANK_SMOOTHING + rank)
+                + self.original_weight / (RANK_SMOOTHING + original + 1)
+                for rank, (_, original, _) in enumerate(lexical_order, start=1)
+            }
+            ranked = [doc for _, original, doc in sorted(scored, key=lambda item: (-combined[item[1]], item[1]))]
+        return (ranked + docs[len(scored):])[:top_n]
@@ -0,0 +1,138 @@
+"""
+Registre des ressources lourdes partagées par le processus.
+
+Les embeddings Ollama, la base Chroma, le retriever, le LLM et le prompt de l'agent
+ne sont plus créés à l'import des modules mais au premier usage, une seule fois
+par processus, puis partagés. Le temps de création de chaque ressource est mesuré
+et disponible via `registry.timing_report()`.
+
+Exemple :
+    @lazy_resource("embedding")
+    def get_embedding():
+        return OllamaEmbeddings(model="nomic-embed-text")
+
+    get_embedding()  # créé au premier appel, réutilisé ensuite
+"""
+
+import functools
+import threading
+import time
+from typing import Any, Callable
+
+
+class ResourceRegistry:
+    """
+    Registre thread-safe de ressources créées paresseusement.
+
+    Attributs :
+        timings (dict[str, float]) : Durée de création propre à chaque ressource
+            (secondes, hors création des ressources dont elle dépend).
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+        # Pile (par thread) du temps passé à créer des dépendances imbriquées
+        self._nested = threading.local()
+        self.timings = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """
+        Déclare une ressource et la fonction qui la crée.
+
+        Args:
+            name (str): Nom unique de la ressource.
+            factory (callable): Fonction sans argument créant la ressource.
+        """
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """
+        Retourne la ressource, en la créant au premier appel.
+
+        Args:
+            name (str): Nom de la ressource.
+
+        Returns:
+            Any: Instance partagée de la ressource.
+
+        Raises:
+            KeyError : Si la ressource n'a pas été déclarée.
+        """
+        if name in self._instances:
+            return self._instances[name]
+        with self._locks[name]:
+            # Un autre thread a pu la créer pendant l'attente du verrou
+            if name not in self._instances:
+                stack = self._nested.__dict__.setdefault("stack", [])
+                stack.append(0.0)
+                start = time.perf_counter()
+                try:
+                    self._instances[name] = self._factories[name]()
+                finally:
+                    elapsed = time.perf_counter() - start
+                    dependencies = stack.pop()
+                    if stack:
+                        stack[-1] += elapsed
+                self.timings[name] = elapsed - dependencies
+                print(f"⏱️ Ressource '{name}' initialisée en {elapsed:.2f}s")
+        return self._instances[name]
+
+    def is_loaded(self, name: str) -> bool:
+        """Indique si la ressource a déjà été créée."""
+        return name in self._instances
+
+    def reset(self, name: str | None = None):
+        """
+        Oublie une ressource (ou toutes) : elle sera recréée au prochain usage.
+
+        Args:
+            name (str | None): Ressource à oublier, ou None pour tout oublier.
+        """
+        with self._registry_lock:
+            names = [name] if name else list(self._instances)
+            for key in names:
+                self._instances.pop(key, None)
+                self.timings.pop(key, None)
+
+    def timing_report(self) -> str:
+        """
+        Résume le temps de création des ressources chargées.
+
+        Returns:
+            str: Une ligne par ressource, puis le total.
+        """
+        lines = [f"⏱️ {name}: {duration:.2f}s" for name, duration in self.timings.items()]
+        lines.append(f"⏱️ Total ressources: {sum(self.timings.values()):.2f}s")
+        return "\n".join(lines)
+
+
+# Registre partagé par tout le processus
+registry = ResourceRegistry()
+
+
+def lazy_resource(name: str) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
+    """
+    Décorateur : enregistre une fabrique et la remplace par un accesseur paresseux.
+
+    Args:
+        name (str): Nom de la ressource dans le registre.
+
+    Returns:
+        callable: Décorateur produisant une fonction sans argument qui retourne
+        l'instance partagée.
+    """
+    def decorator(factory: Callable[[], Any]) -> Callable[[], Any]:
+        registry.register(name, factory)
+
+        @functools.wraps(factory)
+        def getter() -> Any:
+            return registry.get(name)
+
+        return getter
+
+    return decorator
@@ -1,73 +1,483 @@
+import asyncio
 import hashlib
+import threading
 import time
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
 
 from duckduckgo_search import DDGS
 from langchain.memory import ConversationBufferMemory
+from langchain_core.documents import Document
 from langchain_ollama import OllamaEmbeddings
-from langchain_chroma import Chroma
+
+from utils.chroma.embedding_cache import CachedEmbeddings
+from utils.chroma.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from utils.context_packer import CONTEXT_TOKEN_BUDGET, pack_documents
+from utils.reranker import RERANK_BUDGET_MS, RERANK_TOP_N, TermOverlapReranker
+from utils.conversation_memory import count_tokens
+from utils.query_cache import QueryCache, normalize_query, read_index_version
+from utils.resources import lazy_resource, registry
+from utils.tracing import tracer
+from utils.web_cache import WebSearchCache
 
 """
 Ce module fournit deux fonctions principales :
 1. `documentSearch(query)` pour effectuer une recherche vectorielle dans une base Chroma locale.
 2. `duck_search(query)` pour lancer une recherche web à l’aide de DuckDuckGo.
 
-Il utilise des embeddings générés par Ollama (`nomic-embed-text`) et supporte un cache pour les recherches web.
+La recherche documentaire est hybride : les résultats vectoriels (MMR) sont fusionnés
+avec ceux de l'index lexical BM25 (`utils/chroma/lexical_index.py`) par
+reciprocal rank fusion, pour retrouver aussi les termes exacts (codes, années, unités).
+Avec `RETRIEVER_BACKEND = "ann"`, les vecteurs sont lus dans un index IVF exporté depuis
+Chroma et projeté en mémoire (`utils/chroma/ann_index.py`) au lieu du client Chroma.
+
+Chacune a une version asynchrone (`adocumentSearch`, `aduck_search`) utilisable par
+`AgentExecutor.ainvoke`, et la recherche web peut être lancée en avance
+(`get_web_prefetcher().prefetch(query)`) avant que l'agent ne la demande.
+
+Il utilise des embeddings générés par Ollama (`nomic-embed-text`) et supporte un cache pour les recherches web
+(`utils/web_cache.py`, persistant sur disque).
+
+Les embeddings, la base Chroma, le retriever et le cache de requêtes sont créés au
+premier appel (voir `utils/resources.py`) : importer ce module ne coûte rien.
 """
 
 # Paramètres globaux
 CHROMA_DIR = "chroma_db"
+RETRIEVER_BACKEND = "chroma"          # "chroma" ou "ann" (index exporté par `python -m utils.chroma.ann_index`)
 EMBEDDING_MODEL = "nomic-embed-text"
+QUERY_CACHE_SIZE = 256                # nombre de requêtes conservées
+QUERY_CACHE_TTL = 3600.0              # durée de vie d'un résultat (secondes)
+QUERY_CACHE_SEMANTIC_DISTANCE = None  # distance cosinus max entre requêtes proches (None = désactivé, à calibrer)
+SCORED_SEARCH_K = 8                   # extraits fournis au mode RAG direct
+LEXICAL_K = 50                        # candidats BM25 fusionnés avec les résultats vectoriels
+RRF_K = 60                            # constante de la reciprocal rank fusion (lisse l'écart entre rangs)
+LEXICAL_SCORE_RATIO = 0.5             # part minimale du meilleur score BM25 pour garder un chunk
+RETRIEVER_MIN_SCORE = None            # score de pertinence minimal d'un document (None = désactivé, à calibrer)
+ADAPTIVE_SCORE_MARGIN = None          # écart max au meilleur score pour garder un document (None = désactivé, à calibrer)
+RERANK_ENABLED = True                 # second tri lexical des résultats MMR, réduits à `RERANK_TOP_N` (voir `utils/reranker.py`)
+WEB_PREFETCH_WORKERS = 2              # recherches web anticipées simultanées
+WEB_PREFETCH_TTL = 120.0              # durée de validité d'un résultat anticipé (secondes)
+WEB_REGION = "fr-fr"                  # région DuckDuckGo
+WEB_NO_RESULT = "Aucun résultat web trouvé après plusieurs tentatives."
+
+
+@lazy_resource("embedding")
+def get_embedding() -> CachedEmbeddings:
+    """Embeddings Ollama partagés (requêtes déjà vues servies par le cache disque)."""
+    return CachedEmbeddings(OllamaEmbeddings(model=EMBEDDING_MODEL), EMBEDDING_MODEL)
+
+
+@lazy_resource("chroma")
+def get_vectordb():
+    """Base Chroma partagée, ouverte au premier usage."""
+    # Import différé : chromadb est long à importer
+    from langchain_chroma import Chroma
+
+    return Chroma(
+        persist_directory=CHROMA_DIR,
+        embedding_function=get_embedding()
+    )
 
-# Création des embeddings avec Ollama
-embedding = OllamaEmbeddings(model=EMBEDDING_MODEL)
 
-def create_advanced_retriever(k=20, threshold=0.8):
+@lazy_resource("ann_index")
+def get_ann_index():
     """
-    Crée un retriever MMR avec suppression de doublons et filtrage par score.
+    Index ANN (`AnnIndex`) projeté en mémoire, ou None s'il est absent ou plus ancien que la base Chroma.
+
+    Ne pas appeler directement : `current_ann_index` rouvre l'index quand la base ou l'export change.
+    """
+    # Import différé : numpy ne sert qu'à la recherche
+    from utils.chroma.ann_index import ANN_INDEX_DIR, AnnIndex
+
+    path = Path(CHROMA_DIR) / ANN_INDEX_DIR
+    try:
+        index = AnnIndex(path, embeddings=get_embedding())
+    except FileNotFoundError:
+        print(f"⚠️ Index ANN absent ({path}) : recherche dans Chroma. Lancer `python -m utils.chroma.ann_index`.")
+        return None
+    if index.index_version != read_index_version(CHROMA_DIR):
+        print("⚠️ Index ANN plus ancien que la base Chroma : recherche dans Chroma. Relancer l'export.")
+        return None
+    return index
+
+
+# (version de la base, date du manifeste de l'export) lors du dernier chargement de `get_ann_index`
+_ann_index_state = None
+_ann_index_lock = threading.Lock()
+
+
+def _read_ann_index_state() -> tuple:
+    """Version de la base Chroma et date de modification (ns) du manifeste de l'index ANN (None s'il est absent)."""
+    from utils.chroma.ann_index import ANN_INDEX_DIR, MANIFEST_FILE
+
+    try:
+        exported = (Path(CHROMA_DIR) / ANN_INDEX_DIR / MANIFEST_FILE).stat().st_mtime_ns
+    except OSError:
+        exported = None
+    return read_index_version(CHROMA_DIR), exported
+
+
+def current_ann_index():
+    """
+    Index ANN à jour, vérifié à chaque recherche.
+
+    `get_ann_index` est rechargé dès qu'une indexation modifie la base (`.index_version`)
+    ou qu'un nouvel export remplace l'index : un index absent ou périmé au démarrage est
+    pris en compte sans redémarrer, et un index remplacé n'est plus servi. Les recherches
+    en cours gardent l'ancien index jusqu'à leur fin.
+
+    Returns:
+        AnnIndex | None: Index à jour, ou None s'il est absent ou plus ancien que la base.
+    """
+    global _ann_index_state
+    state = _read_ann_index_state()
+    with _ann_index_lock:
+        if state != _ann_index_state:
+            registry.reset("ann_index")
+            _ann_index_state = state
+    return get_ann_index()
+
+
+def get_vector_store(backend: str = RETRIEVER_BACKEND):
+    """
+    Base servant la recherche documentaire.
 
     Args:
-        k (int): Nombre de documents retournés.
-        threshold (float): Seuil minimal de similarité (entre 0 et 1).
+        backend (str): `"ann"` pour l'index exporté (`utils/chroma/ann_index.py`),
+            `"chroma"` pour la base Chroma.
 
     Returns:
-        callable: fonction de recherche vectorielle avancée prenant une requête string.
+        AnnIndex | Chroma: L'index ANN s'il est demandé et à jour, sinon la base Chroma.
     """
-    vectordb = Chroma(
-        persist_directory=CHROMA_DIR,
-        embedding_function=embedding
-    )
+    if backend == "ann":
+        index = current_ann_index()
+        if index is not None:
+            return index
+    return get_vectordb()
+
+
+@lazy_resource("lexical_index")
+def get_lexical_index() -> LexicalIndex:
+    """Index lexical BM25 partagé, construit par `index_documents` à côté de la base Chroma."""
+    return LexicalIndex(Path(CHROMA_DIR) / LEXICAL_INDEX_FILE)
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], rrf_k: int = RRF_K) -> list[str]:
+    """
+    Fusionne plusieurs classements par reciprocal rank fusion.
+
+    Chaque élément reçoit la somme de `1 / (rrf_k + rang)` sur les classements où il
+    apparaît : seuls les rangs comptent, les scores (distance, BM25) n'ayant pas la
+    même échelle.
+
+    Args:
+        rankings (list[list[str]]): Classements d'identifiants, du meilleur au moins bon.
+        rrf_k (int): Constante de lissage (60 dans la publication d'origine).
+
+    Returns:
+        list[str]: Identifiants classés par score fusionné décroissant.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
 
-    retriever = vectordb.as_retriever(
-        search_type="mmr",  # max marginal relevance = diversité + pertinence
-        search_kwargs={
-            "k": k,
-            "fetch_k": 50,
-            "lambda_mult": 0.5
-        }
+
+def _collection_and_relevance(vectordb) -> tuple:
+    """Collection interrogée (format `chromadb.Collection.query`), distance (`l2`, `cosine`, `ip`) et conversion distance → pertinence."""
+    from utils.chroma.ann_index import AnnIndex
+
+    # L'index ANN répond directement dans le format de la collection Chroma
+    if isinstance(vectordb, AnnIndex):
+        return vectordb, vectordb.space, vectordb.relevance_score_fn()
+    space = (vectordb._collection.configuration.get("hnsw") or {}).get("space") or "l2"
+    return vectordb._collection, space, vectordb._select_relevance_score_fn()
+
+
+def mmr_search_with_scores(
+    vectordb, query: str, k: int | None, fetch_k: int, lambda_mult: float, embedding: list[float] | None = None
+) -> list[tuple]:
+    """
+    Recherche MMR qui conserve le score de pertinence de chaque document.
+
+    Même calcul que `Chroma.max_marginal_relevance_search` (une seule requête à la
+    collection, `fetch_k` candidats, sélection MMR de `k` documents), mais les
+    distances déjà renvoyées par Chroma sont converties en scores de pertinence
+    (0 à 1, même échelle que `similarity_search_with_relevance_scores`) au lieu
+    d'être ignorées.
+
+    Args:
+        vectordb: Instance LangChain `Chroma`, ou `AnnIndex`.
+        query (str): Requête en langage naturel.
+        k (int | None): Nombre de documents sélectionnés par MMR (None : tous les candidats, sans MMR).
+        fetch_k (int): Nombre de candidats les plus proches.
+        lambda_mult (float): Compromis MMR entre pertinence (1) et diversité (0).
+        embedding (list[float] | None): Vecteur de la requête s'il est déjà calculé.
+
+    Returns:
+        list[tuple[Document, float]]: Documents sélectionnés et leur score, du plus
+        proche au moins proche de la requête (score aussi copié dans `metadata["score"]`).
+    """
+    # Imports différés : numpy et langchain_chroma ne servent qu'à la recherche
+    import numpy as np
+    from langchain_chroma.vectorstores import maximal_marginal_relevance
+
+    collection, _, relevance = _collection_and_relevance(vectordb)
+    if embedding is None:
+        embedding = vectordb.embeddings.embed_query(query)
+    results = collection.query(
+        query_embeddings=[embedding],
+        n_results=fetch_k,
+        include=["metadatas", "documents", "distances", "embeddings"],
     )
+    if not results["ids"][0]:
+        return []
+    if k is None:
+        selected = set(range(len(results["ids"][0])))
+    else:
+        selected = set(maximal_marginal_relevance(
+            np.array(embedding, dtype=np.float32), results["embeddings"][0], k=k, lambda_mult=lambda_mult
+        ))
+    scored = []
+    for i, (text, metadata, distance) in enumerate(
+        zip(results["documents"][0], results["metadatas"][0], results["distances"][0])
+    ):
+        if i in selected:
+            score = relevance(distance)
+            scored.append((Document(page_content=text, metadata={**(metadata or {}), "score": score}), score))
+    return scored
+
+
+def score_by_ids(vectordb, embedding: list[float], ids: list[str]) -> dict[str, tuple]:
+    """
+    Lit des chunks à partir de leur ID avec leur score de pertinence pour une requête.
+
+    Sert aux chunks trouvés uniquement par BM25 : leurs vecteurs sont lus avec le texte
+    (une seule lecture par ID, exacte, contrairement à une requête HNSW filtrée) et la
+    distance est calculée comme Chroma, pour un score sur la même échelle que
+    `mmr_search_with_scores`.
+
+    Args:
+        vectordb: Instance LangChain `Chroma`, ou `AnnIndex`.
+        embedding (list[float]): Vecteur de la requête.
+        ids (list[str]): IDs des chunks ; ceux absents de la base sont ignorés.
+
+    Returns:
+        dict[str, tuple[Document, float]]: Document et score par ID trouvé.
+    """
+    import numpy as np
+
+    from utils.chroma.ann_index import compute_distances
+
+    if not ids:
+        return {}
+    _, space, relevance = _collection_and_relevance(vectordb)
+    found = vectordb.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+    if not found["ids"]:
+        return {}
+    vectors = np.asarray(found["embeddings"], dtype=np.float32)
+    query = np.asarray(embedding, dtype=np.float32)
+    if space == "cosine":
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        query = query / (np.linalg.norm(query) or 1.0)
+    scored = {}
+    for chunk_id, text, metadata, distance in zip(
+        found["ids"], found["documents"], found["metadatas"], compute_distances(vectors, query, space)
+    ):
+        score = relevance(float(distance))
+        scored[chunk_id] = (Document(page_content=text, metadata={**(metadata or {}), "score": score}), score)
+    return scored
+
+
+def adaptive_cutoff(scored: list[tuple], margin: float | None) -> list[tuple]:
+    """
+    Ne garde que les résultats proches du meilleur score.
+
+    Quand un seul extrait est vraiment pertinent, les suivants (nettement moins
+    bien notés) sont écartés au lieu de remplir l'observation de l'agent.
+
+    Args:
+        scored (list[tuple]): Paires (résultat, score), dans n'importe quel ordre.
+        margin (float | None): Écart maximal au meilleur score (None = aucune coupure).
+
+    Returns:
+        list[tuple]: Paires conservées, dans l'ordre d'origine.
+    """
+    if margin is None or not scored:
+        return scored
+    best = max(score for _, score in scored)
+    return [(item, score) for item, score in scored if score >= best - margin]
+
+
+def create_advanced_retriever(
+    k=20,
+    threshold=RETRIEVER_MIN_SCORE,
+    fetch_k=50,
+    lambda_mult=0.5,
+    hybrid=True,
+    lexical_k=LEXICAL_K,
+    score_margin=ADAPTIVE_SCORE_MARGIN,
+    rerank=RERANK_ENABLED,
+    rerank_top_n=RERANK_TOP_N,
+    rerank_budget_ms=RERANK_BUDGET_MS,
+    backend=RETRIEVER_BACKEND,
+):
+    """
+    Crée un retriever MMR avec suppression de doublons et filtrage par score.
+
+    Les scores de pertinence sont calculés dans la même requête que la sélection
+    MMR (`mmr_search_with_scores`). En mode hybride, les documents MMR sont fusionnés
+    (reciprocal rank fusion) avec les meilleurs chunks BM25 (au plus `lexical_k`, à
+    au moins `LEXICAL_SCORE_RATIO` du meilleur score BM25) ; les chunks trouvés
+    uniquement par BM25 sont lus dans la base (Chroma ou index ANN) avec leur score
+    de pertinence (`score_by_ids`).
+
+    Le filtrage par score s'applique ensuite à la liste fusionnée, quelle que soit
+    l'origine du document : ceux sous `threshold` sont écartés, puis ceux trop loin
+    du meilleur score (`score_margin`). Le nombre de documents retournés s'adapte
+    ainsi à la requête, jusqu'à `k`.
+
+    Avec `rerank`, les documents retenus (sélection MMR fusionnée avec BM25, puis
+    filtrée) sont les candidats de `TermOverlapReranker` (CPU, budget de temps borné),
+    qui combine leur rang lexical avec leur rang d'origine et n'en garde que les
+    `rerank_top_n` meilleurs : le contexte est plus court, et la diversité de la
+    sélection MMR parmi les `fetch_k` candidats est conservée.
+
+    Args:
+        k (int): Nombre maximal de documents retournés.
+        threshold (float | None): Score de pertinence minimal (None = aucun filtre ; la
+            pertinence L2 de Chroma peut être négative pour les chunks éloignés).
+        fetch_k (int): Nombre de candidats parmi lesquels MMR choisit les `k` documents.
+        lambda_mult (float): Compromis MMR entre pertinence (1) et diversité (0).
+        hybrid (bool): Fusionne les résultats vectoriels avec l'index lexical BM25.
+        lexical_k (int): Nombre maximal de candidats BM25 fusionnés.
+        score_margin (float | None): Écart maximal au meilleur score (None = pas de coupure adaptative).
+        rerank (bool): Reclasse les documents retenus (second tri lexical) et garde les `rerank_top_n` meilleurs.
+        rerank_top_n (int | None): Nombre de documents conservés après reranking (None = tous, jusqu'à `k`).
+        rerank_budget_ms (float): Temps maximal du reranking ; au-delà, les candidats
+            restants gardent l'ordre de la première recherche.
+        backend (str): `"chroma"`, ou `"ann"` pour l'index exporté (voir `get_vector_store`).
+
+    Returns:
+        callable: fonction de recherche vectorielle avancée prenant une requête string.
+    """
+    lexical = get_lexical_index() if hybrid else None
+    reranker = TermOverlapReranker(lexical, budget_ms=rerank_budget_ms) if rerank else None
 
-    def deduplicate(docs):
+    def deduplicate(scored):
         """Élimine les doublons exacts en hachant le contenu."""
         seen = set()
         uniques = []
-        for doc in docs:
+        for doc, score in scored:
             h = hashlib.md5(doc.page_content.encode()).hexdigest()
             if h not in seen:
-                uniques.append(doc)
+                uniques.append((doc, score))
                 seen.add(h)
         return uniques
 
+    def fuse(vectordb, query, embedding, scored, limit):
+        """Fusionne les documents vectoriels avec les chunks BM25 et garde les `limit` premiers, avec leur score."""
+        with tracer.span("lexical.search", k=lexical_k) as span:
+            hits = lexical.search(query, k=lexical_k)
+            hits = [chunk_id for chunk_id, score in hits if score >= hits[0][1] * LEXICAL_SCORE_RATIO]
+            span.set(results=len(hits))
+        if not hits:
+            return scored[:limit]
+        # L'ID d'un chunk est le hash MD5 de son contenu (voir `generate_chunk_id`)
+        by_id = {hashlib.md5(doc.page_content.encode()).hexdigest(): (doc, score) for doc, score in scored}
+        ranked = reciprocal_rank_fusion([list(by_id), hits])[:limit]
+        by_id.update(score_by_ids(vectordb, embedding, [chunk_id for chunk_id in ranked if chunk_id not in by_id]))
+        # Un ID absent de la base (batch d'embedding en échec) est ignoré
+        return [by_id[chunk_id] for chunk_id in ranked if chunk_id in by_id]
+
     def search(query):
         """Recherche dans la base vectorielle avec filtres."""
-        docs = retriever.get_relevant_documents(query)
-        filtered_docs = [d for d in docs if d.metadata.get("score", 1.0) >= threshold]
-        return deduplicate(filtered_docs)
+        # Base résolue à chaque recherche : l'index ANN est rouvert après une réindexation ou un export
+        vectordb = get_vector_store(backend)
+        embedding = vectordb.embeddings.embed_query(query)
+        scored = deduplicate(mmr_search_with_scores(vectordb, query, k, fetch_k, lambda_mult, embedding))
+        if lexical is not None:
+            scored = fuse(vectordb, query, embedding, scored, k)
+        # Seuil et coupure après la fusion : les chunks BM25 sont filtrés comme les autres
+        if threshold is not None:
+            scored = [(d, score) for d, score in scored if score >= threshold]
+        scored = adaptive_cutoff(scored, score_margin)
+        docs = [d for d, _ in scored]
+        return reranker.rerank(query, docs, rerank_top_n) if reranker is not None else docs
 
     return search
 
-# Initialise le retriever avancé
-advanced_search = create_advanced_retriever(k=24, threshold=0.78)
+@lazy_resource("retriever")
+def get_advanced_search():
+    """Retriever avancé partagé."""
+    return create_advanced_retriever(k=24)
+
+
+@lazy_resource("query_cache")
+def get_query_cache() -> QueryCache:
+    """Cache des résultats, vidé automatiquement quand l'indexation modifie la collection."""
+    return QueryCache(
+        max_entries=QUERY_CACHE_SIZE,
+        ttl=QUERY_CACHE_TTL,
+        semantic_distance=QUERY_CACHE_SEMANTIC_DISTANCE,
+        embed_query=get_embedding().embed_query,
+        index_version=lambda: read_index_version(CHROMA_DIR),
+    )
+
+
+@lazy_resource("scored_query_cache")
+def get_scored_query_cache() -> QueryCache:
+    """Cache des recherches avec score (mode RAG direct), invalidé comme `get_query_cache`."""
+    return QueryCache(
+        max_entries=QUERY_CACHE_SIZE,
+        ttl=QUERY_CACHE_TTL,
+        semantic_distance=QUERY_CACHE_SEMANTIC_DISTANCE,
+        embed_query=get_embedding().embed_query,
+        index_version=lambda: read_index_version(CHROMA_DIR),
+    )
+
+
+def search_documents_scored(query: str, k: int = SCORED_SEARCH_K) -> list[tuple]:
+    """
+    Recherche les extraits les plus proches avec leur score de pertinence.
+
+    Utilisée par le mode RAG direct de `RagAgent` : le meilleur score sert
+    d'indice de confiance pour décider de se passer de l'agent ReAct.
+
+    Args:
+        query (str): Question utilisateur.
+        k (int): Nombre d'extraits retournés.
+
+    Returns:
+        list[tuple[Document, float]]: Extraits et score de pertinence (0 à 1),
+        du plus pertinent au moins pertinent.
+    """
+    def search(q):
+        return get_vector_store().similarity_search_with_relevance_scores(q, k=k)
+
+    with tracer.span("chroma.search", kind="scored", k=k) as span:
+        results = get_scored_query_cache().get_or_search(query, search, scope=f"k={k}")
+        span.set(results=len(results))
+    return results
+
+
+def format_documents(docs: list, max_tokens: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Met en forme des documents pour le LLM, dans un budget de tokens (voir `utils/context_packer.py`).
+
+    Args:
+        docs (list[Document]): Documents à présenter, du plus pertinent au moins pertinent.
+        max_tokens (int): Taille maximale du texte produit (tokens estimés).
+
+    Returns:
+        str: Une section par fichier source, ou message indiquant l'absence de document.
+    """
+    return pack_documents(docs, max_tokens)
+
 
 def documentSearch(query: str, k: int = 24) -> str:
     """
@@ -80,23 +490,141 @@ def documentSearch(query: str, k: int = 24) -> str:
     Returns:
         str: Résumé formaté des résultats trouvés.
     """
-    docs = advanced_search(query)
+    with tracer.span("chroma.search", kind="mmr", k=k) as span:
+        docs = get_query_cache().get_or_search(query, get_advanced_search())
+        context = format_documents(docs)
+        span.set(results=len(docs), context_tokens=count_tokens(context))
+    return context
+
+
+async def adocumentSearch(query: str, k: int = 24) -> str:
+    """
+    Version asynchrone de `documentSearch` (exécutée dans un thread : Chroma est synchrone).
+
+    Args:
+        query (str): Question utilisateur.
+        k (int): Nombre de documents max à retourner.
+
+    Returns:
+        str: Résumé formaté des résultats trouvés.
+    """
+    return await asyncio.to_thread(documentSearch, query, k)
 
-    if not docs:
-        return "Aucun document trouvé."
 
+@lazy_resource("web_cache")
+def get_web_cache() -> WebSearchCache:
+    """Cache disque des recherches web partagé."""
+    return WebSearchCache()
+
+
+def _format_web_results(query: str, max_results: int) -> str | None:
+    """Interroge DuckDuckGo une fois et met en forme les résultats (None si aucun)."""
     results = []
-    for i, doc in enumerate(docs, 1):
-        results.append(
-            f"🔹 Résultat {i}:\n{doc.page_content[:500]}...\n(Source: {doc.metadata.get('source_file', 'inconnu')})\n"
-        )
-    return "\n".join(results)
+    with DDGS() as ddgs:
+        for r in ddgs.text(query, region=WEB_REGION, safesearch="Moderate", max_results=max_results):
+            title = r.get("title", "Sans titre")
+            body = r.get("body", "")
+            href = r.get("href", "")
+            results.append(f"🔗 {title}\n{body}\n➡️ {href}\n")
+    return "\n".join(results) if results else None
+
+
+def _fetch_web_results(query: str, max_results: int = 5, retries: int = 3, delay: float = 1.5) -> str | None:
+    """Interroge DuckDuckGo avec relances (None si toutes les tentatives échouent)."""
+    for attempt in range(1, retries + 1):
+        try:
+            results = _format_web_results(query, max_results)
+            if results:
+                return results
+
+        except Exception as e:
+            print(f"[Tentative {attempt}] Erreur DuckDuckGo : {e}")
+
+        if attempt < retries:
+            time.sleep(delay)  # Petite pause avant nouvelle tentative
+
+    return None
+
+
+def _duck_search(query: str, max_results: int = 5, retries: int = 3, delay: float = 1.5) -> str:
+    """Recherche web via le cache disque, sans passer par les résultats anticipés."""
+    results = get_web_cache().get_or_fetch(
+        query, WEB_REGION, max_results, lambda: _fetch_web_results(query, max_results, retries, delay)
+    )
+    return results or WEB_NO_RESULT
+
+
+class WebPrefetcher:
+    """
+    Recherches web lancées en avance, dans un pool de threads.
+
+    Quand la recherche documentaire de l'agent ne trouve rien, la recherche web de la
+    même requête démarre pendant que le LLM rédige l'étape suivante : quand l'agent
+    passe au web, le résultat est déjà disponible (ou en cours). Un résultat anticipé
+    ne sert qu'un appel aux mêmes paramètres (nombre de résultats, relances, pause).
+
+    Attributs :
+        ttl (float) : Durée de validité d'un résultat anticipé (secondes).
+    """
+
+    def __init__(self, max_workers: int = WEB_PREFETCH_WORKERS, ttl: float = WEB_PREFETCH_TTL):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="web-prefetch")
+        # (requête normalisée, max_results, retries, delay) -> (instant de lancement, Future)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, query: str, max_results: int = 5, retries: int = 3, delay: float = 1.5):
+        """
+        Lance la recherche web de la requête si elle n'est pas déjà en cours.
+
+        Args:
+            query (str): Requête à anticiper.
+            max_results (int): Nombre max de résultats.
+            retries (int): Nombre de tentatives.
+            delay (float): Pause (en secondes) entre chaque tentative.
+        """
+        key = (normalize_query(query), max_results, retries, delay)
+        now = time.time()
+        with self._lock:
+            for expired in [k for k, (t, _) in self._pending.items() if now - t > self.ttl]:
+                del self._pending[expired]
+            if key not in self._pending:
+                self._pending[key] = (now, self._pool.submit(_duck_search, query, max_results, retries, delay))
+
+    def pop(self, query: str, max_results: int = 5, retries: int = 3, delay: float = 1.5) -> Future | None:
+        """
+        Retire et retourne la recherche anticipée avec la même requête et les mêmes paramètres.
+
+        Args:
+            query (str): Requête de l'agent.
+            max_results (int): Nombre max de résultats.
+            retries (int): Nombre de tentatives.
+            delay (float): Pause (en secondes) entre chaque tentative.
+
+        Returns:
+            Future | None: Recherche en cours ou terminée, ou None si rien n'a été anticipé.
+        """
+        with self._lock:
+            entry = self._pending.pop((normalize_query(query), max_results, retries, delay), None)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+
+@lazy_resource("web_prefetcher")
+def get_web_prefetcher() -> WebPrefetcher:
+    """Pool de recherches web anticipées partagé."""
+    return WebPrefetcher()
 
 
 def duck_search(query: str, max_results: int = 5, retries: int = 3, delay: float = 1.5) -> str:
     """
     Lance une recherche web robuste via DuckDuckGo avec relances.
 
+    Les résultats sont mis en cache sur disque (`get_web_cache()`) ; si la même
+    recherche a été anticipée (`WebPrefetcher`), son résultat est réutilisé.
+
     Args:
         query (str): Sujet à rechercher.
         max_results (int): Nombre max de résultats à retourner.
@@ -106,22 +634,55 @@ def duck_search(query: str, max_results: int = 5, retries: int = 3, delay: float
     Returns:
         str: Résultats formatés ou message d’échec.
     """
-    for attempt in range(1, retries + 1):
-        try:
-            results = []
-            with DDGS() as ddgs:
-                for r in ddgs.text(query, region="fr-fr", safesearch="Moderate", max_results=max_results):
-                    title = r.get("title", "Sans titre")
-                    body = r.get("body", "")
-                    href = r.get("href", "")
-                    results.append(f"🔗 {title}\n{body}\n➡️ {href}\n")
+    with tracer.span("web.search") as span:
+        future = get_web_prefetcher().pop(query, max_results, retries, delay)
+        span.set(prefetched=future is not None)
+        if future is not None:
+            return future.result()
+        return _duck_search(query, max_results, retries, delay)
 
-            if results:
-                return "\n".join(results)
 
-        except Exception as e:
-            print(f"[Tentative {attempt}] Erreur DuckDuckGo : {e}")
+async def aduck_search(query: str, max_results: int = 5, retries: int = 3, delay: float = 1.5) -> str:
+    """
+    Version asynchrone de `duck_search` : les pauses entre tentatives ne bloquent
+    pas la boucle d'événements et les autres outils continuent de s'exécuter.
+
+    Args:
+        query (str): Sujet à rechercher.
+        max_results (int): Nombre max de résultats à retourner.
+        retries (int): Nombre de tentatives.
+        delay (float): Pause (en secondes) entre chaque tentative.
+
+    Returns:
+        str: Résultats formatés ou message d’échec.
+    """
+    with tracer.span("web.search") as span:
+        future = get_web_prefetcher().pop(query, max_results, retries, delay)
+        span.set(prefetched=future is not None)
+        if future is not None:
+            return await asyncio.wrap_future(future)
+
+        cache = get_web_cache()
+        cached = cache.get(query, WEB_REGION, max_results)
+        if cached is not None:
+            results, fresh = cached
+            if not fresh:
+                cache.refresh_in_background(
+                    query, WEB_REGION, max_results, lambda: _fetch_web_results(query, max_results, retries, delay)
+                )
+            return results
+
+        for attempt in range(1, retries + 1):
+            try:
+                results = await asyncio.to_thread(_format_web_results, query, max_results)
+                if results:
+                    cache.put(query, WEB_REGION, max_results, results)
+                    return results
+
+            except Exception as e:
+                print(f"[Tentative {attempt}] Erreur DuckDuckGo : {e}")
 
-        time.sleep(delay)  # Petite pause avant nouvelle tentative
+            if attempt < retries:
+                await asyncio.sleep(delay)
 
-    return "Aucun résultat web trouvé après plusieurs tentatives."
+        return WEB_NO_RESULT
@@ -0,0 +1,121 @@
+"""
+Base commune des caches disque SQLite bornés en taille (éviction LRU).
+
+Une table par cache, dont chaque ligne porte sa taille (`size`) et sa date de
+dernier usage (`last_used`). Au-delà de `max_bytes`, les lignes les moins
+récemment utilisées sont supprimées jusqu'à 90 % de la limite. Plusieurs
+processus peuvent partager le fichier : la taille suivie en mémoire n'est
+qu'une estimation, relue dans la base avant toute éviction. Les dates de
+dernier usage sont notées en mémoire et écrites par lots : une lecture
+n'écrit pas dans la base.
+
+Utilisée par `utils/web_cache.py` et `utils/chroma/embedding_cache.py`.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+TOUCH_BATCH = 1000          # dates de dernier usage accumulées avant écriture
+TOUCH_FLUSH_SECONDS = 30.0  # délai max avant d'écrire les dates accumulées
+EVICTION_TARGET = 0.9       # part de `max_bytes` visée après une éviction
+
+
+class SqliteLruCache:
+    """
+    Table SQLite bornée en taille, partagée entre threads (et entre processus).
+
+    Les sous-classes définissent `TABLE`, `KEY_COLUMNS` (clé primaire),
+    `COLUMNS` (autres colonnes, hors `size` et `last_used`) et `LABEL` /
+    `ITEMS` (message d'éviction), et appellent `_touch` / `_stored` après
+    leurs lectures et écritures, sous `_lock`.
+
+    Attributs :
+        path (Path) : Fichier SQLite du cache.
+        max_bytes (int) : Taille maximale des données stockées avant éviction.
+    """
+
+    TABLE = ""
+    KEY_COLUMNS = ()
+    COLUMNS = ()
+    LABEL = "Cache"
+    ITEMS = "entrées"
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Dates de dernier usage pas encore écrites : {clé: timestamp}
+        self._touched = {}
+        self._touched_since = time.time()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join([*self.COLUMNS, "size INTEGER NOT NULL", "last_used REAL NOT NULL"])
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.TABLE} ({columns}, PRIMARY KEY ({', '.join(self.KEY_COLUMNS)}))"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.TABLE}_last_used ON {self.TABLE} (last_used)")
+        self._conn.commit()
+        self._size = self._stored_size()
+
+    def _stored_size(self) -> int:
+        """Taille des données réellement stockées, écritures des autres processus comprises."""
+        return self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.TABLE}").fetchone()[0]
+
+    def _touch(self, keys: list[tuple], now: float):
+        """Note le dernier usage de lignes lues, écrit par lots (sous `_lock`)."""
+        self._touched.update((key, now) for key in keys)
+        if len(self._touched) >= TOUCH_BATCH or now - self._touched_since > TOUCH_FLUSH_SECONDS:
+            self._flush_touches()
+
+    def _flush_touches(self):
+        """Écrit les dates de dernier usage accumulées (sous `_lock`)."""
+        if self._touched:
+            where = " AND ".join(f"{column} = ?" for column in self.KEY_COLUMNS)
+            self._conn.executemany(
+                f"UPDATE {self.TABLE} SET last_used = ? WHERE {where}",
+                [(now, *key) for key, now in self._touched.items()],
+            )
+            self._conn.commit()
+            self._touched.clear()
+        self._touched_since = time.time()
+
+    def flush(self):
+        """Écrit les dates de dernier usage en attente."""
+        with self._lock:
+            self._flush_touches()
+
+    def _stored(self, added_bytes: int):
+        """Prend en compte des octets écrits puis applique l'éviction si nécessaire (sous `_lock`)."""
+        self._size += added_bytes
+        if self._size > self.max_bytes:
+            # Estimation locale dépassée : la taille réelle tient compte des autres processus
+            self._size = self._stored_size()
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Supprime les lignes les moins récemment utilisées jusqu'à `EVICTION_TARGET` de `max_bytes` (sous `_lock`)."""
+        self._flush_touches()
+        target = int(self.max_bytes * EVICTION_TARGET)
+        to_delete = []
+        size = self._size
+        for rowid, length in self._conn.execute(f"SELECT rowid, size FROM {self.TABLE} ORDER BY last_used").fetchall():
+            if size <= target:
+                break
+            to_delete.append((rowid,))
+            size -= length
+        self._conn.executemany(f"DELETE FROM {self.TABLE} WHERE rowid = ?", to_delete)
+        self._conn.commit()
+        self._size = size
+        print(f"🧹 {self.LABEL} : {len(to_delete)} {self.ITEMS} évincés.")
+
+    def _usage(self) -> tuple[int, int]:
+        """Nombre de lignes et taille stockée, dates de dernier usage écrites (sous `_lock`)."""
+        self._flush_touches()
+        entries, self._size = self._conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.TABLE}"
+        ).fetchone()
+        return entries, self._size
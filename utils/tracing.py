@@ -0,0 +1,495 @@
+"""
+Traces de latence de chaque tour de conversation.
+
+Un tour (`tracer.trace("chat.turn")`) est découpé en spans imbriqués : recherche
+directe, agent, itérations et appels LLM (avec nombre de tokens), appels d'outils,
+embedding de la requête, recherche Chroma, appel LLM de secours, résumé de
+l'historique. Chaque span terminé est écrit sur une ligne de `data/logs/traces.jsonl` ;
+si le paquet `opentelemetry-sdk` est installé et que `OTEL_EXPORTER_OTLP_ENDPOINT`
+est défini, les spans sont aussi envoyés à un collecteur OpenTelemetry. Les spans
+encore ouverts à la fin de leur tour (phase interrompue par une erreur) sont
+terminés avec lui, en erreur.
+
+Les traces ne contiennent que des durées et des tailles : le texte des requêtes
+d'outils n'est enregistré que si `TRACE_TOOL_INPUTS` est activé.
+
+Hors d'un tour (indexation, benchmarks), `tracer.span(...)` ne coûte rien et
+n'écrit rien.
+
+Exemple :
+    with tracer.trace("chat.turn", mode="direct"):
+        with tracer.span("chroma.search", k=8):
+            ...
+
+    summarize_traces()  # p50 / p95 par tour et par phase
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Iterator
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+TRACE_FILE = Path("data/logs/traces.jsonl")
+TRACE_MAX_MB = 20          # au-delà, le fichier est renommé en `traces.jsonl.1`
+TRACING_ENABLED = True     # ⬅️ Mets sur False pour ne plus tracer les tours
+TRACE_TOOL_INPUTS = False  # ⬅️ Mets sur True pour enregistrer le début des requêtes d'outils (texte des utilisateurs)
+TRACE_INPUT_CHARS = 200    # caractères de requête enregistrés quand `TRACE_TOOL_INPUTS` est activé
+TURN_SPAN = "chat.turn"
+
+# Span en cours dans le contexte courant (thread ou tâche asyncio)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    Phase mesurée d'un tour.
+
+    Attributs :
+        name (str) : Nom de la phase (ex : "chroma.search").
+        trace_id (str) : Identifiant du tour.
+        span_id (str) : Identifiant du span.
+        parent_id (str | None) : Span parent (None pour le tour lui-même).
+        attributes (dict) : Informations complémentaires (k, tokens, outil...).
+        start (float) : Début (timestamp).
+        duration_ms (float | None) : Durée, renseignée à la fin du span.
+        error (str | None) : Erreur levée pendant le span.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self._start_perf = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+        self._token = None
+        self._parent = None
+        self._detached = False
+
+    def set(self, **attributes):
+        """Ajoute des attributs au span."""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        """Représentation JSON du span."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Span factice renvoyé hors d'un tour : `set` ne fait rien."""
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JsonlSpanExporter:
+    """
+    Écrit chaque span terminé sur une ligne d'un fichier JSONL.
+
+    Attributs :
+        path (Path) : Fichier de traces.
+        max_bytes (int) : Taille au-delà de laquelle le fichier est renommé en `.1`.
+    """
+
+    def __init__(self, path: Path = TRACE_FILE, max_bytes: int = TRACE_MAX_MB * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"[⚠️ Trace non écrite] {e}")
+
+
+class OtelSpanExporter:
+    """Recopie les spans dans OpenTelemetry (export OTLP configuré par les variables `OTEL_*`)."""
+
+    def __init__(self):
+        # Imports différés : OpenTelemetry est une dépendance optionnelle
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider = TracerProvider(resource=Resource.create({"service.name": "bulby"}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self._trace = trace
+        self._tracer = provider.get_tracer("bulby")
+        # Spans OpenTelemetry en cours, démarrés et terminés depuis plusieurs threads
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def start(self, span: Span):
+        with self._lock:
+            parent = self._spans.get(span.parent_id)
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._tracer.start_span(span.name, context=context, start_time=int(span.start * 1e9))
+        with self._lock:
+            self._spans[span.span_id] = otel_span
+
+    def export(self, span: Span):
+        with self._lock:
+            otel_span = self._spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(key, value)
+        if span.error:
+            otel_span.set_attribute("error", span.error)
+        otel_span.end(end_time=int((span.start + span.duration_ms / 1000) * 1e9))
+
+
+class Tracer:
+    """
+    Crée les spans des tours de conversation et les transmet aux exportateurs.
+
+    Attributs :
+        enabled (bool) : Active ou non le traçage.
+        exporters (list) : Exportateurs (JSONL, puis OpenTelemetry si configuré).
+    """
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, path: Path = TRACE_FILE):
+        self.enabled = enabled
+        self.exporters = [JsonlSpanExporter(path)]
+        # Spans démarrés et pas encore terminés, par tour : {trace_id: {span_id: Span}}
+        self._open = {}
+        self._open_lock = threading.Lock()
+        if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            try:
+                self.exporters.append(OtelSpanExporter())
+            except ImportError:
+                print("⚠️ OTEL_EXPORTER_OTLP_ENDPOINT défini mais opentelemetry-sdk absent : traces JSONL uniquement.")
+
+    @staticmethod
+    def current() -> Span | None:
+        """Span en cours dans le contexte courant."""
+        return _current_span.get()
+
+    def annotate(self, **attributes):
+        """Ajoute des attributs au span courant (sans effet hors d'un tour)."""
+        span = self.current()
+        if span is not None:
+            span.set(**attributes)
+
+    def start_span(
+        self, name: str, parent: Span | None = None, activate: bool = True, detached: bool = False, **attributes
+    ) -> Span | None:
+        """
+        Démarre un span, enfant de `parent` ou du span courant ; None hors d'un tour.
+
+        Args:
+            name (str): Nom de la phase.
+            parent (Span | None): Span parent (par défaut le span courant).
+            activate (bool): Si True, le span devient le span courant jusqu'à `end_span`.
+            detached (bool): Si True, le span peut se terminer après son tour (tâche d'arrière-plan)
+                et n'est pas clos avec lui.
+            **attributes: Attributs du span.
+
+        Returns:
+            Span | None: Span démarré, à terminer avec `end_span`.
+        """
+        parent = parent or self.current()
+        if not self.enabled or parent is None:
+            return None
+        span = Span(name, parent.trace_id, parent.span_id, attributes)
+        span._detached = detached
+        return self._start(span, activate)
+
+    def _start(self, span: Span, activate: bool) -> Span:
+        with self._open_lock:
+            self._open.setdefault(span.trace_id, {})[span.span_id] = span
+        for exporter in self.exporters:
+            if hasattr(exporter, "start"):
+                exporter.start(span)
+        if activate:
+            span._parent = _current_span.get()
+            span._token = _current_span.set(span)
+        return span
+
+    def end_span(self, span: Span | None, error: BaseException | None = None):
+        """
+        Termine un span et l'exporte (une seule fois : un span déjà terminé est ignoré).
+
+        Terminer le span d'un tour termine aussi, en erreur, ses spans restés ouverts.
+
+        Args:
+            span (Span | None): Span à terminer (None est ignoré).
+            error (BaseException | None): Erreur ayant interrompu la phase.
+        """
+        if span is None:
+            return
+        with self._open_lock:
+            spans = self._open.get(span.trace_id, {})
+            if spans.pop(span.span_id, None) is None:
+                return
+            # Fin du tour : les phases jamais terminées ne doivent pas rester en mémoire
+            orphans = [s for s in spans.values() if not s._detached] if span.parent_id is None else []
+            for orphan in orphans:
+                del spans[orphan.span_id]
+            if not spans:
+                self._open.pop(span.trace_id, None)
+        if span._token is not None:
+            try:
+                _current_span.reset(span._token)
+            except ValueError:
+                # Terminé dans un autre contexte (générateur, callback asynchrone) : on restaure le parent
+                _current_span.set(span._parent)
+        for orphan in orphans:
+            self._finish(orphan, "non terminé avant la fin du tour")
+        self._finish(span, None if error is None else f"{type(error).__name__}: {error}")
+
+    def _finish(self, span: Span, error: str | None):
+        """Renseigne la durée et l'erreur d'un span puis l'exporte."""
+        span.duration_ms = round((time.perf_counter() - span._start_perf) * 1000, 2)
+        if error is not None:
+            span.error = error
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    @contextlib.contextmanager
+    def trace(self, name: str = TURN_SPAN, **attributes) -> Iterator[Span]:
+        """
+        Span racine d'un tour de conversation.
+
+        Args:
+            name (str): Nom du tour.
+            **attributes: Attributs du tour.
+
+        Yields:
+            Span: Span du tour (`NOOP_SPAN` si le traçage est désactivé).
+        """
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = self._start(Span(name, uuid.uuid4().hex, None, attributes), activate=True)
+        with self._ended(span):
+            yield span
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """
+        Span d'une phase, enfant du span courant ; ne fait rien hors d'un tour.
+
+        Args:
+            name (str): Nom de la phase.
+            **attributes: Attributs du span.
+
+        Yields:
+            Span: Span de la phase (`NOOP_SPAN` hors d'un tour).
+        """
+        span = self.start_span(name, **attributes)
+        with self._ended(span):
+            yield span or NOOP_SPAN
+
+    @contextlib.contextmanager
+    def _ended(self, span: Span | None):
+        """Termine `span` à la sortie du bloc, en notant l'erreur éventuelle."""
+        try:
+            yield
+        except BaseException as e:
+            self.end_span(span, error=e)
+            raise
+        self.end_span(span)
+
+    def callbacks(self) -> list:
+        """Callbacks LangChain à passer dans `config` pour tracer agent, LLM et outils du tour courant."""
+        return [TracingCallbackHandler(self)] if self.enabled and self.current() is not None else []
+
+
+def _token_usage(response) -> dict:
+    """Nombre de tokens d'un appel LLM (`usage_metadata` ou `llm_output["token_usage"]`)."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return {"input_tokens": usage.get("input_tokens"), "output_tokens": usage.get("output_tokens")}
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return {"input_tokens": usage.get("prompt_tokens"), "output_tokens": usage.get("completion_tokens")}
+    return {}
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Callback LangChain qui transforme les appels LLM et outils en spans.
+
+    Dans un agent, chaque appel au LLM ouvre une nouvelle itération (`agent.iteration`) ;
+    les appels LLM (`llm.call`, avec tokens) et d'outils (`tool.call`) en sont les enfants.
+    Un appel LLM hors agent (mode direct) est un enfant direct du span courant.
+
+    Attributs :
+        tracer (Tracer) : Traceur recevant les spans.
+        iterations (int) : Nombre d'itérations de l'agent.
+    """
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self.iterations = 0
+        # Span parent commun (capturé à la création : les callbacks peuvent tourner dans d'autres threads)
+        self._root = tracer.current()
+        self._iteration = None
+        self._in_agent = False
+        self._runs = {}
+
+    def _start(self, run_id, name: str, activate: bool = False, **attributes):
+        self._runs[run_id] = self.tracer.start_span(name, parent=self._iteration or self._root,
+                                                    activate=activate, **attributes)
+
+    def _end(self, run_id, error: BaseException | None = None, **attributes):
+        span = self._runs.pop(run_id, None)
+        if span is not None:
+            span.set(**attributes)
+            self.tracer.end_span(span, error=error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._on_llm_start(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._on_llm_start(run_id)
+
+    def _on_llm_start(self, run_id):
+        if not self._in_agent:
+            self._start(run_id, "llm.call")
+            return
+        # Dans l'agent, un appel au LLM commence une nouvelle étape de raisonnement
+        self.tracer.end_span(self._iteration)
+        self.iterations += 1
+        self._iteration = self.tracer.start_span("agent.iteration", parent=self._root, activate=False,
+                                                 iteration=self.iterations)
+        self._start(run_id, "llm.call", iteration=self.iterations)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, **_token_usage(response))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        # Span courant pendant l'outil : la recherche Chroma ou web s'y rattache
+        attributes = {"tool": (serialized or {}).get("name"), "input_chars": len(str(input_str))}
+        if TRACE_TOOL_INPUTS:
+            attributes["input"] = str(input_str)[:TRACE_INPUT_CHARS]
+        self._start(run_id, "tool.call", activate=True, **attributes)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id, output_chars=len(str(output)))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self._in_agent = True
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        # Fin de l'exécuteur (chaîne racine) : la dernière itération se termine
+        if parent_run_id is None:
+            self.tracer.end_span(self._iteration)
+            self._iteration = None
+            self._in_agent = False
+            if self._root is not None:
+                self._root.set(agent_iterations=self.iterations)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        if parent_run_id is None:
+            self.tracer.end_span(self._iteration, error=error)
+            self._iteration = None
+            self._in_agent = False
+
+
+def read_spans(path: Path = TRACE_FILE) -> list[dict]:
+    """
+    Lit les spans d'un fichier JSONL (les lignes illisibles sont ignorées).
+
+    Args:
+        path (Path): Fichier de traces.
+
+    Returns:
+        list[dict]: Spans, dans l'ordre d'écriture.
+    """
+    spans = []
+    if not Path(path).exists():
+        return spans
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+
+def _percentiles(values: list[float]) -> tuple[float, float]:
+    """p50 et p95 d'une liste de durées."""
+    if len(values) == 1:
+        return values[0], values[0]
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+    return quantiles[49], quantiles[94]
+
+
+def summarize_traces(path: Path = TRACE_FILE, last_turns: int | None = 200) -> dict[str, Any]:
+    """
+    Résume les traces : latence des tours et de chaque phase (p50 / p95).
+
+    Args:
+        path (Path): Fichier de traces.
+        last_turns (int | None): Nombre de tours récents pris en compte (None = tous).
+
+    Returns:
+        dict: `turns` (nombre de tours), `turn` (p50_ms, p95_ms) et `phases`
+        (liste de `{"name", "count", "p50_ms", "p95_ms"}`, triée par p95 décroissant).
+    """
+    spans = [span for span in read_spans(path) if span.get("duration_ms") is not None]
+    turns = [span for span in spans if span["parent_id"] is None and span["name"] == TURN_SPAN]
+    if last_turns:
+        turns = turns[-last_turns:]
+    if not turns:
+        return {"turns": 0, "turn": None, "phases": []}
+    trace_ids = {span["trace_id"] for span in turns}
+    durations = {}
+    for span in spans:
+        if span["trace_id"] in trace_ids and span["parent_id"] is not None:
+            durations.setdefault(span["name"], []).append(span["duration_ms"])
+    p50, p95 = _percentiles([span["duration_ms"] for span in turns])
+    phases = [
+        {"name": name, "count": len(values), "p50_ms": _percentiles(values)[0], "p95_ms": _percentiles(values)[1]}
+        for name, values in durations.items()
+    ]
+    phases.sort(key=lambda phase: phase["p95_ms"], reverse=True)
+    return {"turns": len(turns), "turn": {"p50_ms": p50, "p95_ms": p95}, "phases": phases}
+
+
+tracer = Tracer()
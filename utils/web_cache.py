@@ -0,0 +1,199 @@
+"""
+Cache persistant des recherches web (SQLite).
+
+Les résultats DuckDuckGo sont indexés par (requête normalisée, région, nombre de
+résultats) et survivent aux redémarrages. Un résultat :
+- frais (plus jeune que `ttl`) est servi directement ;
+- périmé mais plus jeune que `ttl + stale_ttl` est servi immédiatement, pendant
+  qu'un thread le rafraîchit en arrière-plan (stale-while-revalidate) ;
+- plus ancien est ignoré : la recherche est relancée.
+
+Le cache est borné en taille : au-delà de `max_bytes`, les résultats les moins
+récemment utilisés sont supprimés (`utils/sqlite_cache.py`). Les échecs de recherche
+ne sont jamais mis en cache.
+"""
+
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from utils.query_cache import normalize_query
+from utils.sqlite_cache import SqliteLruCache
+
+WEB_CACHE_FILE = Path("web_search_cache.sqlite3")
+WEB_CACHE_TTL = 24 * 3600.0          # durée pendant laquelle un résultat est frais (secondes)
+WEB_CACHE_STALE_TTL = 7 * 24 * 3600.0  # durée supplémentaire pendant laquelle il reste servi en attendant son rafraîchissement
+WEB_CACHE_MAX_MB = 50
+
+
+class WebSearchCache(SqliteLruCache):
+    """
+    Stockage SQLite des résultats de recherche web, partagé entre threads.
+
+    Attributs :
+        path (Path) : Fichier SQLite du cache.
+        ttl (float) : Durée de fraîcheur d'un résultat (secondes).
+        stale_ttl (float) : Durée supplémentaire de service d'un résultat périmé (secondes).
+        max_bytes (int) : Taille maximale des résultats stockés avant éviction.
+        hits, stale_hits, misses (int) : Compteurs d'utilisation.
+    """
+
+    TABLE = "web_results"
+    KEY_COLUMNS = ("query", "region", "max_results")
+    COLUMNS = (
+        "query TEXT NOT NULL",
+        "region TEXT NOT NULL",
+        "max_results INTEGER NOT NULL",
+        "result TEXT NOT NULL",
+        "fetched_at REAL NOT NULL",
+    )
+    LABEL = "Cache web"
+    ITEMS = "résultats"
+
+    def __init__(
+        self,
+        path: Path = WEB_CACHE_FILE,
+        ttl: float = WEB_CACHE_TTL,
+        stale_ttl: float = WEB_CACHE_STALE_TTL,
+        max_bytes: int = WEB_CACHE_MAX_MB * 1024 * 1024,
+    ):
+        super().__init__(path, max_bytes)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        # Clés en cours de rafraîchissement en arrière-plan
+        self._refreshing = set()
+
+    @staticmethod
+    def _key(query: str, region: str, max_results: int) -> tuple:
+        """Clé d'un résultat : requête normalisée, région et nombre de résultats."""
+        return normalize_query(query), region, max_results
+
+    def get(self, query: str, region: str, max_results: int) -> tuple[str, bool] | None:
+        """
+        Cherche un résultat encore servable.
+
+        Args:
+            query (str): Requête web.
+            region (str): Région DuckDuckGo (ex : "fr-fr").
+            max_results (int): Nombre de résultats demandés.
+
+        Returns:
+            tuple[str, bool] | None: (résultat, frais ?) ou None si absent ou trop ancien.
+        """
+        key = self._key(query, region, max_results)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, fetched_at FROM web_results WHERE query = ? AND region = ? AND max_results = ?",
+                key,
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl + self.stale_ttl:
+                self.misses += 1
+                return None
+            self._touch([key], now)
+            fresh = now - row[1] <= self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return row[0], fresh
+
+    def put(self, query: str, region: str, max_results: int, result: str):
+        """
+        Enregistre (ou remplace) un résultat, puis applique l'éviction si nécessaire.
+
+        Args:
+            query (str): Requête web.
+            region (str): Région DuckDuckGo.
+            max_results (int): Nombre de résultats demandés.
+            result (str): Résultats formatés.
+        """
+        key = self._key(query, region, max_results)
+        size = len(result.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM web_results WHERE query = ? AND region = ? AND max_results = ?", key
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO web_results (query, region, max_results, result, size, fetched_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, result, size, now, now),
+            )
+            self._conn.commit()
+            self._touched.pop(key, None)
+            self._stored(size - (old[0] if old else 0))
+
+    def refresh_in_background(self, query: str, region: str, max_results: int, fetch: Callable[[], str | None]):
+        """
+        Rafraîchit un résultat périmé dans un thread, sans dupliquer un rafraîchissement en cours.
+
+        Args:
+            query (str): Requête web.
+            region (str): Région DuckDuckGo.
+            max_results (int): Nombre de résultats demandés.
+            fetch (callable): Recherche réelle, retournant None en cas d'échec.
+        """
+        key = self._key(query, region, max_results)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                result = fetch()
+                if result:
+                    self.put(query, region, max_results, result)
+            except Exception as e:
+                print(f"[⚠️ Rafraîchissement web impossible] {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="web-cache-refresh", daemon=True).start()
+
+    def get_or_fetch(self, query: str, region: str, max_results: int, fetch: Callable[[], str | None]) -> str | None:
+        """
+        Retourne le résultat en cache (rafraîchi en arrière-plan s'il est périmé) ou lance la recherche.
+
+        Args:
+            query (str): Requête web.
+            region (str): Région DuckDuckGo.
+            max_results (int): Nombre de résultats demandés.
+            fetch (callable): Recherche réelle, retournant None en cas d'échec.
+
+        Returns:
+            str | None: Résultats formatés, ou None si la recherche a échoué.
+        """
+        cached = self.get(query, region, max_results)
+        if cached is not None:
+            result, fresh = cached
+            if not fresh:
+                self.refresh_in_background(query, region, max_results, fetch)
+            return result
+        result = fetch()
+        if result:
+            self.put(query, region, max_results, result)
+        return result
+
+    def stats(self) -> dict:
+        """
+        Retourne les compteurs du cache.
+
+        Returns:
+            dict: `hits`, `stale_hits`, `misses`, `entries` et `bytes` stockés.
+        """
+        with self._lock:
+            entries, size = self._usage()
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "entries": entries,
+                "bytes": size,
+            }